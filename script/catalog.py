@@ -0,0 +1,168 @@
+# This module keeps catalog.json at the top of the output folder.
+# It lists every run, its domains, products and the frames that are actually on disk, so the site can build its menus
+# from one request instead of listing the bucket page by page and fetching each run's metadata.json.
+# ugawrf updates a product's entry once that product's images have been written. The update is read-modify-write
+# under a lock file (several ugawrf runs can be going at once), and the new catalog replaces the old one in one step.
+# Only the newest KEEP_RUNS runs are listed, so the file (and every rewrite of it) stays small - older run folders are
+# still on disk and the site lists the bucket for them when asked ("Older runs..."). An update that changes nothing doesn't rewrite the file.
+# format:
+# {"updated": "...", "runs": {"2025-03-13_21_00_00": {"d01": {"init_time": ..., "in_progress": ..., "forecast_hours": ...,
+#     "products": {"temperature": {"hours": [0, 1, ...], "regions": {"atlanta": [0, 1, ...]}},
+#                  "skewt": {"stations": {"ahn": {"hours": [0, 1, ...]}}}, "meteogram": {"stations": {"ahn": {"files": ["meteogram.png"]}}}},
+#     "previews": {"sizes": ..., "pattern": ..., "products": {"temperature": [0, 1, ...]}}}}}}
+
+import datetime as dt
+import json
+import time
+import os
+import re
+
+CATALOG_NAME = "catalog.json"
+HOUR_FILE = re.compile(r"hour_(\d+)\.png")
+REGION_FILE = re.compile(r"hour_(\d+)_(\w+)\.png")
+RUN_FOLDER = re.compile(r"\d{4}-\d\d-\d\d_\d\d_\d\d_\d\d")
+# copied from metadata.json into the run's catalog entry
+RUN_FIELDS = ["init_time", "step_time", "forecast_hours", "in_progress", "generation_time"]
+# how many runs (newest first) the catalog lists
+KEEP_RUNS = 60
+
+def update_product(base_output, run, domain, product, run_metadata=None):
+    # (re)scan one product folder and store what's in it
+    entry = scan_product(os.path.join(base_output, run, domain, product))
+    def update(catalog):
+        domain_entry = _domain_entry(catalog, run, domain, run_metadata)
+        if entry:
+            domain_entry["products"][product] = entry
+        else:
+            domain_entry["products"].pop(product, None)
+    _update_catalog(base_output, update)
+
+def update_run(base_output, run, domain, run_metadata):
+    # just the run status (in_progress, forecast hours...) without rescanning any products
+    _update_catalog(base_output, lambda catalog: _domain_entry(catalog, run, domain, run_metadata))
+
+def rebuild(base_output):
+    # full rescan of the newest KEEP_RUNS run folders, for backfilling old runs or repairing the catalog
+    def update(catalog):
+        catalog["runs"] = {}
+        runs = sorted(run for run in os.listdir(base_output) if RUN_FOLDER.fullmatch(run) and os.path.isdir(os.path.join(base_output, run)))
+        for run in runs[-KEEP_RUNS:]:
+            run_path = os.path.join(base_output, run)
+            for domain in sorted(os.listdir(run_path)):
+                domain_path = os.path.join(run_path, domain)
+                if not os.path.isdir(domain_path):
+                    continue
+                run_metadata = None
+                if os.path.exists(os.path.join(domain_path, "metadata.json")):
+                    with open(os.path.join(domain_path, "metadata.json")) as f:
+                        run_metadata = json.load(f)
+                domain_entry = _domain_entry(catalog, run, domain, run_metadata)
+                for product in sorted(os.listdir(domain_path)):
+                    entry = scan_product(os.path.join(domain_path, product)) if os.path.isdir(os.path.join(domain_path, product)) else None
+                    if entry:
+                        domain_entry["products"][product] = entry
+    _update_catalog(base_output, update)
+
+def scan_product(path):
+    # {"hours": [...], "regions": {...}, "files": [...], "stations": {name: {...}}} with empty parts left out
+    if not os.path.isdir(path):
+        return None
+    hours, regions, files, stations = [], {}, [], {}
+    for name in os.listdir(path):
+        full_path = os.path.join(path, name)
+        if os.path.isdir(full_path):
+            station = scan_product(full_path)
+            if station:
+                stations[name] = station
+            continue
+        hour = HOUR_FILE.fullmatch(name)
+        region = REGION_FILE.fullmatch(name)
+        if hour:
+            hours.append(int(hour.group(1)))
+        elif region:
+            regions.setdefault(region.group(2), []).append(int(region.group(1)))
+        elif not name.endswith((".tmp", ".webp")):
+            # thumbnails/previews are listed in metadata.json instead
+            files.append(name)
+    entry = {}
+    if hours:
+        entry["hours"] = sorted(hours)
+    if regions:
+        entry["regions"] = {region: sorted(region_hours) for region, region_hours in sorted(regions.items())}
+    if files:
+        entry["files"] = sorted(files)
+    if stations:
+        entry["stations"] = dict(sorted(stations.items()))
+    return entry
+
+def _domain_entry(catalog, run, domain, run_metadata):
+    domain_entry = catalog["runs"].setdefault(run, {}).setdefault(domain, {"products": {}})
+    if run_metadata:
+        domain_entry.update({field: run_metadata[field] for field in RUN_FIELDS if field in run_metadata})
+        if run_metadata.get("previews"):
+            # sizes, naming and which frames have previews - the site falls back to the full frame for the rest
+            domain_entry["previews"] = run_metadata["previews"]
+    return domain_entry
+
+def _update_catalog(base_output, update):
+    catalog_path = os.path.join(base_output, CATALOG_NAME)
+    os.makedirs(base_output, exist_ok=True)
+    with _CatalogLock(f"{catalog_path}.lock"):
+        catalog = {"runs": {}}
+        if os.path.exists(catalog_path):
+            try:
+                with open(catalog_path) as f:
+                    catalog = json.load(f)
+            except ValueError as e:
+                print(f"warning: {catalog_path} is unreadable ({e}), starting a new catalog!")
+        before = json.dumps(catalog.get("runs"), sort_keys=True)
+        update(catalog)
+        # newest runs first, which is the order the site lists them in, and only the newest KEEP_RUNS of them
+        catalog["runs"] = dict(sorted(catalog["runs"].items(), reverse=True)[:KEEP_RUNS])
+        if os.path.exists(catalog_path) and json.dumps(catalog["runs"], sort_keys=True) == before:
+            return
+        catalog["updated"] = str(dt.datetime.now())
+        with open(f"{catalog_path}.tmp", "w") as f:
+            json.dump(catalog, f, indent=1)
+        os.replace(f"{catalog_path}.tmp", catalog_path)
+
+class _CatalogLock:
+    # lock file made with O_EXCL so it works the same on linux and windows. a lock older than stale_after seconds
+    # is from a process that died mid-update and gets taken over
+    def __init__(self, path, stale_after=60, timeout=120):
+        self.path = path
+        self.stale_after = stale_after
+        self.timeout = timeout
+
+    def __enter__(self):
+        start = time.time()
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.time() - start > self.timeout:
+                    raise TimeoutError(f"couldn't lock {self.path} after {self.timeout}s")
+                time.sleep(0.1)
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Rebuild the site catalog from the run folders on disk.')
+    parser.add_argument('output_folder', type=str, help='Base output folder that holds the runs (and catalog.json).')
+    parser.add_argument('--keep', type=int, default=KEEP_RUNS, help=f'How many of the newest runs to list (default {KEEP_RUNS}).')
+    args = parser.parse_args()
+    KEEP_RUNS = args.keep
+    rebuild(args.output_folder)
+    print(f"rebuilt {os.path.join(args.output_folder, CATALOG_NAME)}")
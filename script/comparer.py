@@ -1,88 +1,244 @@
 import pandas as pd
 import argparse
-import requests
 import io
 import os
+import glob
 from datetime import timedelta
-import matplotlib.pyplot as plt
 import numpy as np
+import statsdb
 
-parser = argparse.ArgumentParser(description='A helper tool to automate verification of UGA-WRF output CSVs. Creates a new CSV and deposits it in your CWD')
-parser.add_argument('csv_file', type=str, help='Path to the Model Output CSV')
-parser.add_argument('--output', type=str, default=None, help='Output filename')
-args = parser.parse_args()
+# Single CSV (old behavior, fetches obs live and shows the plot):
+#   python comparer.py ahn_model_stats_2025-03-13_21_00_00.csv
+# Batch verification against a local observation store (no network, headless PNGs):
+# (keep the store and the database in ../data rather than under site/runs, which is served as-is)
+#   python comparer.py --obs-store ../data/obs --fetch ../site/runs/*/d01/modelstats      <- fill the store once
+#   python comparer.py --obs-store ../data/obs --import-obs asos_ga.csv                    <- or import IEM CSVs you already have
+#   python comparer.py --obs-store ../data/obs --output-dir verification --stats-db ../data/verification.sqlite ../site/runs/*/d01/modelstats
+
+OBS_COLUMNS = ['station', 'valid', 'tmpf', 'dwpf', 'sknt', 'mslp']
+FINAL_COLUMNS = ['Init Time (UTC)', 'Airport', 'Forecast Hour','Valid Time (UTC)', 'Obs Time (UTC)', 'Model Temperature (F)', 'Observed Temperature (F)', 'Error_Temp', 'Model Dew Point (F)', 'Observed Dew Point (F)', 'Error_Dew', 'Model Wind Speed (mph)', 'Observed Wind Speed (mph)', 'Error_Wind', 'Model MSLP (mb)', 'Observed Pressure (mb)', 'Error_MSLP']
+ERROR_COLUMNS = ['Error_Temp', 'Error_Dew', 'Error_Wind', 'Error_MSLP']
 
 def main():
-    if not os.path.exists(args.csv_file):
-        print(f"{args.csv_file} not found.")
+    parser = argparse.ArgumentParser(description='A helper tool to automate verification of UGA-WRF output CSVs. Creates a new CSV and deposits it in your CWD')
+    parser.add_argument('csv_file', type=str, nargs='*', help='Path to the Model Output CSV. In batch mode, any number of CSVs and/or modelstats folders.')
+    parser.add_argument('--output', type=str, default=None, help='Output filename')
+    parser.add_argument('--obs-store', type=str, default=None, help='Folder holding the local observation store (one CSV per station). Turns on batch mode.')
+    parser.add_argument('--fetch', help='Download the observations the given model CSVs need into the obs store, then exit.', action='store_true')
+    parser.add_argument('--import-obs', type=str, nargs='+', default=None, help='IEM ASOS CSVs (onlycomma format) to add to the obs store, then exit.')
+    parser.add_argument('--output-dir', type=str, default='verification', help='Where batch mode writes its tables and plots. Defaults to ./verification')
+    parser.add_argument('--stats-db', type=str, default=None, help='Also append the verified hours to this verification history database (see statsdb.py).')
+    args = parser.parse_args()
+
+    if args.import_obs or args.fetch:
+        if args.obs_store is None:
+            print("--fetch and --import-obs need an --obs-store folder.")
+            return
+        if args.import_obs:
+            df_obs = pd.concat([pd.read_csv(path) for path in args.import_obs], ignore_index=True)
+            store_observations(df_obs, args.obs_store)
+        if args.fetch:
+            fill_observation_store(load_model_data(args.csv_file), args.obs_store)
         return
-    print(f"reading model data from {args.csv_file}...")
-    df_model = pd.read_csv(args.csv_file)
-    df_model['Valid Time (UTC)'] = pd.to_datetime(df_model['Valid Time (UTC)'])
+    if args.obs_store is None and len(args.csv_file) == 1 and os.path.isfile(args.csv_file[0]):
+        verify_single(args.csv_file[0], args.output, args.stats_db)
+    elif args.obs_store is None:
+        print("batch verification needs a local --obs-store. fill it once with --fetch or --import-obs.")
+    else:
+        verify_batch(args.csv_file, args.obs_store, args.output_dir, args.stats_db)
+
+def verify_single(csv_file, output=None, stats_db=None):
+    if not os.path.exists(csv_file):
+        print(f"{csv_file} not found.")
+        return
+    print(f"reading model data from {csv_file}...")
+    df_model = load_model_data([csv_file])
     #Min and Max time are a special date/time object
     min_time = df_model['Valid Time (UTC)'].min() - timedelta(hours=2)
     max_time = df_model['Valid Time (UTC)'].max() + timedelta(days=1)
-    station = df_model['Airport'].iloc[0] 
+    station = df_model['Airport'].iloc[0]
     print(f"Fetching observations for {station}...")
     try:
-        response = requests.get("https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py", params={"station": station, "data": ["tmpf", "dwpf", "sknt", "mslp"], "year1": min_time.year, "month1": min_time.month, "day1": min_time.day, "year2": max_time.year, "month2": max_time.month, "day2": max_time.day, "tz": "Etc/UTC", "format": "onlycomma", "latlon": "no", "missing": "M", "report_type": "3"})
-        df_obs = pd.read_csv(io.StringIO(response.text))
+        df_obs = fetch_observations(station, min_time, max_time)
     except Exception as e:
         print(f"Error fetching data: {e}")
         return
+    merged = verify(df_model, df_obs)
+    if output:
+        out_file = output
+    else:
+        out_file = f"verified_{os.path.basename(csv_file)}"
+    merged[FINAL_COLUMNS].to_csv(out_file, index=False)
+    print(f"verified {len(merged)} forecast times to obs. saved to {out_file}")
+    store_verification(merged, stats_db)
+    graphical_verification(merged)
+
+def verify_batch(paths, obs_store, output_dir, stats_db=None):
+    df_model = load_model_data(paths)
+    if df_model.empty:
+        print("no model stats CSVs found.")
+        return
+    stations = sorted(df_model['Airport'].unique())
+    df_obs = load_observations(stations, obs_store)
+    if df_obs.empty:
+        print(f"no observations in {obs_store} for {stations}. fill it with --fetch or --import-obs first.")
+        return
+    print(f"verifying {df_model['Init Time (UTC)'].nunique()} runs at {len(stations)} stations...")
+    merged = verify(df_model, df_obs)
+    os.makedirs(output_dir, exist_ok=True)
+    merged[FINAL_COLUMNS].to_csv(os.path.join(output_dir, "verified_model_stats.csv"), index=False)
+    summary = summarize(merged)
+    summary.to_csv(os.path.join(output_dir, "verification_summary.csv"), index=False)
+    store_verification(merged, stats_db)
+    import matplotlib
+    matplotlib.use("Agg")
+    for station, station_data in merged.groupby('Airport'):
+        graphical_verification(station_data, os.path.join(output_dir, f"{station.lower()}_verification.png"))
+    print(f"verified {len(merged)} forecast times to obs. saved to {output_dir}")
+
+def store_verification(merged, stats_db):
+    if stats_db is not None:
+        added = statsdb.append_verification(stats_db, merged[FINAL_COLUMNS].to_dict('records'))
+        print(f"added {added} verified hours to {stats_db}")
+
+def find_model_csvs(paths):
+    csv_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            csv_files += sorted(glob.glob(os.path.join(path, "**", "*_model_stats_*.csv"), recursive=True))
+        else:
+            csv_files.append(path)
+    return csv_files
+
+def load_model_data(paths):
+    csv_files = find_model_csvs(paths)
+    if not csv_files:
+        return pd.DataFrame(columns=['Init Time (UTC)', 'Airport', 'Forecast Hour', 'Valid Time (UTC)'])
+    df_model = pd.concat([pd.read_csv(path) for path in csv_files], ignore_index=True)
+    df_model['Valid Time (UTC)'] = pd.to_datetime(df_model['Valid Time (UTC)']).astype('datetime64[ns]')
+    df_model['Airport'] = df_model['Airport'].str.upper()
+    return df_model
+
+def fetch_observations(station, min_time, max_time):
+    # requests and matplotlib are only imported when we actually download or plot
+    import requests
+    response = requests.get("https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py", params={"station": station, "data": ["tmpf", "dwpf", "sknt", "mslp"], "year1": min_time.year, "month1": min_time.month, "day1": min_time.day, "year2": max_time.year, "month2": max_time.month, "day2": max_time.day, "tz": "Etc/UTC", "format": "onlycomma", "latlon": "no", "missing": "M", "report_type": "3"})
+    response.raise_for_status()
+    return clean_observations(pd.read_csv(io.StringIO(response.text)))
+
+def clean_observations(df_obs):
+    df_obs = df_obs[[col for col in OBS_COLUMNS if col in df_obs.columns]].copy()
     for col in ['tmpf', 'dwpf', 'sknt', 'mslp']:
         if col in df_obs.columns:
             df_obs[col] = pd.to_numeric(df_obs[col], errors='coerce')
-    df_obs['valid'] = pd.to_datetime(df_obs['valid'])
-    df_obs['valid_round'] = df_obs['valid'].dt.round('h')
+    df_obs['station'] = df_obs['station'].astype(str).str.upper()
+    df_obs['valid'] = pd.to_datetime(df_obs['valid']).astype('datetime64[ns]')
+    return df_obs
+
+def fill_observation_store(df_model, obs_store):
+    # one download per station, covering every run we were handed
+    for station, station_model in df_model.groupby('Airport'):
+        min_time = station_model['Valid Time (UTC)'].min() - timedelta(hours=2)
+        max_time = station_model['Valid Time (UTC)'].max() + timedelta(days=1)
+        print(f"Fetching observations for {station}...")
+        try:
+            store_observations(fetch_observations(station, min_time, max_time), obs_store)
+        except Exception as e:
+            print(f"Error fetching data for {station}: {e}")
+
+def store_observations(df_obs, obs_store):
+    # the store is one CSV per station. new obs are merged in, so fetching/importing the same period twice is harmless
+    os.makedirs(obs_store, exist_ok=True)
+    df_obs = clean_observations(df_obs)
+    for station, new_obs in df_obs.groupby('station'):
+        station_file = os.path.join(obs_store, f"{station}.csv")
+        if os.path.exists(station_file):
+            new_obs = pd.concat([clean_observations(pd.read_csv(station_file)), new_obs], ignore_index=True)
+        new_obs = new_obs.drop_duplicates(subset=['station', 'valid'], keep='last').sort_values('valid')
+        new_obs.to_csv(f"{station_file}.tmp", index=False)
+        os.replace(f"{station_file}.tmp", station_file)
+        print(f"{station}: {len(new_obs)} obs in store")
+
+def load_observations(stations, obs_store):
+    frames = []
+    for station in stations:
+        station_file = os.path.join(obs_store, f"{station.upper()}.csv")
+        if os.path.exists(station_file):
+            frames.append(clean_observations(pd.read_csv(station_file)))
+        else:
+            print(f"warning: no observations stored for {station}")
+    if not frames:
+        return pd.DataFrame(columns=OBS_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def verify(df_model, df_obs):
+    # matches every model hour at every station to its nearest ob within 30 minutes in one as-of join
+    df_obs = df_obs.rename(columns={'station': 'Airport'}).dropna(subset=['valid'])
     df_obs['obs_wind_mph'] = df_obs['sknt'] * 1.15078
-    merged = pd.merge(df_model, df_obs, left_on='Valid Time (UTC)', right_on='valid_round', how='inner')
-    merged['METAR_OBS'] = df_obs['valid']
+    merged = pd.merge_asof(df_model.sort_values('Valid Time (UTC)'), df_obs.sort_values('valid'), left_on='Valid Time (UTC)', right_on='valid', by='Airport', direction='nearest', tolerance=pd.Timedelta(minutes=30))
+    merged = merged.dropna(subset=['valid'])
     merged['Error_Temp'] = merged['Temperature (F)'] - merged['tmpf']
-    merged.rename(columns={'Temperature (F)': 'Model Temperature (F)'}, inplace=True)
-    merged.rename(columns={'tmpf': 'Observed Temperature (F)'}, inplace=True)
     merged['Error_Dew'] = merged['Dew Point (F)'] - merged['dwpf']
-    merged.rename(columns={'Dew Point (F)': 'Model Dew Point (F)'}, inplace=True)
-    merged.rename(columns={'dwpf': 'Observed Dew Point (F)'}, inplace=True)
     merged['Error_Wind'] = merged['Wind Speed (mph)'] - merged['obs_wind_mph']
-    merged.rename(columns={'Wind Speed (mph)': 'Model Wind Speed (mph)'}, inplace=True)
-    merged.rename(columns={'obs_wind_mph': 'Observed Wind Speed (mph)'}, inplace=True)
     merged['Error_MSLP'] = merged['Pressure (mb)'] - merged['mslp']
-    merged.rename(columns={'Pressure (mb)': 'Model MSLP (mb)'}, inplace=True)
-    merged.rename(columns={'mslp': 'Observed Pressure (mb)'}, inplace=True)
-    merged.rename(columns={'valid': 'Obs Time (UTC)'}, inplace=True)
-    if args.output:
-        out_file = args.output
-    else:
-        out_file = f"verified_{os.path.basename(args.csv_file)}"
-    final_cols = ['Init Time (UTC)', 'Airport', 'Forecast Hour','Valid Time (UTC)', 'Obs Time (UTC)', 'Model Temperature (F)', 'Observed Temperature (F)', 'Error_Temp', 'Model Dew Point (F)', 'Observed Dew Point (F)', 'Error_Dew', 'Model Wind Speed (mph)', 'Observed Wind Speed (mph)', 'Error_Wind', 'Model MSLP (mb)', 'Observed Pressure (mb)', 'Error_MSLP']
-    merged[final_cols].to_csv(out_file, index=False)
-    print(f"verified {len(merged)} forecast times to obs. saved to {out_file}")
-    graphical_verification(merged)
+    merged = merged.rename(columns={
+        'Temperature (F)': 'Model Temperature (F)', 'tmpf': 'Observed Temperature (F)',
+        'Dew Point (F)': 'Model Dew Point (F)', 'dwpf': 'Observed Dew Point (F)',
+        'Wind Speed (mph)': 'Model Wind Speed (mph)', 'obs_wind_mph': 'Observed Wind Speed (mph)',
+        'Pressure (mb)': 'Model MSLP (mb)', 'mslp': 'Observed Pressure (mb)',
+        'valid': 'Obs Time (UTC)',
+    })
+    return merged.sort_values(['Airport', 'Init Time (UTC)', 'Forecast Hour']).reset_index(drop=True)
 
-def graphical_verification(merged): 
+def summarize(merged):
+    # bias, MAE and RMSE for each station and variable, over all runs
+    rows = []
+    for station, station_data in merged.groupby('Airport'):
+        for col in ERROR_COLUMNS:
+            errors = station_data[col].dropna()
+            rows.append({
+                'Airport': station,
+                'Variable': col.replace('Error_', ''),
+                'Count': len(errors),
+                'Bias': errors.mean(),
+                'MAE': errors.abs().mean(),
+                'RMSE': np.sqrt((errors ** 2).mean()),
+            })
+    return pd.DataFrame(rows)
+
+def graphical_verification(merged, out_file=None):
     print("Generating graphical verification plots...")
+    import matplotlib.pyplot as plt
     merged = merged.sort_values(by='Forecast Hour')
-    x = merged['Forecast Hour']
     fig, axs = plt.subplots(1, 2, figsize=(14, 10))
     station = merged['Airport'].iloc[0]
-    init = merged['Init Time (UTC)'].iloc[0]
-    fig.suptitle(f"UGA-WRF Model Error Verification: {station}\nInit: {init} UTC", fontsize=16)
-    axs[0].plot(x, merged['Error_Temp'], color="red", marker="o", markersize=4)
-    axs[0].set_title("Temperature Error")
-    axs[0].set_xlabel("Forecast Hour")
-    axs[0].set_ylabel("Error (°F)")
-    axs[0].axhline(y=0, color='black', linestyle="--")
-    axs[0].grid(True, linestyle=':', alpha=0.7)
-    axs[1].plot(x, merged['Error_MSLP'], color="purple", marker="o", markersize=4)
-    axs[1].set_title("MSLP Error")
-    axs[1].set_xlabel("Forecast Hour")
-    axs[1].set_ylabel("Error (mb)")
-    axs[1].axhline(y=0, color='black', linestyle="--")
-    axs[1].grid(True, linestyle=':', alpha=0.7)
+    runs = merged['Init Time (UTC)'].unique()
+    if len(runs) == 1:
+        fig.suptitle(f"UGA-WRF Model Error Verification: {station}\nInit: {runs[0]} UTC", fontsize=16)
+    else:
+        fig.suptitle(f"UGA-WRF Model Error Verification: {station}\n{len(runs)} runs, {runs.min()} - {runs.max()} UTC", fontsize=16)
+    for ax, col, color, title, unit in [(axs[0], 'Error_Temp', "red", "Temperature Error", "°F"), (axs[1], 'Error_MSLP', "purple", "MSLP Error", "mb")]:
+        if len(runs) == 1:
+            ax.plot(merged['Forecast Hour'], merged[col], color=color, marker="o", markersize=4)
+        else:
+            # every run faintly, the mean error by forecast hour on top
+            for _, run_data in merged.groupby('Init Time (UTC)'):
+                ax.plot(run_data['Forecast Hour'], run_data[col], color=color, alpha=0.15, linewidth=1)
+            mean_error = merged.groupby('Forecast Hour')[col].mean()
+            ax.plot(mean_error.index, mean_error.values, color=color, marker="o", markersize=4, linewidth=2, label="Mean error")
+            ax.legend(loc="upper left")
+        ax.set_title(title)
+        ax.set_xlabel("Forecast Hour")
+        ax.set_ylabel(f"Error ({unit})")
+        ax.axhline(y=0, color='black', linestyle="--")
+        ax.grid(True, linestyle=':', alpha=0.7)
     plt.tight_layout()
     plt.subplots_adjust(top=0.92)
-    plt.show()
+    if out_file is None:
+        plt.show()
+    else:
+        fig.savefig(out_file)
+        plt.close(fig)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,188 @@
+# This module keeps the history of how long each task took (and how much memory it needed) and predicts the next run
+# from it. ugawrf appends every run's tasks to (repo)/data/task_history.jsonl, one json line per task:
+#   {"run": ..., "domain": ..., "time": ..., "task": "temperature.0-23", "module": "weathermaps", "product": "temperature",
+#    "frames": 24, "seconds": 41.2, "peak_mb": 812.4, "host": "local", "status": "done"}
+# The model is the median seconds per frame and the largest peak memory of each product over its last HISTORY_RUNS
+# runs (falling back to the module's median for products it hasn't seen yet). ugawrf uses it to start the longest
+# tasks first, to size its process pool against the free memory, and to warn when the run won't fit the cycle window.
+# ex: python costmodel.py ../data/task_history.jsonl      <- print the model
+
+import statistics
+import argparse
+import json
+import time
+import os
+
+HISTORY_NAME = "task_history.jsonl"
+HISTORY_RUNS = 10
+# memory left over for the os and the image writer queues when picking a process count
+MEMORY_HEADROOM = 0.85
+MEMORY_WAIT = 600 # seconds a task waits for free memory before it's started anyway
+
+def record_run(history_path, run_time, domain, tasks, results):
+    rows = []
+    for task in tasks:
+        result = results.get(task["id"])
+        if not result or result["status"] == "skipped":
+            continue
+        rows.append({
+            "run": run_time,
+            "domain": domain,
+            "time": result.get("start_time"),
+            "task": task["id"],
+            "module": task["module"],
+            "product": task["products"][0],
+            "frames": task.get("frames", 1),
+            "seconds": result["seconds"],
+            "peak_mb": result.get("peak_mb"),
+            "host": result.get("host", "local"),
+            "status": result["status"],
+        })
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    with open(history_path, "a") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+
+def load(history_path, domain=None):
+    # {"products": {product: {"seconds_per_frame", "peak_mb"}}, "modules": {module: {...}}} from the last
+    # HISTORY_RUNS runs of each product. tasks that errored are left out, they tend to stop early
+    rows = []
+    if os.path.exists(history_path):
+        with open(history_path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if row.get("status") == "done" and row.get("frames") and (domain is None or row.get("domain") == domain):
+                    rows.append(row)
+    by_product, by_module = {}, {}
+    for row in rows:
+        by_product.setdefault(row["product"], []).append(row)
+        by_module.setdefault(row["module"], []).append(row)
+    return {
+        "products": {product: summarize(product_rows) for product, product_rows in by_product.items()},
+        "modules": {module: summarize(module_rows) for module, module_rows in by_module.items()},
+    }
+
+def summarize(rows):
+    runs = sorted(set(row["run"] for row in rows))[-HISTORY_RUNS:]
+    recent = [row for row in rows if row["run"] in runs]
+    peaks = [row["peak_mb"] for row in recent if row.get("peak_mb")]
+    return {
+        "seconds_per_frame": statistics.median(row["seconds"] / row["frames"] for row in recent),
+        "peak_mb": max(peaks) if peaks else None,
+        "runs": len(runs),
+    }
+
+def estimate(model, task):
+    # (seconds, peak_mb) for a task, or (None, None) if neither its product nor its module has any history
+    entry = model["products"].get(task["products"][0]) or model["modules"].get(task["module"])
+    if entry is None:
+        return None, None
+    return entry["seconds_per_frame"] * task.get("frames", 1), entry["peak_mb"]
+
+def makespan(model, tasks, processes):
+    # rough wall time of the tasks on this many processes: each task goes to whichever process frees up first.
+    # returns (seconds, number of tasks without history)
+    finish = [0.0] * max(1, processes)
+    unknown = 0
+    for task in tasks:
+        seconds, peak_mb = estimate(model, task)
+        if seconds is None:
+            unknown += 1
+            continue
+        slot = finish.index(min(finish))
+        finish[slot] += seconds
+    return max(finish), unknown
+
+def choose_processes(model, tasks, max_processes=None, memory_budget=None):
+    # as many processes as there are cpus (and tasks), but no more than fit in the free memory at the biggest peak seen
+    # (or at memory_budget MB each, if given)
+    processes = min(max_processes or os.cpu_count() or 1, max(1, len(tasks)))
+    peaks = [estimate(model, task)[1] for task in tasks]
+    peaks = [peak for peak in peaks if peak]
+    per_process = memory_budget or (max(peaks) if peaks else None)
+    free_mb = available_memory_mb()
+    if per_process and free_mb:
+        processes = min(processes, max(1, int(free_mb * MEMORY_HEADROOM // per_process)))
+    return processes
+
+def wait_for_memory(task, memory_budget, others_running=None, poll=1):
+    # holds a task back until the machine has the memory it needed last time (task["estimated_peak_mb"], from schedule_tasks).
+    # that peak is the whole process's, so what this process already holds is taken off it. other processes finishing
+    # their tasks free memory up; waiting beats being killed halfway. others_running() says whether another worker on this
+    # machine is busy - without one (or without others_running at all) nothing would free up, so the task just starts.
+    # a task without history waits for memory_budget. it's started anyway after MEMORY_WAIT seconds
+    needed = task.get("estimated_peak_mb") or memory_budget
+    if needed > memory_budget:
+        print(f"warning: {task['id']} needed {needed} MB last time, more than the {memory_budget} MB budget!")
+    needed -= resident_memory_mb() or 0
+    started = time.time()
+    free_mb = available_memory_mb()
+    if free_mb is None or free_mb >= needed or others_running is None or not others_running():
+        return
+    print(f"-> {task['id']} is waiting for {needed:.0f} MB of memory ({free_mb:.0f} MB free)")
+    while free_mb is not None and free_mb < needed and others_running():
+        if time.time() - started > MEMORY_WAIT:
+            print(f"warning: {task['id']} waited {MEMORY_WAIT}s for memory, starting it anyway!")
+            return
+        time.sleep(poll)
+        free_mb = available_memory_mb()
+
+def available_memory_mb():
+    # MemAvailable on linux. None elsewhere, which leaves the process count to the cpu count
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def resident_memory_mb():
+    # current resident memory of this process on linux, None elsewhere
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def reset_peak_memory():
+    # on linux, writing 5 to clear_refs resets VmHWM so peak_memory_mb covers just what ran since
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_memory_mb():
+    # peak resident memory of this process (since reset_peak_memory on linux). None if we can't tell
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+        import sys
+        # ru_maxrss is in bytes on macos and kilobytes on linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Print the task cost model built from a task history file.')
+    parser.add_argument('history', type=str, help='task_history.jsonl, normally in ../data.')
+    parser.add_argument('--domain', type=str, default=None, help='Only use runs of this domain (e.g. d01).')
+    args = parser.parse_args()
+    model = load(args.history, args.domain)
+    for product, entry in sorted(model["products"].items(), key=lambda item: -item[1]["seconds_per_frame"]):
+        print(f"{product:>20}: {entry['seconds_per_frame']:.2f}s per frame, peak {entry['peak_mb']} MB ({entry['runs']} runs)")
+    print(f"free memory: {available_memory_mb()} MB")
@@ -0,0 +1,165 @@
+# Keeps a pool of warm ugawrf workers running so hourly partial runs start rendering right away.
+# Each worker process imports every product module once, loads the map layers (coastlines, borders, states, counties),
+# colortables and station index cache, and does a throwaway draw so fonts are cached - then waits for jobs.
+# Jobs are dropped as json files into (queue)/incoming and are picked up in name order:
+#   {"args": ["wrfout_d01_2025-03-13_21_00_00", "../site/runs", "-p", "-r", "1"]}     <- ugawrf.py's arguments
+# A job is moved to running/ while it's processed, then to done/ or failed/ along with its log (job.log) and
+# result (job.result.json: status, error, start/end time, elapsed seconds and which worker ran it).
+# Jobs run on their worker alone: --processes is always 1 and --queue is refused (see job_args) - the workers are
+# daemonic pool processes, and helper processes started from them would be outside the daemon's worker count and
+# left running if the pool is terminated. Use ugawrf.py directly (or more --workers) for multi-process runs.
+# ex: python daemon.py queue --workers 2                                              <- start the daemon
+#     python daemon.py queue --submit -- wrfout_d01_2025-03-13_21_00_00 ../site/runs -p  <- queue a job
+
+import multiprocessing
+import argparse
+import datetime as dt
+import json
+import time
+import sys
+import os
+
+QUEUE_FOLDERS = ["incoming", "running", "done", "failed"]
+
+def warm_up(output_folder=None):
+    # runs once in every worker process before it takes any jobs
+    started = time.time()
+    import ugawrf
+    import textgen, weathermaps, special, meteogram, skewt, modelstats, thumbnails, framewriter, catalog, pointdata
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+    from metpy.plots import ctables, USCOUNTIES
+    ctables.registry.get_colortable('NWSReflectivity')
+    # the natural earth layers are read from disk the first time they're drawn, so read them now
+    for feature in [cfeature.COASTLINE, cfeature.BORDERS, cfeature.STATES.with_scale('50m'), USCOUNTIES.with_scale('20m')]:
+        try:
+            list(feature.geometries())
+        except Exception as e:
+            print(f"warning: couldn't preload {getattr(feature, 'name', feature)}: {e}!")
+    if output_folder:
+        pointdata.INDEX_CACHE_FILE = os.path.join(output_folder, "station_indices.json")
+        pointdata.load_index_cache()
+    # one throwaway draw so matplotlib has its fonts and text layout cached
+    fig, ax = plt.subplots(figsize=(2, 2), subplot_kw=dict(projection=ccrs.PlateCarree()))
+    ax.set_title("warm up", fontweight='bold', loc='left')
+    fig.canvas.draw()
+    plt.close(fig)
+    print(f"worker {os.getpid()} warm in {time.time() - started:.1f}s")
+
+def job_args(ugawrf_args):
+    # the job's ugawrf.py arguments, checked and pinned to one process (see the top of this file)
+    import ugawrf
+    args = ugawrf.parse_args(ugawrf_args)
+    if args.queue:
+        raise ValueError("--queue can't be used in daemon jobs, run ugawrf.py directly for a queued run")
+    if args.processes != 1:
+        print(f"warning: daemon jobs run on one process, ignoring --processes {args.processes}")
+        return ugawrf_args + ["--processes", "1"]
+    return ugawrf_args
+
+def run_job(job_path):
+    # runs in a worker. ugawrf's output goes to the job's log file
+    import contextlib
+    import traceback
+    import ugawrf
+    with open(job_path) as f:
+        job = json.load(f)
+    result = {"worker": os.getpid(), "start_time": str(dt.datetime.now()), "status": "done", "error": None}
+    started = time.time()
+    with open(f"{job_path[:-len('.json')]}.log", "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            ugawrf.main(job_args(job["args"]))
+        except BaseException as e:
+            # argparse exits on bad arguments, which shouldn't take the worker down with it
+            traceback.print_exc()
+            result.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+    result.update({"end_time": str(dt.datetime.now()), "elapsed": round(time.time() - started, 2)})
+    return result
+
+def submit(queue, ugawrf_args):
+    # writes the job under a temp name and renames it, so the daemon never reads half a job
+    incoming = os.path.join(queue, "incoming")
+    os.makedirs(incoming, exist_ok=True)
+    name = f"{dt.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}"
+    with open(os.path.join(incoming, f".{name}.tmp"), "w") as f:
+        json.dump({"args": ugawrf_args}, f)
+    os.replace(os.path.join(incoming, f".{name}.tmp"), os.path.join(incoming, f"{name}.json"))
+    return os.path.join(incoming, f"{name}.json")
+
+def finish_job(queue, name, result):
+    folder = "done" if result["status"] == "done" else "failed"
+    base = os.path.join(queue, "running", name[:-len(".json")])
+    for suffix in [".json", ".log"]:
+        if os.path.exists(f"{base}{suffix}"):
+            os.replace(f"{base}{suffix}", os.path.join(queue, folder, f"{name[:-len('.json')]}{suffix}"))
+    with open(os.path.join(queue, folder, f"{name[:-len('.json')]}.result.json"), "w") as f:
+        json.dump(result, f, indent=4)
+    print(f"{name}: {result['status']} in {result['elapsed']}s{' - ' + result['error'] if result['error'] else ''}")
+
+def serve(queue, workers=1, poll=0.5, output_folder=None, recycle=None):
+    for folder in QUEUE_FOLDERS:
+        os.makedirs(os.path.join(queue, folder), exist_ok=True)
+    # anything left in running/ is from a daemon that died mid-job - run it again
+    for name in sorted(os.listdir(os.path.join(queue, "running"))):
+        if name.endswith(".json"):
+            os.replace(os.path.join(queue, "running", name), os.path.join(queue, "incoming", name))
+    pool = multiprocessing.Pool(workers, initializer=warm_up, initargs=(output_folder,), maxtasksperchild=recycle)
+    active = {}
+    print(f"ugawrf daemon watching {os.path.join(queue, 'incoming')} with {workers} workers")
+    try:
+        while True:
+            for name, pending in list(active.items()):
+                if pending.ready():
+                    try:
+                        result = pending.get()
+                    except Exception as e:
+                        result = {"status": "failed", "error": f"worker died: {e}", "elapsed": None}
+                    finish_job(queue, name, result)
+                    del active[name]
+            # only hand out as many jobs as there are workers, so a job dropped later can still be seen first
+            for name in sorted(os.listdir(os.path.join(queue, "incoming"))):
+                if len(active) >= workers:
+                    break
+                if not name.endswith(".json"):
+                    continue
+                running_path = os.path.join(queue, "running", name)
+                try:
+                    os.replace(os.path.join(queue, "incoming", name), running_path)
+                except FileNotFoundError:
+                    continue
+                print(f"{name}: started")
+                active[name] = pool.apply_async(run_job, (running_path,))
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        print("stopping daemon, unfinished jobs go back to incoming on the next start")
+        pool.terminate()
+    else:
+        pool.close()
+    pool.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run ugawrf jobs on a pool of warm worker processes.')
+    parser.add_argument('queue', type=str, help='Queue folder. Jobs go in (queue)/incoming.')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes (jobs processed at once).')
+    parser.add_argument('--poll', type=float, default=0.5, help='Seconds between checks for new jobs.')
+    parser.add_argument('--output-folder', type=str, default=None, help='Output folder the jobs write to, to preload its station index cache.')
+    parser.add_argument('--recycle', type=int, default=None, help='Replace a worker with a fresh (warm) one after this many jobs.')
+    parser.add_argument('--submit', help='Queue a job with the ugawrf.py arguments given after -- and exit.', action='store_true')
+    # everything after -- belongs to ugawrf.py
+    argv = sys.argv[1:]
+    ugawrf_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+    if args.submit:
+        if not ugawrf_args:
+            parser.error("--submit needs the ugawrf.py arguments after --")
+        try:
+            job_args(ugawrf_args)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"queued {submit(args.queue, ugawrf_args)}")
+        return
+    serve(args.queue, args.workers, args.poll, args.output_folder, args.recycle)
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,8 @@ def main():
     parser.add_argument('-d', '--duration', type=float, default=700, help='Time, in ms, for each frame of the GIF to take. Defaults to 700ms.')
     args = parser.parse_args()
     files = os.listdir(args.folder_path)
-    pngs = [f for f in files if f.endswith(".png")]
+    # regional crops (hour_N_region.png) live in the same folder, leave them out of the loop
+    pngs = [f for f in files if re.fullmatch(r'hour_\d+\.png', f)]
     if not pngs:
         print("no PNG files found :-(")
         return
@@ -0,0 +1,83 @@
+# This module writes our images in the background.
+# The figure is still rendered on the calling thread (matplotlib isn't thread safe), but only into an uncompressed
+# buffer - the PNG compression and the disk write happen on a small pool of writer threads while the next frame's
+# data is being computed. At most max_pending frames wait in memory; past that, save_figure blocks until one is written.
+# flush() is the barrier: it waits for every queued frame and returns the number that failed to write.
+# If start() is never called, save_figure is just fig.savefig.
+# frames_saved() counts every frame handed to save_figure in this process, for the run metrics (runmetrics.py).
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import threading
+import io
+import os
+
+_writer = {}
+_counts = {"saved": 0}
+
+def start(workers=2, max_pending=8):
+    stop()
+    _writer.update({
+        "pool": ThreadPoolExecutor(max_workers=workers, thread_name_prefix="framewriter"),
+        "slots": threading.BoundedSemaphore(max_pending),
+        "pending": [],
+        "failed": 0,
+        "lock": threading.Lock(),
+    })
+
+def save_figure(fig, path, **kwargs):
+    _counts["saved"] += 1
+    if not _writer:
+        fig.savefig(path, **kwargs)
+        return
+    # tiff without compression keeps the exact pixels, size and dpi of the png savefig would have made
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="tiff", **kwargs)
+    _writer["slots"].acquire()
+    try:
+        future = _writer["pool"].submit(_write_png, buffer, path)
+    except Exception:
+        _writer["slots"].release()
+        raise
+    future.add_done_callback(lambda f: _writer["slots"].release())
+    with _writer["lock"]:
+        _writer["pending"] = [f for f in _writer["pending"] if not f.done()] + [future]
+
+def _write_png(buffer, path):
+    # written to a temp file and moved into place, so the site never serves half an image
+    temp_path = f"{path}.tmp"
+    try:
+        buffer.seek(0)
+        with Image.open(buffer) as image:
+            with open(temp_path, "wb") as f:
+                image.save(f, format="PNG", dpi=image.info.get("dpi", (100, 100)))
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"error writing {path}: {e}!")
+        with _writer["lock"]:
+            _writer["failed"] += 1
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def flush():
+    # wait until everything handed to save_figure so far is on disk. returns how many frames failed
+    if not _writer:
+        return 0
+    with _writer["lock"]:
+        pending, _writer["pending"] = _writer["pending"], []
+    for future in pending:
+        future.result()
+    with _writer["lock"]:
+        failed, _writer["failed"] = _writer["failed"], 0
+    return failed
+
+def frames_saved():
+    return _counts["saved"]
+
+def stop():
+    if _writer:
+        flush()
+        _writer["pool"].shutdown()
+        _writer.clear()
@@ -1,101 +1,103 @@
 # This module generates our meteograms.
+# All airports share one figure: the axes, ticks, labels and lines are built once, and each airport only swaps in
+# its line data, barbs, max/min annotations and legend before saving. Point data comes from one extraction per variable.
 
 import matplotlib.pyplot as plt
 import matplotlib.patheffects as path_effects
-from wrf import getvar, ll_to_xy, to_np
+import pointdata
+import framewriter
 import numpy as np
 import os
 
 
-def plot_meteogram(wrf_file, airport, coords, output_path, forecast_times, wrfhours, run_time):
-    x, y = ll_to_xy(wrf_file, coords[0], coords[1])
+def plot_meteograms(wrf_file, airports, output_root, forecast_times, wrfhours, run_time, run_frame=None):
+    # run_frame(frame, draw) makes one airport's meteogram. ugawrf passes one that times it out, retries it and records
+    # it as failed without stopping the other airports (see ugawrf.run_frame)
+    run_frame = run_frame or (lambda frame, draw: draw())
+    names, xs, ys = pointdata.station_indices(wrf_file, airports)
+    series = pointdata.point_series(wrf_file, xs, ys, ["T2", "td2", "mslp", "U10", "V10"])
     hours = np.arange(1, wrfhours)
+    temperatures_all = (series["T2"][hours] - 273.15) * 9/5 + 32
+    dewpoints_all = series["td2"][hours] * 9/5 + 32
+    pressures_all = series["mslp"][hours] / 100
+    meteogram = create_blank_meteogram(hours, forecast_times)
+    for i, airport in enumerate(names):
+        def draw(i=i, airport=airport):
+            output_path = os.path.join(output_root, airport)
+            try:
+                draw_meteogram(meteogram, airport, hours, temperatures_all[:, i], dewpoints_all[:, i], pressures_all[:, i], series["U10"][hours, i], series["V10"][hours, i], forecast_times, run_time)
+                os.makedirs(output_path, exist_ok=True)
+                framewriter.save_figure(meteogram["fig"], os.path.join(output_path, "meteogram.png"))
+                print(f'-> {airport} meteogram')
+            finally:
+                # a failed airport leaves the blank skeleton behind for the next one too
+                clear_meteogram(meteogram)
+        run_frame(airport, draw)
+    plt.close(meteogram["fig"])
+
+def plot_meteogram(wrf_file, airport, coords, output_path, forecast_times, wrfhours, run_time):
+    # single airport version, kept for older callers
+    plot_meteograms(wrf_file, {airport: coords}, os.path.dirname(os.path.normpath(output_path)), forecast_times, wrfhours, run_time)
+
+def create_blank_meteogram(hours, forecast_times):
+    # everything that's the same for every airport
     times = [forecast_times[t].strftime('%H') for t in hours]
-    u_wind = [to_np(getvar(wrf_file, "U10", timeidx=t)[y, x]) for t in hours]
-    v_wind = [to_np(getvar(wrf_file, "V10", timeidx=t)[y, x]) for t in hours]
-    temperatures = []
-    dewpoints = []
-    pressures = []
-    for t in hours:
-        t_data = getvar(wrf_file, "T2", timeidx=t)[y, x].values
-        td_data = getvar(wrf_file, "td2", timeidx=t)[y, x].values
-        pressure_data = getvar(wrf_file, "AFWA_MSLP", timeidx=t)[y, x].values
-        t_f = (t_data - 273.15) * 9/5 + 32
-        td_f = to_np(td_data) * 9/5 + 32
-        pressure_mb = to_np(pressure_data) / 100
-        temperatures.append(t_f)
-        dewpoints.append(td_f)
-        pressures.append(pressure_mb)
     fig, ax1 = plt.subplots(figsize=(12, 6))
-    ax1.plot(hours, temperatures, color='red', label='Temp (°F)')
-    ax1.plot(hours, dewpoints, color='green', label='Dewp (°F)')
-    if any(t <= 32 for t in temperatures):
-        ax1.axhline(
-            y=32,
-            color='blue',
-            linestyle='--',
-            linewidth=1.5,
-            label='Frz (32°F)'
-        )
-    ax1.barbs(hours, ax1.get_ylim()[0] * 0.95, u_wind, v_wind, length=6, barb_increments={'half': 2.57222, 'full': 5.14444, 'flag': 25.7222}) 
+    temp_line, = ax1.plot(hours, np.zeros(len(hours)), color='red', label='Temp (°F)')
+    dew_line, = ax1.plot(hours, np.zeros(len(hours)), color='green', label='Dewp (°F)')
+    freezing_line = ax1.axhline(y=32, color='blue', linestyle='--', linewidth=1.5, label='Frz (32°F)')
     ax1.set_ylabel('Temperature / Dewpoint (°F)')
-    ax1.set_xlabel('Hour (UTC)') 
+    ax1.set_xlabel('Hour (UTC)')
     ax1.set_xticks(hours)
     ax1.set_xticklabels(times, rotation=45)
-    # will turn this into an actual function later, but just implementing first pass
-    # holy cow this looks so bad
-    start1, end1 = 1, 24
-    maxtemp_x_24 = np.argmax(temperatures[start1:end1]) + start1
-    mintemp_x_24 = np.argmin(temperatures[start1:end1]) + start1
-    maxdew_x_24 = np.argmax(dewpoints[start1:end1]) + start1
-    mindew_x_24 = np.argmin(dewpoints[start1:end1]) + start1
-    max_temp_24 = temperatures[maxtemp_x_24]
-    min_temp_24 = temperatures[mintemp_x_24]
-    max_dew_24 = dewpoints[maxdew_x_24]
-    min_dew_24 = dewpoints[mindew_x_24] 
-    ax1.annotate(f"{max_temp_24:.1f} F", xy=(maxtemp_x_24, max_temp_24), xytext=(maxtemp_x_24 + 1, max_temp_24), color='red', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax1.annotate(f"{min_temp_24:.1f} F", xy=(mintemp_x_24, min_temp_24), xytext=(mintemp_x_24 + 1, min_temp_24), color='red', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax1.annotate(f"{max_dew_24:.1f} F", xy=(maxdew_x_24, max_dew_24), xytext=(maxdew_x_24 + 1, max_dew_24), color='green', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax1.annotate(f"{min_dew_24:.1f} F", xy=(mindew_x_24, min_dew_24), xytext=(mindew_x_24 + 1, min_dew_24), color='green', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    start2, end2 = 24, 48
-    maxtemp_x_48 = np.argmax(temperatures[start2:end2]) + start2
-    mintemp_x_48 = np.argmin(temperatures[start2:end2]) + start2 
-    maxdew_x_48 = np.argmax(dewpoints[start2:end2]) + start2 
-    mindew_x_48 = np.argmin(dewpoints[start2:end2]) + start2
-    max_temp_48 = temperatures[maxtemp_x_48]
-    min_temp_48 = temperatures[mintemp_x_48]
-    max_dew_48 = dewpoints[maxdew_x_48]
-    min_dew_48 = dewpoints[mindew_x_48]
-    ax1.annotate(f"{max_temp_48:.1f} F", xy=(maxtemp_x_48, max_temp_48), xytext=(maxtemp_x_48 + 1, max_temp_48), color='red', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax1.annotate(f"{min_temp_48:.1f} F", xy=(mintemp_x_48, min_temp_48), xytext=(mintemp_x_48 + 1, min_temp_48), color='red', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax1.annotate(f"{max_dew_48:.1f} F", xy=(maxdew_x_48, max_dew_48), xytext=(maxdew_x_48 + 1, max_dew_48), color='green', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax1.annotate(f"{min_dew_48:.1f} F", xy=(mindew_x_48, min_dew_48), xytext=(mindew_x_48 + 1, min_dew_48), color='green', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
     ax2 = ax1.twinx()
-    ax2.plot(hours, pressures, color='blue', label='Pressure (mb)')
+    pressure_line, = ax2.plot(hours, np.zeros(len(hours)), color='blue', label='Pressure (mb)')
     ax2.set_ylabel('MSLP (mb)')
-    maxpressure_x_24 = np.argmax(pressures[start1:end1]) + start1
-    minpressure_x_24 = np.argmin(pressures[start1:end1]) + start1
-    max_pressure_24 = pressures[maxpressure_x_24]
-    min_pressure_24 = pressures[minpressure_x_24]
-    ax2.annotate(f"{max_pressure_24:.1f} mb", xy=(maxpressure_x_24, max_pressure_24), xytext=(maxpressure_x_24 + 1, max_pressure_24), color='blue', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax2.annotate(f"{min_pressure_24:.1f} mb", xy=(minpressure_x_24, min_pressure_24), xytext=(minpressure_x_24 + 1, min_pressure_24), color='blue', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    maxpressure_x_48 = np.argmax(pressures[start2:end2]) + start2
-    minpressure_x_48 = np.argmin(pressures[start2:end2]) + start2
-    max_pressure_48 = pressures[maxpressure_x_48]
-    min_pressure_48 = pressures[minpressure_x_48]
-    ax2.annotate(f"{max_pressure_48:.1f} mb", xy=(maxpressure_x_48, max_pressure_48), xytext=(maxpressure_x_48 + 1, max_pressure_48), color='blue', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
-    ax2.annotate(f"{min_pressure_48:.1f} mb", xy=(minpressure_x_48, min_pressure_48), xytext=(minpressure_x_48 + 1, min_pressure_48), color='blue', fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],)
     ax2.axvline(x=24, color='black', linestyle='--', linewidth=0.5, label='FHR24')
+    ax2.grid(True)
+    return {"fig": fig, "ax1": ax1, "ax2": ax2, "temp_line": temp_line, "dew_line": dew_line, "freezing_line": freezing_line, "pressure_line": pressure_line, "artists": []}
+
+def draw_meteogram(meteogram, airport, hours, temperatures, dewpoints, pressures, u_wind, v_wind, forecast_times, run_time):
+    fig, ax1, ax2 = meteogram["fig"], meteogram["ax1"], meteogram["ax2"]
+    meteogram["temp_line"].set_ydata(temperatures)
+    meteogram["dew_line"].set_ydata(dewpoints)
+    meteogram["freezing_line"].set_visible(any(t <= 32 for t in temperatures))
+    ax1.relim(visible_only=True)
+    ax1.autoscale_view()
+    artists = meteogram["artists"]
+    artists.append(ax1.barbs(hours, ax1.get_ylim()[0] * 0.95, u_wind, v_wind, length=6, barb_increments={'half': 2.57222, 'full': 5.14444, 'flag': 25.7222}))
+    # max/min over the first and second day
+    for start, end in [(1, 24), (24, 48)]:
+        artists += annotate_extremes(ax1, temperatures, start, end, "F", 'red')
+        artists += annotate_extremes(ax1, dewpoints, start, end, "F", 'green')
+    meteogram["pressure_line"].set_ydata(pressures)
+    ax2.relim()
+    ax2.autoscale_view()
+    for start, end in [(1, 24), (24, 48)]:
+        artists += annotate_extremes(ax2, pressures, start, end, "mb", 'blue')
     lines_ax1, labels_ax1 = ax1.get_legend_handles_labels()
     lines_ax2, labels_ax2 = ax2.get_legend_handles_labels()
     all_lines = lines_ax1 + lines_ax2
     all_labels = labels_ax1 + labels_ax2
+    if not meteogram["freezing_line"].get_visible():
+        all_labels = [label for line, label in zip(all_lines, all_labels) if line is not meteogram["freezing_line"]]
+        all_lines = [line for line in all_lines if line is not meteogram["freezing_line"]]
     ax1.legend(all_lines, all_labels, loc="upper left", fancybox=True, framealpha=0.2, fontsize='small')
     ax2.legend(all_lines, all_labels, loc="upper left", fancybox=True, framealpha=0.2, fontsize='small')
-    plt.title(f"UGA-WRF Meteogram - {airport.upper()} - Init: {forecast_times[0]}\nStarting at {forecast_times[1]} UTC", fontweight='bold', loc='left')
-    plt.grid(True)
-    plt.tight_layout()
-    plt.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='figure fraction', fontsize=8, color='black')
-    os.makedirs(output_path, exist_ok=True)
-    plt.savefig(os.path.join(output_path, "meteogram.png"))
-    plt.close()
+    ax2.set_title(f"UGA-WRF Meteogram - {airport.upper()} - Init: {forecast_times[0]}\nStarting at {forecast_times[1]} UTC", fontweight='bold', loc='left')
+    fig.tight_layout()
+    artists.append(ax2.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='figure fraction', fontsize=8, color='black'))
+
+def clear_meteogram(meteogram):
+    # drops the per-airport artists so the next airport starts from the blank skeleton
+    for artist in meteogram["artists"]:
+        artist.remove()
+    meteogram["artists"].clear()
+
+def annotate_extremes(ax, values, start, end, unit, color):
+    max_x = np.argmax(values[start:end]) + start
+    min_x = np.argmin(values[start:end]) + start
+    annotations = []
+    for x in (max_x, min_x):
+        annotations.append(ax.annotate(f"{values[x]:.1f} {unit}", xy=(x, values[x]), xytext=(x + 1, values[x]), color=color, fontsize=14, ha='center', path_effects=[path_effects.withStroke(linewidth=1, foreground="black")],))
+    return annotations
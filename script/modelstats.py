@@ -1,32 +1,62 @@
-from wrf import getvar, to_np, ll_to_xy
+# This module reports hourly model output at our airports for verification.
+# Everything comes from one point extraction per variable (see pointdata.py) and lands in one run-level table;
+# the per-airport CSVs are written from that table for anything that still reads them (comparer.py, the site).
+
+import pointdata
+import statsdb
 import csv
+import os
 
-def generate_model_stats(wrf_file, airport, coords, hours, forecast_times, run_time, output_path):
-    x, y = ll_to_xy(wrf_file, coords[0], coords[1])
+def generate_run_stats(wrf_file, airports, hours, forecast_times, run_time, output_path, stats_db=None, parquet=False, run_table=True, airport_csvs=True):
+    names, xs, ys = pointdata.station_indices(wrf_file, airports)
+    series = pointdata.point_series(wrf_file, xs, ys, ["T2", "td2", "wspd", "wdir", "mslp"])
+    t_f = (series["T2"] - 273.15) * 9/5 + 32
+    td = series["td2"] * 9/5 + 32
+    wspd = series["wspd"] * 2.23694
+    pressure_mb = series["mslp"] / 100
     stats_data = []
-    for t in range(1, hours):
-        t_data = getvar(wrf_file, "T2", timeidx=t)[y, x].values
-        td_data = getvar(wrf_file, "td2", timeidx=t)[y, x].values
-        wspd_data = getvar(wrf_file, "wspd_wdir10", timeidx=t, units="mph")
-        pressure_data = getvar(wrf_file, "AFWA_MSLP", timeidx=t)[y, x].values
-        t_f = (t_data - 273.15) * 9/5 + 32
-        td = td_data * 9/5 + 32
-        wspd = to_np(wspd_data[0][y, x])
-        wdir = to_np(wspd_data[1][y, x])
-        pressure_mb = to_np(pressure_data) / 100
-        stats_data.append({
-            'Init Time (UTC)': forecast_times[0].strftime('%Y-%m-%d %H:%M'),
-            'Airport': airport.upper(),
-            'Forecast Hour': t,
-            'Valid Time (UTC)': forecast_times[t].strftime('%Y-%m-%d %H:%M'),
-            'Temperature (F)': f"{t_f:.2f}",
-            'Dew Point (F)': f"{td:.2f}",
-            'Wind Speed (mph)': f"{wspd:.2f}",
-            'Wind Direction (deg)': f"{wdir:.2f}",
-            'Pressure (mb)': f"{pressure_mb:.2f}"
-        })
+    for i, airport in enumerate(names):
+        for t in range(1, hours):
+            stats_data.append({
+                'Init Time (UTC)': forecast_times[0].strftime('%Y-%m-%d %H:%M'),
+                'Airport': airport.upper(),
+                'Forecast Hour': t,
+                'Valid Time (UTC)': forecast_times[t].strftime('%Y-%m-%d %H:%M'),
+                'Temperature (F)': f"{t_f[t, i]:.2f}",
+                'Dew Point (F)': f"{td[t, i]:.2f}",
+                'Wind Speed (mph)': f"{wspd[t, i]:.2f}",
+                'Wind Direction (deg)': f"{series['wdir'][t, i]:.2f}",
+                'Pressure (mb)': f"{pressure_mb[t, i]:.2f}"
+            })
+    if run_table:
+        write_csv(os.path.join(output_path, f"model_stats_{run_time}.csv"), stats_data)
+    if parquet:
+        write_parquet(os.path.join(output_path, f"model_stats_{run_time}.parquet"), stats_data)
+    if airport_csvs:
+        for airport in names:
+            write_csv(os.path.join(output_path, f"{airport}_model_stats_{run_time}.csv"), [row for row in stats_data if row['Airport'] == airport.upper()])
+    if stats_db is not None:
+        statsdb.append_model_stats(stats_db, stats_data)
+    return stats_data
+
+def generate_model_stats(wrf_file, airport, coords, hours, forecast_times, run_time, output_path, stats_db=None):
+    # single airport version, kept for older callers. only writes that airport's CSV
+    generate_run_stats(wrf_file, {airport: coords}, hours, forecast_times, run_time, output_path, stats_db, run_table=False)
+
+def write_csv(path, stats_data):
     keys = stats_data[0].keys()
-    with open(f"{output_path}/{airport}_model_stats_{run_time}.csv", 'w', newline='') as output_file:
+    with open(path, 'w', newline='') as output_file:
         dict_writer = csv.DictWriter(output_file, fieldnames=keys)
         dict_writer.writeheader()
-        dict_writer.writerows(stats_data)
\ No newline at end of file
+        dict_writer.writerows(stats_data)
+
+def write_parquet(path, stats_data):
+    # typed columns for the parquet copy. needs pandas + pyarrow, which aren't part of the base environment
+    try:
+        import pandas as pd
+        df = pd.DataFrame(stats_data)
+        for col in ['Temperature (F)', 'Dew Point (F)', 'Wind Speed (mph)', 'Wind Direction (deg)', 'Pressure (mb)']:
+            df[col] = df[col].astype(float)
+        df.to_parquet(path, index=False)
+    except ImportError as e:
+        print(f"warning: skipping parquet model stats ({e})")
@@ -0,0 +1,281 @@
+# This module pulls station (point) values out of a wrfout.
+# Every variable is read once for all stations and all hours, instead of one full-grid getvar per hour per airport.
+# Sounding columns (read_column) are read the same way: just the few grid points around the station from each raw 3D
+# field, with the diagnostics (pressure, tc, td, ua, va, z) computed on that window instead of on the whole domain.
+# read_columns does every sounding site at once, from one read of each raw 3D field per timestep.
+# interp_level puts the same diagnostics (plus rh) on a pressure level for the whole domain a model level at a time,
+# in the wrfout's own float32, for weathermaps' --float32 mode.
+# It's also importable on its own for notebooks/downstream jobs:
+#   import pointdata
+#   with pointdata.open_run("wrfout_d01_2025-03-13_21_00_00") as run:
+#       data = run.stations(["ahn", "atl"]).series(["T2", "td2", "wspd", "mslp"])   # {variable: (time, station) array}
+#       ds = run.stations().series(["T2", "td2"], as_xarray=True)                   # every station in stations.py
+
+from netCDF4 import Dataset, chartostring
+import numpy as np
+import datetime as dt
+import json
+import os
+import stations
+import runmetrics
+
+# variables interp_level knows, with wrf-python's getvar names
+LEVEL_VARIABLES = ["pressure", "tc", "td", "rh", "ua", "va", "z"]
+UNITS = {"T2": "K", "td2": "degC", "wspd": "m s-1", "wdir": "degrees", "mslp": "Pa"}
+# json file that keeps station grid indices between runs (see station_indices). None keeps them in memory only
+INDEX_CACHE_FILE = None
+# global attributes that pin down a domain's grid
+DOMAIN_ATTRS = ["MAP_PROJ", "TRUELAT1", "TRUELAT2", "STAND_LON", "MOAD_CEN_LAT", "POLE_LAT", "POLE_LON", "CEN_LAT", "CEN_LON", "DX", "DY", "WEST-EAST_GRID_DIMENSION", "SOUTH-NORTH_GRID_DIMENSION"]
+
+def open_run(path):
+    return Run(path)
+
+class Run:
+    # a wrfout opened lazily - nothing is read until a station series is asked for
+    def __init__(self, path):
+        self.path = path
+        self.wrf_file = Dataset(path)
+        self.init_time = dt.datetime.strptime(str(self.wrf_file.START_DATE), "%Y-%m-%d_%H:%M:%S")
+        self.times = read_times(self.wrf_file)
+
+    def stations(self, names=None):
+        # names from stations.py (case doesn't matter), or every station if names is None
+        if names is None:
+            names = list(stations.airports)
+        unknown = [name for name in names if name.lower() not in stations.airports]
+        if unknown:
+            raise KeyError(f"unknown stations {unknown}. known stations: {list(stations.airports)}")
+        return StationSet(self, {name.lower(): stations.airports[name.lower()] for name in names})
+
+    def close(self):
+        self.wrf_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StationSet:
+    def __init__(self, run, airports):
+        self.run = run
+        self.airports = airports
+        self.names, self.xs, self.ys = station_indices(run.wrf_file, airports)
+
+    def series(self, variables, as_xarray=False):
+        # {variable: (time, station) numpy array}, or an xarray Dataset with time/station coordinates
+        data = point_series(self.run.wrf_file, self.xs, self.ys, variables)
+        if not as_xarray:
+            return data
+        import xarray as xr
+        return xr.Dataset(
+            {variable: (("time", "station"), values, {"units": UNITS.get(variable, getattr(self.run.wrf_file.variables.get(variable), "units", ""))}) for variable, values in data.items()},
+            coords={"time": np.array(self.run.times, dtype="datetime64[s]"), "station": self.names, "x": ("station", self.xs), "y": ("station", self.ys)},
+            attrs={"init_time": str(self.run.init_time), "wrfout": str(self.run.path)},
+        )
+
+def read_times(wrf_file):
+    # valid times straight from the Times variable, so we don't need wrf-python just to know the forecast hours
+    times = wrf_file.variables["Times"][:]
+    if times.ndim == 2:
+        times = chartostring(times)
+    return [dt.datetime.strptime(str(time), "%Y-%m-%d_%H:%M:%S") for time in times]
+
+def station_indices(wrf_file, airports):
+    # grid x/y of every airport from a single ll_to_xy call. returns (names, xs, ys)
+    # the answer only depends on the domain's projection and the coordinates, so it's remembered per domain, and kept
+    # in INDEX_CACHE_FILE if that's set - then runs on a domain we've seen before never import wrf-python for it
+    names = list(airports)
+    cache = _domain_index_cache(wrf_file)
+    keys = [f"{airports[airport][0]},{airports[airport][1]}" for airport in names]
+    missing = [i for i, key in enumerate(keys) if key not in cache]
+    runmetrics.count_cache("station_indices", hits=len(keys) - len(missing), misses=len(missing))
+    if missing:
+        from wrf import ll_to_xy
+        lats = [airports[names[i]][0] for i in missing]
+        lons = [airports[names[i]][1] for i in missing]
+        xy = np.reshape(np.asarray(ll_to_xy(wrf_file, lats, lons)), (2, -1)).astype(int)
+        for j, i in enumerate(missing):
+            cache[keys[i]] = [int(xy[0][j]), int(xy[1][j])]
+        _save_index_cache()
+    xs = np.array([cache[key][0] for key in keys], dtype=int)
+    ys = np.array([cache[key][1] for key in keys], dtype=int)
+    return names, xs, ys
+
+# "domains" is {domain signature: {"lat,lon": [x, y]}}, "file" is the INDEX_CACHE_FILE it was loaded from
+_index_cache = {"file": None, "domains": {}}
+
+def load_index_cache():
+    # reads INDEX_CACHE_FILE into memory, once per file
+    if INDEX_CACHE_FILE and _index_cache["file"] != INDEX_CACHE_FILE:
+        _index_cache["file"] = INDEX_CACHE_FILE
+        if os.path.exists(INDEX_CACHE_FILE):
+            try:
+                with open(INDEX_CACHE_FILE) as f:
+                    _index_cache["domains"].update(json.load(f))
+            except ValueError as e:
+                print(f"warning: {INDEX_CACHE_FILE} is unreadable ({e}), rebuilding it!")
+
+def domain_signature(wrf_file):
+    # the projection and grid attributes that decide where a lat/lon lands on the grid
+    return ";".join(f"{attr}={getattr(wrf_file, attr, '')}" for attr in DOMAIN_ATTRS)
+
+def _domain_index_cache(wrf_file):
+    load_index_cache()
+    return _index_cache["domains"].setdefault(domain_signature(wrf_file), {})
+
+def _save_index_cache():
+    if not INDEX_CACHE_FILE:
+        return
+    try:
+        with open(f"{INDEX_CACHE_FILE}.tmp", "w") as f:
+            json.dump(_index_cache["domains"], f)
+        os.replace(f"{INDEX_CACHE_FILE}.tmp", INDEX_CACHE_FILE)
+    except OSError as e:
+        print(f"warning: couldn't save station index cache {INDEX_CACHE_FILE}: {e}!")
+
+def read_points(wrf_file, varname, xs, ys, timeidx=None):
+    # one read of the box around all stations, then pick the station points out of it. returns (time, station)
+    var = wrf_file.variables[varname]
+    y0, y1 = ys.min(), ys.max() + 1
+    x0, x1 = xs.min(), xs.max() + 1
+    times = slice(None) if timeidx is None else timeidx
+    box = np.ma.getdata(var[times, y0:y1, x0:x1])
+    if box.ndim == 2:
+        return box[ys - y0, xs - x0]
+    return box[:, ys - y0, xs - x0]
+
+def point_series(wrf_file, xs, ys, variables, timeidx=None):
+    # {variable: (time, station) array}. td2 (degC), wspd (m/s), wdir and mslp (Pa) are built from raw fields,
+    # anything else is read straight from the wrfout (2D fields like T2, U10, PSFC, AFWA_TOTPRECIP...).
+    # raw fields are only read once even if several variables need them (wspd and wdir both use U10/V10)
+    raw = {}
+    def get(varname):
+        if varname not in raw:
+            raw[varname] = read_points(wrf_file, varname, xs, ys, timeidx)
+        return raw[varname]
+    series = {}
+    for variable in variables:
+        if variable == "td2":
+            series[variable] = dewpoint(get("PSFC") * 0.01, get("Q2"))
+        elif variable == "wspd":
+            series[variable] = np.sqrt(get("U10") ** 2 + get("V10") ** 2)
+        elif variable == "wdir":
+            series[variable] = wind_direction(get("U10"), get("V10"))
+        elif variable == "mslp":
+            series[variable] = get("AFWA_MSLP")
+        else:
+            series[variable] = get(variable)
+    return series
+
+def read_window(wrf_file, varname, timeidx, ys, xs):
+    # raw field over a window of mass points (ys, xs are slices), one timestep. staggered dimensions get the extra
+    # point on the far side so the window can be destaggered back onto the same mass points
+    var = wrf_file.variables[varname]
+    index = []
+    for dim in var.dimensions:
+        if dim == "Time":
+            index.append(timeidx)
+        elif dim.startswith("south_north"):
+            index.append(slice(ys.start, ys.stop + 1) if dim.endswith("_stag") else ys)
+        elif dim.startswith("west_east"):
+            index.append(slice(xs.start, xs.stop + 1) if dim.endswith("_stag") else xs)
+        else:
+            index.append(slice(None))
+    return np.ma.getdata(var[tuple(index)])
+
+def read_column(wrf_file, y, x, timeidx, halo=0):
+    # {"pressure" (hPa), "tc", "td" (degC), "ua", "va" (m/s), "z" (m)} on a (level, y, x) window of halo grid points
+    # either side of y, x (cut off at the domain edge), worked out the way wrf-python's getvar does it on the full grid.
+    # halo=0 gives (level,) columns
+    ny, nx = wrf_file.variables["T"].shape[-2:]
+    ys, xs = slice(max(y - halo, 0), min(y + halo + 1, ny)), slice(max(x - halo, 0), min(x + halo + 1, nx))
+    get = lambda varname: read_window(wrf_file, varname, timeidx, ys, xs)
+    u, v = get("U"), get("V")
+    fields = column_fields(get, 0.5 * (u[..., :-1] + u[..., 1:]), 0.5 * (v[:, :-1] + v[:, 1:]))
+    if halo == 0:
+        return {name: values[:, 0, 0] for name, values in fields.items()}
+    return fields
+
+def read_columns(wrf_file, ys, xs, timeidx):
+    # read_column for many grid points at once: {"pressure", "tc", "td", "ua", "va", "z"}, each (level, point), for the
+    # points (ys[i], xs[i]). each raw 3D field is read once as the box around all the points (like read_points) and
+    # the columns are picked out of it, so a set of sounding sites costs one pass over the wrfout per timestep
+    y0, x0 = ys.min(), xs.min()
+    box = (slice(y0, ys.max() + 1), slice(x0, xs.max() + 1))
+    iy, ix = ys - y0, xs - x0
+    get = lambda varname: read_window(wrf_file, varname, timeidx, *box)[..., iy, ix]
+    u, v = read_window(wrf_file, "U", timeidx, *box), read_window(wrf_file, "V", timeidx, *box)
+    return column_fields(get, 0.5 * (u[..., iy, ix] + u[..., iy, ix + 1]), 0.5 * (v[..., iy, ix] + v[..., iy + 1, ix]))
+
+def column_fields(get, ua, va):
+    # the sounding diagnostics from get(raw varname) and the winds already on mass points, the way wrf-python's
+    # getvar works them out. the level is the first axis of everything get returns
+    pressure = get("P") + get("PB")
+    # theta is stored as a perturbation from 300K. Rd/Cp = 2/7 like wrf-python
+    tk = (get("T") + 300.0) * (pressure / 100000.0) ** (2.0 / 7.0)
+    pressure *= 0.01
+    geopotential = get("PH") + get("PHB")
+    return {
+        "pressure": pressure,
+        "tc": tk - 273.15,
+        "td": dewpoint(pressure, get("QVAPOR")),
+        "ua": ua,
+        "va": va,
+        "z": 0.5 * (geopotential[:-1] + geopotential[1:]) / 9.81,
+    }
+
+def interp_level(wrf_file, variable, timeidx, level):
+    # variable (see LEVEL_VARIABLES) on the pressure level (hPa) over the whole domain, interpolated linearly in pressure
+    # like wrf-python's interplevel and masked where the level is below the ground. the model levels are gone through
+    # from the bottom up and the reading stops once every column has passed the level, so only two levels of 2D fields
+    # are ever held instead of the 3D pressure and diagnostic, and upper levels aren't read at all for low ones
+    result = below_pressure = below = None
+    for k in range(wrf_file.variables["T"].shape[1]):
+        pressure = np.ma.getdata(wrf_file.variables["P"][timeidx, k]) + np.ma.getdata(wrf_file.variables["PB"][timeidx, k])
+        pressure *= 0.01
+        values = level_values(wrf_file, variable, timeidx, k, pressure)
+        if result is None:
+            result = np.full(pressure.shape, np.nan, dtype=values.dtype)
+        else:
+            crossed = (below_pressure >= level) & (pressure <= level) & np.isnan(result)
+            weight = (below_pressure - level) / np.where(crossed, below_pressure - pressure, 1)
+            np.copyto(result, below + weight * (values - below), where=crossed)
+        if (pressure <= level).all():
+            break
+        below_pressure, below = pressure, values
+    return np.ma.masked_invalid(result)
+
+def level_values(wrf_file, variable, timeidx, k, pressure):
+    # variable on model level k from the raw fields, with the same formulas as column_fields (and wrf-python's rh).
+    # pressure is level k's in hPa
+    read = lambda varname, level=k: np.ma.getdata(wrf_file.variables[varname][timeidx, level])
+    if variable == "pressure":
+        return pressure
+    if variable == "ua":
+        u = read("U")
+        return 0.5 * (u[:, :-1] + u[:, 1:])
+    if variable == "va":
+        v = read("V")
+        return 0.5 * (v[:-1] + v[1:])
+    if variable == "z":
+        return 0.5 * (read("PH") + read("PHB") + read("PH", k + 1) + read("PHB", k + 1)) / 9.81
+    if variable == "td":
+        return dewpoint(pressure, read("QVAPOR"))
+    tk = (read("T") + 300.0) * (pressure / 1000.0) ** (2.0 / 7.0)
+    if variable == "tc":
+        return tk - 273.15
+    # rh over liquid water, like wrf-python's
+    vapor_pressure = 6.112 * np.exp(17.67 * (tk - 273.15) / (tk - 29.65))
+    saturation = 0.622 * vapor_pressure / (pressure - 0.378 * vapor_pressure)
+    return 100 * np.clip(read("QVAPOR") / saturation, 0, 1)
+
+def dewpoint(pressure_hpa, qv):
+    # same formula wrf-python uses for td/td2 (degC)
+    qv = np.maximum(qv, 0.0)
+    vapor_pressure = np.maximum(qv * pressure_hpa / (0.622 + qv), 0.001)
+    return (243.5 * np.log(vapor_pressure) - 440.8) / (19.48 - np.log(vapor_pressure))
+
+def wind_direction(u, v):
+    # meteorological direction the wind is coming from, same as wrf-python's wspd_wdir
+    return np.fmod(270.0 - np.arctan2(v, u) * (180.0 / np.pi), 360.0)
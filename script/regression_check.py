@@ -0,0 +1,302 @@
+# Golden-image and timing regression check for the rendering code (figure reuse, raster mode, map layers...).
+# "record" makes a fixed set of map products (REGRESSION_PRODUCTS), the skew-Ts and the meteograms from a small wrfout
+# and keeps the frames and how long each product took in a golden folder:
+#   (golden)/images/(product)/hour_N.png ...   - the frames, laid out like a run's output folder
+#   (golden)/baseline.json                     - {"wrfout", "args", "products": {product: seconds}, "frames": [...]}
+# "check" makes the same run again and exits with 1 if a frame is missing or differs from its golden image by more
+# than the tolerance, a product errored, or a product got slower than its baseline by more than the threshold.
+# Frames are compared at half size, so antialiasing noise doesn't count but a moved contour or label does.
+# Without --wrfout, record writes a synthetic wrfout (make_synthetic_wrfout) into the golden folder and check uses it.
+# Golden images and timings only hold for the machine and library versions they were recorded on - record them again
+# after upgrading matplotlib/cartopy or moving machines.
+# ex: python regression_check.py record ../golden                        <- before the change
+#     python regression_check.py check ../golden --diffs ../golden_diffs <- after it
+#     python regression_check.py record ../golden_raster --args=--raster
+
+import datetime as dt
+import subprocess
+import tempfile
+import argparse
+import shutil
+import shlex
+import json
+import sys
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_NAME = "baseline.json"
+# a bit of everything: filled contours + barbs + streamlines, smoothed contour lines, masked reflectivity,
+# time differencing, the ptype mesh and an upper level interpolation
+REGRESSION_PRODUCTS = {
+    "temperature": "T2",
+    "pressure": "AFWA_MSLP",
+    "wind": "wspd_wdir10",
+    "comp_reflectivity": "REFD_COM",
+    "1hr_precip": "AFWA_TOTPRECIP",
+    "ptype": "AFWA_SNOW",
+    "temp_850mb": "tc",
+}
+# maps, meteograms and skew-Ts only (see ugawrf.py's run flags)
+RUN_FLAGS = "136"
+SYNTHETIC_NAME = "wrfout_d01_2025-01-15_00_00_00"
+
+def run_products(wrfout, output, extra_args):
+    # one ugawrf run of the fixed product set into output. returns (run folder, {product: seconds}, [error lines])
+    argv = [os.path.abspath(wrfout), os.path.abspath(output), "-r", RUN_FLAGS, "-a", "--skip-previews", "--processes", "1"] + extra_args
+    # the task history and verification database go in output too, not in the real ones
+    code = f"import ugawrf; ugawrf.PRODUCTS = {REGRESSION_PRODUCTS!r}; ugawrf.DATA_FOLDER = {os.path.abspath(output)!r}; ugawrf.main({argv!r})"
+    result = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True)
+    with open(os.path.join(output, "ugawrf.log"), "w") as f:
+        f.write(result.stdout + result.stderr)
+    errors = [line for line in result.stdout.splitlines() if line.startswith("error")]
+    if result.returncode != 0:
+        errors.append(f"ugawrf exited with {result.returncode}: {(result.stderr.strip().splitlines() or [''])[-1]}")
+        return None, {}, errors
+    run_path = None
+    for root, dirs, files in os.walk(output):
+        if "metadata.json" in files:
+            run_path = root
+    if run_path is None:
+        return None, {}, errors + [f"no metadata.json written under {output}"]
+    with open(os.path.join(run_path, "metadata.json")) as f:
+        timing = json.load(f)["timing"]
+    return run_path, {product: entry["seconds"] for product, entry in timing["products"].items()}, errors
+
+def run_repeated(wrfout, output, extra_args, repeat):
+    # frames from the first run, and the fastest time of each product over all of them
+    run_path, seconds, errors = run_products(wrfout, output, extra_args)
+    for i in range(repeat - 1):
+        with tempfile.TemporaryDirectory() as again:
+            more_seconds = run_products(wrfout, again, extra_args)[1]
+        seconds = {product: min(value, more_seconds.get(product, value)) for product, value in seconds.items()}
+    return run_path, seconds, errors
+
+def list_frames(folder):
+    frames = []
+    for root, dirs, files in os.walk(folder):
+        frames += [os.path.relpath(os.path.join(root, name), folder) for name in files if name.endswith(".png")]
+    return sorted(frames)
+
+def compare_images(golden_path, new_path, pixel_delta):
+    # (fraction of pixels that changed, golden and new at half size). a pixel has changed when any channel moved by
+    # more than pixel_delta (0-255). different sizes count as everything changed
+    from PIL import Image
+    import numpy as np
+    golden = Image.open(golden_path).convert("RGB")
+    new = Image.open(new_path).convert("RGB")
+    if golden.size != new.size:
+        return 1.0, None, None
+    golden = np.asarray(golden.reduce(2), dtype=np.int16)
+    new = np.asarray(new.reduce(2), dtype=np.int16)
+    changed = np.abs(golden - new).max(axis=-1) > pixel_delta
+    return float(changed.mean()), golden, changed
+
+def write_diff(path, golden, changed):
+    # the golden frame faded out with the changed pixels in red
+    from PIL import Image
+    import numpy as np
+    diff = (golden * 0.3 + 178).astype(np.uint8)
+    diff[changed] = [255, 0, 0]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(diff).save(path)
+
+def record(golden, wrfout, extra_args, repeat):
+    os.makedirs(golden, exist_ok=True)
+    if wrfout is None:
+        wrfout = os.path.join(golden, SYNTHETIC_NAME)
+        make_synthetic_wrfout(wrfout)
+        print(f"wrote synthetic wrfout {wrfout}")
+    with tempfile.TemporaryDirectory() as output:
+        run_path, seconds, errors = run_repeated(wrfout, output, extra_args, repeat)
+        if errors:
+            print("\n".join(errors))
+            print(f"not recording a baseline from a run with errors, see {os.path.join(output, 'ugawrf.log')}")
+            shutil.copy(os.path.join(output, "ugawrf.log"), os.path.join(golden, "failed_record.log"))
+            return False
+        shutil.rmtree(os.path.join(golden, "images"), ignore_errors=True)
+        shutil.copytree(run_path, os.path.join(golden, "images"), ignore=shutil.ignore_patterns("*.json", "*.tmp"))
+        frames = list_frames(run_path)
+    baseline = {
+        "wrfout": os.path.relpath(os.path.abspath(wrfout), os.path.abspath(golden)),
+        "args": extra_args,
+        "recorded": str(dt.datetime.now()),
+        "products": seconds,
+        "frames": frames,
+    }
+    with open(os.path.join(golden, BASELINE_NAME), "w") as f:
+        json.dump(baseline, f, indent=4)
+    print(f"recorded {len(frames)} frames and {len(seconds)} product timings in {golden}")
+    return True
+
+def check(golden, wrfout, extra_args, repeat, tolerance, pixel_delta, slowdown, slack, diffs):
+    with open(os.path.join(golden, BASELINE_NAME)) as f:
+        baseline = json.load(f)
+    if wrfout is None:
+        wrfout = os.path.join(golden, baseline["wrfout"])
+    if extra_args != baseline["args"]:
+        print(f"warning: the golden frames were made with {baseline['args']}, this run uses {extra_args}!")
+    failures = []
+    with tempfile.TemporaryDirectory() as output:
+        run_path, seconds, errors = run_repeated(wrfout, output, extra_args, repeat)
+        failures += errors
+        frames = list_frames(run_path) if run_path else []
+        for frame in baseline["frames"]:
+            if frame not in frames:
+                failures.append(f"{frame}: missing")
+                continue
+            fraction, golden_pixels, changed = compare_images(os.path.join(golden, "images", frame), os.path.join(run_path, frame), pixel_delta)
+            if fraction > tolerance:
+                failures.append(f"{frame}: {fraction:.2%} of the frame changed" + (" (different size)" if changed is None else ""))
+                if diffs and changed is not None:
+                    write_diff(os.path.join(diffs, frame), golden_pixels, changed)
+        for frame in frames:
+            if frame not in baseline["frames"]:
+                print(f"warning: {frame} is new, it isn't in the golden frames")
+    for product, base_seconds in sorted(baseline["products"].items()):
+        if product not in seconds:
+            continue
+        status = ""
+        if seconds[product] > base_seconds * slowdown and seconds[product] - base_seconds > slack:
+            status = " SLOWER"
+            failures.append(f"{product}: took {seconds[product]:.2f}s, baseline {base_seconds:.2f}s")
+        print(f"{product:>20}: {seconds[product]:.2f}s (baseline {base_seconds:.2f}s){status}")
+    if failures:
+        print(f"{len(failures)} regressions:")
+        print("\n".join(failures))
+        if diffs:
+            print(f"diff images in {diffs}")
+        return False
+    print(f"{len(baseline['frames'])} frames match and no product got slower")
+    return True
+
+def make_synthetic_wrfout(path, hours=4, ny=80, nx=100, nz=16, dx=9000.0):
+    # a small lambert conformal domain over georgia with a low and its rain/snow shield moving east, written with
+    # every variable the regression products, skew-Ts and meteograms read. the fields are plain formulas (no
+    # randomness), so the file comes out the same every time
+    from netCDF4 import Dataset
+    import numpy as np
+    import pyproj
+    start = dt.datetime(2025, 1, 15)
+    proj = pyproj.Proj(proj="lcc", lat_1=30.0, lat_2=60.0, lat_0=33.0, lon_0=-84.0, a=6370000.0, b=6370000.0)
+    def grid(x_count, y_count):
+        x = (np.arange(x_count) - (x_count - 1) / 2) * dx
+        y = (np.arange(y_count) - (y_count - 1) / 2) * dx
+        lon, lat = proj(*np.meshgrid(x, y), inverse=True)
+        return lat.astype(np.float32), lon.astype(np.float32)
+    lat, lon = grid(nx, ny)
+    lat_u, lon_u = grid(nx + 1, ny)
+    lat_v, lon_v = grid(nx, ny + 1)
+    f = Dataset(path, "w")
+    f.setncatts({
+        "TITLE": "SYNTHETIC WRF OUTPUT FOR regression_check.py", "START_DATE": start.strftime("%Y-%m-%d_%H:%M:%S"),
+        "SIMULATION_START_DATE": start.strftime("%Y-%m-%d_%H:%M:%S"), "MAP_PROJ": np.int32(1), "MAP_PROJ_CHAR": "Lambert Conformal",
+        "TRUELAT1": np.float32(30.0), "TRUELAT2": np.float32(60.0), "STAND_LON": np.float32(-84.0), "MOAD_CEN_LAT": np.float32(33.0),
+        "CEN_LAT": np.float32(33.0), "CEN_LON": np.float32(-84.0), "POLE_LAT": np.float32(90.0), "POLE_LON": np.float32(0.0),
+        "DX": np.float32(dx), "DY": np.float32(dx), "DT": np.float32(60.0), "GRID_ID": np.int32(1), "PARENT_ID": np.int32(0),
+        "I_PARENT_START": np.int32(1), "J_PARENT_START": np.int32(1), "WEST-EAST_GRID_DIMENSION": np.int32(nx + 1),
+        "SOUTH-NORTH_GRID_DIMENSION": np.int32(ny + 1), "BOTTOM-TOP_GRID_DIMENSION": np.int32(nz + 1),
+    })
+    for name, size in [("Time", None), ("DateStrLen", 19), ("south_north", ny), ("west_east", nx), ("bottom_top", nz),
+                       ("south_north_stag", ny + 1), ("west_east_stag", nx + 1), ("bottom_top_stag", nz + 1)]:
+        f.createDimension(name, size)
+    def variable(name, dims, units, description, stagger=""):
+        var = f.createVariable(name, "f4", ("Time",) + dims, zlib=True)
+        var.setncatts({"FieldType": np.int32(104), "MemoryOrder": "XYZ" if len(dims) == 3 else "XY ", "units": units,
+                       "description": description, "stagger": stagger, "coordinates": "XLONG XLAT XTIME"})
+        return var
+    times = f.createVariable("Times", "S1", ("Time", "DateStrLen"))
+    xtime = f.createVariable("XTIME", "f4", ("Time",))
+    xtime.setncatts({"units": f"minutes since {start.strftime('%Y-%m-%d %H:%M:%S')}", "description": "minutes since simulation start"})
+    mass, u_stag, v_stag = ("south_north", "west_east"), ("south_north", "west_east_stag"), ("south_north_stag", "west_east")
+    coordinates = [("XLAT", mass, lat, ""), ("XLONG", mass, lon, ""), ("XLAT_U", u_stag, lat_u, "X"), ("XLONG_U", u_stag, lon_u, "X"),
+                   ("XLAT_V", v_stag, lat_v, "Y"), ("XLONG_V", v_stag, lon_v, "Y")]
+    for name, dims, values, stagger in coordinates:
+        variable(name, dims, "degree", name, stagger)
+    for name, units in [("HGT", "m"), ("SINALPHA", ""), ("COSALPHA", "")]:
+        variable(name, mass, units, name)
+    for name, units in [("T2", "K"), ("Q2", "kg kg-1"), ("PSFC", "Pa"), ("U10", "m s-1"), ("V10", "m s-1"), ("AFWA_MSLP", "Pa"),
+                        ("REFD_COM", "dBZ"), ("AFWA_TOTPRECIP", "mm"), ("AFWA_RAIN", "mm"), ("AFWA_SNOW", "mm"), ("AFWA_ICE", "mm"), ("AFWA_FZRA", "mm")]:
+        variable(name, mass, units, name)
+    for name, units in [("T", "K"), ("P", "Pa"), ("PB", "Pa"), ("QVAPOR", "kg kg-1")]:
+        variable(name, ("bottom_top",) + mass, units, name)
+    variable("U", ("bottom_top",) + u_stag, "m s-1", "x-wind component", "X")
+    variable("V", ("bottom_top",) + v_stag, "m s-1", "y-wind component", "Y")
+    variable("PH", ("bottom_top_stag",) + mass, "m2 s-2", "perturbation geopotential", "Z")
+    variable("PHB", ("bottom_top_stag",) + mass, "m2 s-2", "base-state geopotential", "Z")
+    # the rotation from grid to earth winds for this lambert grid, like WRF writes it
+    cone = np.log(np.cos(np.radians(30.0)) / np.cos(np.radians(60.0))) / np.log(np.tan(np.radians(45 - 30.0 / 2)) / np.tan(np.radians(45 - 60.0 / 2)))
+    alpha = np.radians(((lon + 84.0 + 180) % 360 - 180) * cone)
+    eta = np.linspace(1.0, 0.0, nz + 1) ** 1.4
+    totals = {name: np.zeros((ny, nx), dtype=np.float32) for name in ["AFWA_TOTPRECIP", "AFWA_RAIN", "AFWA_SNOW", "AFWA_ICE", "AFWA_FZRA"]}
+    for t in range(hours + 1):
+        valid = start + dt.timedelta(hours=t)
+        times[t] = np.array(list(valid.strftime("%Y-%m-%d_%H:%M:%S")), dtype="S1")
+        xtime[t] = t * 60
+        center_lon, center_lat = -87.0 + 1.2 * t, 33.5
+        low = np.exp(-(((lon - center_lon) / 3.0) ** 2 + ((lat - center_lat) / 2.0) ** 2))
+        shield = np.exp(-(((lon - center_lon - 1.0) / 1.5) ** 2 + ((lat - center_lat - 0.3) / 1.0) ** 2))
+        for name, dims, values, stagger in coordinates:
+            f.variables[name][t] = values
+        f.variables["HGT"][t] = 30.0 + 300.0 * np.clip(lat - 34.0, 0, None)
+        f.variables["SINALPHA"][t] = np.sin(alpha)
+        f.variables["COSALPHA"][t] = np.cos(alpha)
+        mslp = 101800.0 - 1800.0 * low + 100.0 * (lat - 33.0)
+        t2 = 282.0 - 3.5 * (lat - 33.0) + 3.0 * np.sin(2 * np.pi * (t - 9) / 24) - 2.0 * low
+        dewpoint_c = t2 - 273.15 - 4.0 + 3.0 * shield
+        vapor_pressure = 6.112 * np.exp(17.67 * dewpoint_c / (dewpoint_c + 243.5))
+        psfc = mslp - 12.0 * f.variables["HGT"][t]
+        q2 = 0.622 * vapor_pressure / (psfc / 100.0 - vapor_pressure)
+        u10 = 3.0 - 14.0 * low * (lat - center_lat) / 2.0
+        v10 = 14.0 * low * (lon - center_lon) / 3.0
+        rate = 6.0 * shield
+        rain_fraction = np.clip((t2 - 272.0) / 2.0, 0, 1)
+        totals["AFWA_TOTPRECIP"] += rate
+        totals["AFWA_SNOW"] += rate * (1 - rain_fraction)
+        totals["AFWA_FZRA"] += rate * rain_fraction * (t2 < 273.5) * 0.5
+        totals["AFWA_ICE"] += rate * rain_fraction * (t2 < 273.5) * 0.5
+        totals["AFWA_RAIN"] += rate * rain_fraction * (t2 >= 273.5)
+        fields = {"T2": t2, "Q2": q2, "PSFC": psfc, "U10": u10, "V10": v10, "AFWA_MSLP": mslp, "REFD_COM": 58.0 * shield - 5.0, **totals}
+        for name, values in fields.items():
+            f.variables[name][t] = values
+        # columns: terrain following levels from the surface to 50mb, a standard lapse rate up to a 217K tropopause
+        pressure_w = 5000.0 + eta[:, None, None] * (psfc - 5000.0)
+        pressure = 0.5 * (pressure_w[:-1] + pressure_w[1:])
+        height_w = (t2 / 0.0065) * (1 - (pressure_w / psfc) ** 0.190263) + f.variables["HGT"][t]
+        height = 0.5 * (height_w[:-1] + height_w[1:])
+        tk = np.maximum(t2 - 0.0065 * (height - f.variables["HGT"][t]), 217.0)
+        winds = 1.0 + 2.5 * (1 - pressure / psfc)
+        u = u10 * winds + 20.0 * (1 - pressure / psfc)
+        v = v10 * winds
+        f.variables["T"][t] = tk * (100000.0 / pressure) ** (2.0 / 7.0) - 300.0
+        f.variables["P"][t] = np.zeros_like(pressure)
+        f.variables["PB"][t] = pressure
+        f.variables["QVAPOR"][t] = q2 * (pressure / psfc) ** 3
+        f.variables["PH"][t] = np.zeros_like(height_w)
+        f.variables["PHB"][t] = 9.81 * height_w
+        f.variables["U"][t] = np.concatenate([u[..., :1], 0.5 * (u[..., :-1] + u[..., 1:]), u[..., -1:]], axis=-1)
+        f.variables["V"][t] = np.concatenate([v[:, :1], 0.5 * (v[:, :-1] + v[:, 1:]), v[:, -1:]], axis=1)
+    f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the rendered frames and product timings against a recorded golden run.')
+    parser.add_argument('action', choices=['record', 'check'], help='record: make the golden frames and timing baseline. check: compare a new run against them.')
+    parser.add_argument('golden', type=str, help='Folder the golden frames and baseline.json are kept in.')
+    parser.add_argument('--wrfout', type=str, default=None, help="wrfout to run on. Defaults to a synthetic one written into the golden folder by record.")
+    parser.add_argument('--args', type=str, default="", help='Extra ugawrf.py arguments for the run, e.g. "--raster". check should use the ones record used.')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs to take the fastest time of each product from.')
+    parser.add_argument('--tolerance', type=float, default=0.002, help='Fraction of a (half size) frame that may change before it counts as drifted.')
+    parser.add_argument('--pixel-delta', type=int, default=24, help='How far (0-255) a pixel may move in any channel before it counts as changed.')
+    parser.add_argument('--slowdown', type=float, default=1.25, help='A product fails when it takes more than this many times its baseline...')
+    parser.add_argument('--slack', type=float, default=1.0, help='...and more than this many seconds over it, so tiny products don\'t fail on noise.')
+    parser.add_argument('--diffs', type=str, default=None, help='Write an image of each drifted frame with the changed pixels in red here.')
+    args = parser.parse_args()
+    extra_args = shlex.split(args.args)
+    if args.action == 'record':
+        ok = record(args.golden, args.wrfout, extra_args, args.repeat)
+    else:
+        ok = check(args.golden, args.wrfout, extra_args, args.repeat, args.tolerance, args.pixel_delta, args.slowdown, args.slack, args.diffs)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
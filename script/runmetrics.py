@@ -0,0 +1,205 @@
+# This module keeps live progress numbers for the run in progress and publishes them for monitoring, in the
+# prometheus text format:
+#   ugawrf_tasks{state}                  - tasks pending, running, done, error and skipped
+#   ugawrf_frames{module}                - frames made so far (the current task's frames count as they're saved)
+#   ugawrf_frames_per_minute{module}     - frames per minute of task time, from the finished tasks
+#   ugawrf_cache_hits/misses{cache}      - lookups of the caches kept between frames (render context, accumulations,
+#                                          station indices, sounding profiles) - see count_cache
+#   ugawrf_worker_rss_mb{worker}         - resident memory of this process, and the last peak each other worker reported
+#   ugawrf_eta_seconds                   - what's left, from the task history (costmodel.py) or the rate so far
+# ugawrf.py --metrics-file writes them to a file (replaced in one step, for node_exporter's textfile collector) and
+# --metrics-port serves them at http://localhost:(port)/metrics. Either way they're refreshed at most every
+# REFRESH_INTERVAL seconds, and the final numbers go in metadata.json under "metrics".
+# Every process counts its own cache lookups; run_task hands them back with each task's result (take_cache_counts),
+# so tasks made by workqueue.py workers count too.
+
+import threading
+import time
+import os
+
+REFRESH_INTERVAL = 5
+METRICS_HOST = "127.0.0.1"
+TASK_STATES = ["pending", "running", "done", "error", "skipped"]
+
+_metrics = {}
+_cache_counts = {}
+
+def count_cache(cache, hits=0, misses=0):
+    # called by the caches themselves, whether or not a run is being watched
+    counts = _cache_counts.setdefault(cache, {"hits": 0, "misses": 0})
+    counts["hits"] += hits
+    counts["misses"] += misses
+
+def take_cache_counts():
+    # the lookups since the last call, for a task's result
+    counts = {cache: dict(entry) for cache, entry in _cache_counts.items()}
+    _cache_counts.clear()
+    return counts
+
+def start(run, tasks, processes=1, model=None, textfile=None, port=None):
+    import costmodel
+    stop()
+    _metrics.update({
+        "labels": f'run="{run["file_path"][0]}",domain="{run["file_path"][1]}"',
+        "started": time.time(),
+        "processes": max(1, processes),
+        "tasks": {task["id"]: {"module": task["module"], "frames": task.get("frames", 1), "state": "pending", "estimate": costmodel.estimate(model, task)[0] if model else None} for task in tasks},
+        "caches": {},
+        "workers": {},
+        "textfile": textfile,
+        "written": 0,
+        "lock": threading.Lock(),
+    })
+    # anything counted before the run started (opening the wrfout...) belongs to nobody
+    take_cache_counts()
+    if port:
+        _metrics["server"] = serve(port)
+        print(f"metrics at http://{METRICS_HOST}:{port}/metrics")
+    refresh(force=True)
+
+def task_started(task_id, worker="local"):
+    import framewriter
+    task = _metrics.get("tasks", {}).get(task_id)
+    if task is None or task["state"] != "pending":
+        return
+    with _metrics["lock"]:
+        task.update({"state": "running", "started": time.time(), "worker": worker})
+        if worker == "local":
+            task["frames_at_start"] = framewriter.frames_saved()
+    refresh()
+
+def task_finished(task_id, result):
+    # each task is counted once, however many times it's reported (a queued task is seen by the worker that made
+    # it and again in the done folder)
+    task = _metrics.get("tasks", {}).get(task_id)
+    if task is None or task["state"] in ("done", "error", "skipped"):
+        return
+    with _metrics["lock"]:
+        task.update({"state": result["status"], "seconds": result.get("seconds", 0)})
+        for cache, counts in result.get("caches", {}).items():
+            total = _metrics["caches"].setdefault(cache, {"hits": 0, "misses": 0})
+            total["hits"] += counts["hits"]
+            total["misses"] += counts["misses"]
+        if result.get("peak_mb"):
+            _metrics["workers"][result.get("host", "local")] = result["peak_mb"]
+    refresh()
+
+def is_finished(task_id):
+    task = _metrics.get("tasks", {}).get(task_id)
+    return task is None or task["state"] in ("done", "error", "skipped")
+
+def snapshot():
+    # the numbers as a dict - what goes in metadata.json, and what render turns into text
+    import framewriter
+    import costmodel
+    now = time.time()
+    with _metrics["lock"]:
+        tasks = [dict(task) for task in _metrics["tasks"].values()]
+        caches = {cache: dict(counts) for cache, counts in _metrics["caches"].items()}
+        workers = dict(_metrics["workers"])
+    states = {state: sum(task["state"] == state for task in tasks) for state in TASK_STATES}
+    frames, seconds = {}, {}
+    for task in tasks:
+        frames.setdefault(task["module"], 0)
+        if task["state"] == "done":
+            frames[task["module"]] += task["frames"]
+            seconds[task["module"]] = seconds.get(task["module"], 0) + task["seconds"]
+        elif task["state"] == "running" and "frames_at_start" in task:
+            frames[task["module"]] += min(task["frames"], framewriter.frames_saved() - task["frames_at_start"])
+    # estimates for what's left: the task history's if there is one, otherwise this run's seconds per frame of the
+    # module (or of everything done so far)
+    per_frame = {module: seconds[module] / frames[module] for module in seconds if frames[module]}
+    done_frames = sum(task["frames"] for task in tasks if task["state"] == "done")
+    overall = sum(seconds.values()) / done_frames if done_frames else None
+    remaining = 0
+    for task in tasks:
+        if task["state"] not in ("pending", "running"):
+            continue
+        estimate = task["estimate"] or (per_frame.get(task["module"], overall) or 0) * task["frames"] or None
+        if estimate is None:
+            remaining = None
+            break
+        if task["state"] == "running":
+            estimate = max(0, estimate - (now - task["started"]))
+        remaining += estimate
+    workers["local"] = costmodel.resident_memory_mb()
+    return {
+        "tasks": states,
+        "frames": frames,
+        "frames_per_minute": {module: round(frames[module] / seconds[module] * 60, 2) for module in seconds if seconds[module] > 0},
+        "caches": {cache: dict(counts, hit_rate=round(counts["hits"] / max(1, counts["hits"] + counts["misses"]), 3)) for cache, counts in caches.items()},
+        "worker_rss_mb": workers,
+        "elapsed_seconds": round(now - _metrics["started"], 1),
+        "eta_seconds": None if remaining is None else round(remaining / _metrics["processes"], 1),
+    }
+
+def render(numbers):
+    labels = _metrics["labels"]
+    lines = []
+    def metric(name, help_text, values):
+        # values is {extra label: value}, or a single value
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for extra, value in (values.items() if isinstance(values, dict) else [(None, values)]):
+            if value is not None:
+                lines.append(f"{name}{{{labels}{',' + extra if extra else ''}}} {value}")
+    metric("ugawrf_tasks", "Tasks of the run by state.", {f'state="{state}"': count for state, count in numbers["tasks"].items()})
+    metric("ugawrf_frames", "Frames made so far.", {f'module="{module}"': count for module, count in numbers["frames"].items()})
+    metric("ugawrf_frames_per_minute", "Frames per minute of task time.", {f'module="{module}"': rate for module, rate in numbers["frames_per_minute"].items()})
+    metric("ugawrf_cache_hits", "Cache lookups that found what they wanted.", {f'cache="{cache}"': counts["hits"] for cache, counts in numbers["caches"].items()})
+    metric("ugawrf_cache_misses", "Cache lookups that had to compute it.", {f'cache="{cache}"': counts["misses"] for cache, counts in numbers["caches"].items()})
+    metric("ugawrf_worker_rss_mb", "Resident memory of this process, and the last peak reported by each other worker.", {f'worker="{worker}"': mb for worker, mb in numbers["worker_rss_mb"].items()})
+    metric("ugawrf_elapsed_seconds", "Seconds since the run started.", numbers["elapsed_seconds"])
+    metric("ugawrf_eta_seconds", "Estimated seconds until the run is done.", numbers["eta_seconds"])
+    metric("ugawrf_last_update_seconds", "Unix time these numbers are from.", round(time.time(), 1))
+    return "\n".join(lines) + "\n"
+
+def refresh(force=False):
+    # rewrites the metrics file, at most every REFRESH_INTERVAL seconds unless forced. the http endpoint renders on request
+    if not _metrics or not _metrics["textfile"] or (not force and time.time() - _metrics["written"] < REFRESH_INTERVAL):
+        return
+    _metrics["written"] = time.time()
+    path = _metrics["textfile"]
+    try:
+        text = render(snapshot())
+        with open(f"{path}.tmp", "w") as f:
+            f.write(text)
+        os.replace(f"{path}.tmp", path)
+    except Exception as e:
+        print(f"error writing metrics {path}: {e}!")
+
+def serve(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics" or not _metrics:
+                self.send_error(404)
+                return
+            body = render(snapshot()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            # scrapes would drown out the run's own output
+            pass
+    server = ThreadingHTTPServer((METRICS_HOST, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def finish():
+    # the final numbers (for metadata.json). the file keeps them, the http endpoint goes away
+    if not _metrics:
+        return None
+    refresh(force=True)
+    numbers = snapshot()
+    stop()
+    return numbers
+
+def stop():
+    if _metrics.get("server"):
+        _metrics["server"].shutdown()
+        _metrics["server"].server_close()
+    _metrics.clear()
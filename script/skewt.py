@@ -1,6 +1,5 @@
 # This module generates our upper air charts.
 
-from wrf import getvar
 from metpy.plots import SkewT, Hodograph
 import matplotlib
 matplotlib.use("Agg")
@@ -12,11 +11,15 @@ import os
 import metpy.calc as mpcalc
 import numpy as np
 from adjustText import adjust_text
+import framewriter
+import pointdata
+import runmetrics
 
 
 #Original sounding function but is not currently used
 def plot_skewt_dep(data, x_y, timestep, airport, output_path, forecast_times, init_dt, init_str, run_time):
     # old skewt code, to be removed in future push
+    from wrf import getvar
     valid_time = forecast_times[timestep]
     f_hour = int(round((valid_time - init_dt).total_seconds() / 3600))
     valid_time_str = valid_time.strftime("%Y-%m-%d %H:%M UTC")
@@ -123,7 +126,7 @@ def plot_skewt_dep(data, x_y, timestep, airport, output_path, forecast_times, in
     fig.suptitle(f"Upper Air Data for {airport.upper()} - Hour {f_hour}\nValid: {valid_time_str} - Init: {init_str}", x=0.4, ha="center", va="top")
     plt.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='figure fraction', fontsize=8, color='black')
     os.makedirs(output_path, exist_ok=True)
-    plt.savefig(os.path.join(output_path, f"hour_{f_hour}.png"), bbox_inches='tight')
+    framewriter.save_figure(fig, os.path.join(output_path, f"hour_{f_hour}.png"), bbox_inches='tight')
     plt.close()
     fig_hod = plt.figure(figsize=(6, 6))
     ax_hod = fig_hod.add_subplot(1, 1, 1)
@@ -152,7 +155,7 @@ def plot_skewt_dep(data, x_y, timestep, airport, output_path, forecast_times, in
     ax_hod.set_xlabel('U (knots)')
     ax_hod.set_ylabel('V (knots)')
     fig_hod.tight_layout()
-    fig_hod.savefig(
+    framewriter.save_figure(fig_hod,
     os.path.join(output_path, f"hodograph_hour_{f_hour}.png"),bbox_inches='tight')
     plt.close(fig_hod)
 
@@ -160,7 +163,8 @@ def plot_skewt_dep(data, x_y, timestep, airport, output_path, forecast_times, in
 #Init_dt is the datetime objects and init_str is the string version of that object
 #data = wrf file, x_y is the lat/lon for the selected airports 
 #forecast time is an array of dtatetime objects
-def plot_sounding(data, x_y, timestep, airport, output_path, forecast_times, init_dt, init_str, run_time):
+#profile is the station's column from station_profile, if it's already been extracted
+def plot_sounding(data, x_y, timestep, airport, output_path, forecast_times, init_dt, init_str, run_time, profile=None):
     #Defining forecast times:
     #timestep is obtainined through the for-loop in ugawrf
     valid_time = forecast_times[timestep]
@@ -169,7 +173,9 @@ def plot_sounding(data, x_y, timestep, airport, output_path, forecast_times, ini
     f_hour = int(round((valid_time - init_dt).total_seconds() / 3600))
 
     #Extract the main data fields from the wrf out file
-    pressure, temperature, dewpoint, Xcomponent_windspeed, Ycomponent_windspeed, height = extract_data_from_wrf(data, timestep, x_y)
+    if profile is None:
+        profile = extract_data_from_wrf(data, timestep, x_y)
+    pressure, temperature, dewpoint, Xcomponent_windspeed, Ycomponent_windspeed, height = profile
 
     #Creates a blank skewT
     skew, fig = create_blank_skewT()
@@ -204,37 +210,56 @@ def plot_sounding(data, x_y, timestep, airport, output_path, forecast_times, ini
 
     #Saves the sounding in the proper folder
     os.makedirs(output_path, exist_ok=True)
-    plt.savefig(os.path.join(output_path, f"hour_{f_hour}.png"))
+    framewriter.save_figure(fig, os.path.join(output_path, f"hour_{f_hour}.png"))
     plt.close()
 
     print(f'-> {airport} skewt hr {f_hour}')
 
 #Extract the main data fields from the wrfout file 
 def extract_data_from_wrf(wrfout, timestep, x_y):
-    #Obtains variables from the wrfout file
-    pressure = getvar(wrfout, "pressure", timeidx = timestep)
-    temperature = getvar(wrfout, "tc", timeidx = timestep)
-    dewpoint = getvar(wrfout, "td", timeidx = timestep)
-    Xcomponent_windspeed = getvar(wrfout, "ua", timeidx = timestep)
-    Ycomponent_windspeed = getvar(wrfout, "va", timeidx = timestep)
-    height = getvar(wrfout, "z",timeidx = timestep)
-
-    #What exactly does ":, x_y[0], x_y[1]" mean? 
-    #Extract data (w.r.t to height) at a particular location + specifiy units 
-    pressure = pressure[:, x_y[0], x_y[1]] * units.hPa
-    temperature = temperature[:, x_y[0], x_y[1]] * units.degC
-    dewpoint = dewpoint[:, x_y[0], x_y[1]] * units.degC
-    Xcomponent_windspeed = Xcomponent_windspeed[:, x_y[0], x_y[1]] * units.knots
-    Ycomponent_windspeed = Ycomponent_windspeed[:, x_y[0], x_y[1]] * units.knots
-    height = height[:, x_y[0], x_y[1]] * units.meters
-
-    #Reassigns the data into a unit array
-    pressure = pressure.metpy.unit_array
-    temperature = temperature.metpy.unit_array
-    dewpoint = dewpoint.metpy.unit_array
-    Xcomponent_windspeed = Xcomponent_windspeed.metpy.unit_array
-    Ycomponent_windspeed = Ycomponent_windspeed.metpy.unit_array
-    height = height.metpy.unit_array
+    #Reads just this column from the wrfout (see pointdata.read_column) instead of computing every field on the
+    #whole domain and slicing one column out. It's the same grid point the full-grid version used, [:, x_y[0], x_y[1]]
+    column = pointdata.read_column(wrfout, x_y[0], x_y[1], timestep)
+    return column_profile(column)
+
+#One sounding site's profile at one timestep, like extract_data_from_wrf's. stations is every sounding site:
+#all their columns come out of one pointdata.read_columns pass, kept for the wrfout, so the skewt task (which
+#makes every station's sounding for its hours, see ugawrf.run_skewt) reads each hour's raw 3D fields once
+_profiles = {"file": None, "stations": None, "hours": {}}
+def station_profile(wrfout, stations, airport, timestep):
+    key = tuple(stations.items())
+    if _profiles["file"] is not wrfout or _profiles["stations"] != key:
+        clear_profiles()
+        _profiles.update({"file": wrfout, "stations": key})
+    runmetrics.count_cache("station_profiles", hits=int(timestep in _profiles["hours"]), misses=int(timestep not in _profiles["hours"]))
+    if timestep not in _profiles["hours"]:
+        names, xs, ys = pointdata.station_indices(wrfout, stations)
+        #Same grid point order as extract_data_from_wrf, [:, x_y[0], x_y[1]] with x_y = (x, y). A site whose point is
+        #off the grid is left out, so only its own soundings fail
+        ny, nx = wrfout.variables["T"].shape[-2:]
+        inside = (xs >= 0) & (xs < ny) & (ys >= 0) & (ys < nx)
+        profiles = {}
+        if inside.any():
+            columns = pointdata.read_columns(wrfout, xs[inside], ys[inside], timestep)
+            for i, name in enumerate(np.array(names)[inside]):
+                profiles[name] = {field: values[:, i].copy() for field, values in columns.items()}
+        _profiles["hours"][timestep] = profiles
+    if airport not in _profiles["hours"][timestep]:
+        raise IndexError(f"{airport}'s grid point is outside the domain")
+    return column_profile(_profiles["hours"][timestep][airport])
+
+def clear_profiles():
+    _profiles.update({"file": None, "stations": None, "hours": {}})
+
+#The (pressure, temperature, dewpoint, u, v, height) plot_sounding uses, with units, from a pointdata column
+def column_profile(column):
+    #Specify units
+    pressure = column["pressure"] * units.hPa
+    temperature = column["tc"] * units.degC
+    dewpoint = column["td"] * units.degC
+    Xcomponent_windspeed = column["ua"] * units.knots
+    Ycomponent_windspeed = column["va"] * units.knots
+    height = column["z"] * units.meters
 
     return pressure, temperature, dewpoint,  Xcomponent_windspeed, Ycomponent_windspeed, height
 
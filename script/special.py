@@ -1,13 +1,14 @@
 # This module is intended for special operations that require one-time code - such as 4-panel cloud cover.
 
 from wrf import getvar, to_np, latlon_coords, ll_to_xy
-from weathermaps import get_truncated_cmap, kuchera_ratio
+from weathermaps import get_truncated_cmap, accumulation, kuchera_snowfall
 import numpy as np
 import matplotlib.pyplot as plt
 import os
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 from metpy.plots import USCOUNTIES
+import framewriter
 
 def hr24_change(output_path, airports, hours, forecast_times, run_time, init_dt, init_str, wrf_file, partial=False):
     if partial:
@@ -47,7 +48,7 @@ def hr24_change(output_path, airports, hours, forecast_times, run_time, init_dt,
         plt.tight_layout()
         ax.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.02), xycoords='axes fraction', fontsize=8, color='black')
         os.makedirs(output_path, exist_ok=True)
-        plt.savefig(os.path.join(output_path, f"24hr_change.png"))
+        framewriter.save_figure(plt.gcf(), os.path.join(output_path, f"24hr_change.png"))
         plt.close()
 
 def generate_cloud_cover(t, output_path, forecast_times, run_time, init_dt, init_str, wrf_file):
@@ -73,20 +74,20 @@ def generate_cloud_cover(t, output_path, forecast_times, run_time, init_dt, init
     plt.suptitle(f"Cloud Cover - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}", fontweight='bold', fontsize=14)
     plt.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='figure fraction', fontsize=8, color='black')
     os.makedirs(output_path, exist_ok=True)
-    plt.savefig(os.path.join(output_path, f"hour_{f_hour}.png"))
+    framewriter.save_figure(fig, os.path.join(output_path, f"hour_{f_hour}.png"))
     plt.close(fig)
 
 def plot_4panel_ptype(t, output_path, forecast_times, run_time, init_dt, init_str, wrf_file):
     valid_time = forecast_times[t]
     f_hour = int(round((valid_time - init_dt).total_seconds() / 3600))
     valid_time_str = valid_time.strftime("%Y-%m-%d %H:%M UTC")
-    temp = getvar(wrf_file, "tk", timeidx=t) - 273.15
-    pressure = getvar(wrf_file, "pressure", timeidx=t)
-    snow = (getvar(wrf_file, "AFWA_SNOW", timeidx=t) / 25.4) * kuchera_ratio(temp, pressure)
-    rain = getvar(wrf_file, "AFWA_RAIN", timeidx=t) / 25.4
-    fzra = getvar(wrf_file, "AFWA_FZRA", timeidx=t) / 25.4
-    ice = getvar(wrf_file, "AFWA_ICE", timeidx=t) / 25.4
-    lats, lons = latlon_coords(snow)
+    # run totals so far, from the same once-per-run read the ptype and 1hr_precip maps use. snow is each hour's
+    # snow at that hour's Kuchera ratio, added up (see weathermaps.kuchera_snowfall)
+    snow = kuchera_snowfall(wrf_file, t)
+    rain = accumulation(wrf_file, "AFWA_RAIN")["total"][t] / 25.4
+    fzra = accumulation(wrf_file, "AFWA_FZRA")["total"][t] / 25.4
+    ice = accumulation(wrf_file, "AFWA_ICE")["total"][t] / 25.4
+    lats, lons = wrf_file.variables["XLAT"][t], wrf_file.variables["XLONG"][t]
     fig, axes = plt.subplots(nrows=2, ncols=2, figsize=(12, 10), subplot_kw={'projection': ccrs.PlateCarree()})
     ptype_data = [to_np(rain), to_np(snow), to_np(fzra), to_np(ice)]
     titles = ["Rain Total (in)", "Snowfall Total (in, Kuchera)", "Freezing Rain Total (in)", "Ice Fall Total (in, liquid equiv.)"]
@@ -108,5 +109,5 @@ def plot_4panel_ptype(t, output_path, forecast_times, run_time, init_dt, init_st
     plt.tight_layout()
     plt.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='figure fraction', fontsize=8, color='black')
     os.makedirs(output_path, exist_ok=True)
-    plt.savefig(os.path.join(output_path, f"hour_{f_hour}.png"))
+    framewriter.save_figure(fig, os.path.join(output_path, f"hour_{f_hour}.png"))
     plt.close(fig)
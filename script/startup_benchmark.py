@@ -0,0 +1,105 @@
+# Times how long each ugawrf path takes to start, i.e. to import everything it needs before any work is done.
+# Every path is timed in a fresh interpreter (imports are cached after the first one), a few times, and the median is
+# compared against its target. The text and modelstats paths should start in under a second.
+# ex: python startup_benchmark.py                      <- all paths
+#     python startup_benchmark.py text modelstats --top 10   <- also list the 10 slowest imports of each path
+#     python startup_benchmark.py --wrfout wrfout_d01_2025-03-13_21_00_00   <- also time a real text-only run end to end
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+import os
+import re
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# path: modules imported by ugawrf for it (ugawrf itself is always imported first)
+PATHS = {
+    "cli": [],
+    "text": ["netCDF4", "pointdata", "framewriter", "catalog", "textgen"],
+    "modelstats": ["netCDF4", "pointdata", "framewriter", "catalog", "modelstats"],
+    "meteogram": ["netCDF4", "pointdata", "framewriter", "catalog", "meteogram"],
+    "skewt": ["netCDF4", "pointdata", "framewriter", "catalog", "skewt"],
+    "weathermaps": ["netCDF4", "pointdata", "framewriter", "catalog", "weathermaps"],
+    "special": ["netCDF4", "pointdata", "framewriter", "catalog", "special"],
+    "comparer": ["comparer"],
+}
+# seconds. paths without a target are just reported
+TARGETS = {"cli": 1.0, "text": 1.0, "modelstats": 1.0}
+
+def time_path(modules, repeat):
+    # wall time of a fresh interpreter importing ugawrf and the path's modules. returns (median, error or None)
+    code = "; ".join(f"import {module}" for module in ["ugawrf"] + modules)
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+    return statistics.median(times), None
+
+def slowest_imports(modules, top):
+    # [(cumulative seconds, module)] from python -X importtime
+    code = "; ".join(f"import {module}" for module in ["ugawrf"] + modules)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        # top level imports only, nested ones are already counted in their parent
+        if match and len(match.group(2)) <= 1:
+            imports.append((int(match.group(1)) / 1e6, match.group(3)))
+    return sorted(imports, reverse=True)[:top]
+
+def time_text_run(wrfout, repeat):
+    # a real text-only run (no maps, meteograms, skewts or modelstats) into a throwaway folder
+    import tempfile
+    times = []
+    for i in range(repeat):
+        with tempfile.TemporaryDirectory() as output:
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "ugawrf.py", os.path.abspath(wrfout), output, "-r", "23456", "--skip-previews"], cwd=SCRIPT_DIR, capture_output=True, text=True)
+            times.append(time.perf_counter() - start)
+            if result.returncode != 0:
+                print(result.stdout + result.stderr)
+                return None
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the startup (import) cost of each ugawrf path.')
+    parser.add_argument('paths', type=str, nargs='*', help=f'Paths to time. Defaults to all of {list(PATHS)}.')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per path. The median is reported.')
+    parser.add_argument('--top', type=int, default=0, help='Also list the N slowest top-level imports of each path.')
+    parser.add_argument('--wrfout', type=str, default=None, help='Also time a full text-only ugawrf run on this wrfout.')
+    args = parser.parse_args()
+    paths = args.paths or list(PATHS)
+    unknown = [path for path in paths if path not in PATHS]
+    if unknown:
+        parser.error(f"unknown paths {unknown}. known paths: {list(PATHS)}")
+    baseline, error = time_path([], args.repeat)
+    print(f"python startup + ugawrf import: {baseline:.3f}s")
+    missed = []
+    for path in paths:
+        elapsed, error = time_path(PATHS[path], args.repeat)
+        if error:
+            print(f"{path:>12}: can't import ({error})")
+            continue
+        target = TARGETS.get(path)
+        status = "" if target is None else (" ok" if elapsed < target else f" SLOWER THAN {target:.1f}s TARGET")
+        if target is not None and elapsed >= target:
+            missed.append(path)
+        print(f"{path:>12}: {elapsed:.3f}s{status}")
+        for seconds, module in (slowest_imports(PATHS[path], args.top) if args.top else []):
+            print(f"{'':>14}{seconds:.3f}s {module}")
+    if args.wrfout:
+        elapsed = time_text_run(args.wrfout, max(1, args.repeat // 2))
+        if elapsed is not None:
+            print(f"text-only run on {args.wrfout}: {elapsed:.3f}s")
+    if missed:
+        print(f"warning: {missed} missed their startup targets!")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
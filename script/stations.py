@@ -0,0 +1,30 @@
+# Our station list. ugawrf.py, pointdata.py and anything else that needs point forecasts read it from here.
+
+high_prio_airports ={
+    "ahn": (33.95167820706025, -83.32489875559355),
+    "cni": (34.30887599509864, -84.4273590802223),
+    "ffc": (33.358755552804176, -84.5711101702346),
+    "mcn": (32.70076950826015, -83.64790511895201),
+    "csg": (32.51571975545047, -84.9392150850212),
+    "bmx": (33.17895986702925, -86.7823825539515),
+    "gsp": (34.883261598428625, -82.22035185765819),
+    "hun": (34.72526357496368, -86.64485933237611),
+    "tae": (30.394458005924445, -84.3398597480267),
+    "sav": (32.128213416567114, -81.19987457392587),
+    "ags": (33.369475015594105, -81.96517834789427),
+} # locations to plot numbers on map, text products, meteograms. meant for airports, you could put any location in domain here
+# !!! IMPORTANT !!! our current skewt plot function is considerably intensive, taking about ~50 seconds per airport to finish (on my hardware).
+# this will scale up quick, so try not to add too many airports to this one right now
+other_airports = {
+    "atl": (33.6391621022899, -84.43061412634862),
+    "rmg": (34.35267229676656, -85.16328449820841),
+    "aby": (31.53370678927006, -84.18738548637639),
+    "vdi": (32.19211787190395, -82.36896971377632),
+    "avl": (35.437208530161925, -82.53944681688363),
+    "jax": (30.492570769985885, -81.68571176177561),
+    "gvl": (34.2736228317857, -83.83156673325958),
+    "cha": (35.037647142434366, -85.20214251419357)
+} # same as above minus generating a skewt (time saving) - more ok to plot many here
+# format is "folder_name": (lat, lon)
+
+airports = {**high_prio_airports, **other_airports}
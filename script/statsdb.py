@@ -0,0 +1,203 @@
+# This module keeps our verification history in one SQLite file instead of thousands of small CSVs.
+# modelstats appends every run's point forecasts, comparer appends every verified (model vs obs) hour,
+# and query_errors() answers things like "ATL temp bias by forecast hour over the last 850 runs" straight from indexed tables.
+# ugawrf keeps it in (repo)/data/verification.sqlite by default, outside the site's web root.
+# ex: python statsdb.py ../data/verification.sqlite --variable temp --airport ATL --by forecast_hour
+# ex: python statsdb.py ../data/verification.sqlite --import-csvs ../site/runs verification   <- backfill from old CSVs
+
+import sqlite3
+import argparse
+import datetime as dt
+import glob
+import csv
+import math
+import os
+
+# CSV header -> column name. these match the headers modelstats.py and comparer.py write
+MODEL_COLUMNS = {
+    'Init Time (UTC)': 'init_time',
+    'Airport': 'airport',
+    'Forecast Hour': 'forecast_hour',
+    'Valid Time (UTC)': 'valid_time',
+    'Temperature (F)': 'temp_f',
+    'Dew Point (F)': 'dewp_f',
+    'Wind Speed (mph)': 'wspd_mph',
+    'Wind Direction (deg)': 'wdir_deg',
+    'Pressure (mb)': 'mslp_mb',
+}
+VERIFICATION_COLUMNS = {
+    'Init Time (UTC)': 'init_time',
+    'Airport': 'airport',
+    'Forecast Hour': 'forecast_hour',
+    'Valid Time (UTC)': 'valid_time',
+    'Obs Time (UTC)': 'obs_time',
+    'Model Temperature (F)': 'model_temp_f',
+    'Observed Temperature (F)': 'obs_temp_f',
+    'Error_Temp': 'error_temp',
+    'Model Dew Point (F)': 'model_dewp_f',
+    'Observed Dew Point (F)': 'obs_dewp_f',
+    'Error_Dew': 'error_dewp',
+    'Model Wind Speed (mph)': 'model_wspd_mph',
+    'Observed Wind Speed (mph)': 'obs_wspd_mph',
+    'Error_Wind': 'error_wspd',
+    'Model MSLP (mb)': 'model_mslp_mb',
+    'Observed Pressure (mb)': 'obs_mslp_mb',
+    'Error_MSLP': 'error_mslp',
+}
+TEXT_COLUMNS = ['init_time', 'airport', 'valid_time', 'obs_time']
+ERROR_VARIABLES = {'temp': 'error_temp', 'dewp': 'error_dewp', 'wind': 'error_wspd', 'mslp': 'error_mslp'}
+GROUPS = ['forecast_hour', 'airport', 'init_time']
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+def _column_type(col):
+    if col in TEXT_COLUMNS:
+        return 'TEXT'
+    return 'INTEGER' if col == 'forecast_hour' else 'REAL'
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS model_stats (
+    {', '.join(f"{col} {_column_type(col)}" for col in MODEL_COLUMNS.values())},
+    PRIMARY KEY (airport, init_time, forecast_hour)
+);
+CREATE TABLE IF NOT EXISTS verification (
+    {', '.join(f"{col} {_column_type(col)}" for col in VERIFICATION_COLUMNS.values())},
+    PRIMARY KEY (airport, init_time, forecast_hour)
+);
+CREATE INDEX IF NOT EXISTS model_stats_hour ON model_stats (airport, forecast_hour);
+CREATE INDEX IF NOT EXISTS model_stats_init ON model_stats (init_time);
+CREATE INDEX IF NOT EXISTS verification_hour ON verification (airport, forecast_hour);
+CREATE INDEX IF NOT EXISTS verification_init ON verification (init_time);
+"""
+
+def connect(db_path):
+    # WAL + a generous busy timeout so concurrent ugawrf/comparer runs can append at the same time
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    db = sqlite3.connect(db_path, timeout=60)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    return db
+
+def append_model_stats(db_path, rows):
+    # rows are the dicts modelstats writes to its CSVs. re-appending a run that's already stored is a no-op
+    return _append(db_path, "model_stats", MODEL_COLUMNS, rows)
+
+def append_verification(db_path, rows):
+    # rows are the dicts (or DataFrame records) comparer writes to its verified CSVs
+    return _append(db_path, "verification", VERIFICATION_COLUMNS, rows)
+
+def _append(db_path, table, columns, rows):
+    records = [tuple(_to_db_value(col, row.get(header)) for header, col in columns.items()) for row in rows]
+    if not records:
+        return 0
+    db = connect(db_path)
+    with db:
+        before = db.total_changes
+        db.executemany(f"INSERT OR IGNORE INTO {table} ({', '.join(columns.values())}) VALUES ({', '.join('?' * len(columns))})", records)
+        added = db.total_changes - before
+    db.close()
+    return added
+
+def _to_db_value(col, value):
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value == '':
+        return None
+    if col == 'airport':
+        return str(value).upper()
+    if col in TEXT_COLUMNS:
+        # times are stored as "YYYY-MM-DD HH:MM" (TIME_FORMAT) so they sort and compare as plain strings
+        return str(value).replace('T', ' ')[:16]
+    if col == 'forecast_hour':
+        return int(float(value))
+    return float(value)
+
+def query_errors(db_path, variable='temp', airports=None, start=None, end=None, forecast_hours=None, group_by='forecast_hour'):
+    # bias/MAE/RMSE of one verified variable. start/end limit init times and are both inclusive: datetimes/dates or
+    # "YYYY-MM-DD" / "YYYY-MM-DD HH:MM" strings, where an end given as just a day takes in that whole day.
+    # group_by is one of GROUPS or None for a single overall row. returns a list of dicts
+    if variable not in ERROR_VARIABLES:
+        raise ValueError(f"variable must be one of {list(ERROR_VARIABLES)}")
+    if group_by is not None and group_by not in GROUPS:
+        raise ValueError(f"group_by must be one of {GROUPS} or None")
+    error = ERROR_VARIABLES[variable]
+    where, params = [f"{error} IS NOT NULL"], []
+    if airports:
+        airports = [airports] if isinstance(airports, str) else list(airports)
+        where.append(f"airport IN ({', '.join('?' * len(airports))})")
+        params += [airport.upper() for airport in airports]
+    if start is not None:
+        where.append("init_time >= ?")
+        params.append(_time_bound(start)[0].strftime(TIME_FORMAT))
+    if end is not None:
+        end, whole_day = _time_bound(end)
+        if whole_day:
+            where.append("init_time < ?")
+            params.append((end + dt.timedelta(days=1)).strftime(TIME_FORMAT))
+        else:
+            where.append("init_time <= ?")
+            params.append(end.strftime(TIME_FORMAT))
+    if forecast_hours is not None:
+        forecast_hours = list(forecast_hours)
+        where.append(f"forecast_hour IN ({', '.join('?' * len(forecast_hours))})")
+        params += forecast_hours
+    group_select = f"{group_by}, " if group_by else ""
+    group_clause = f"GROUP BY {group_by} ORDER BY {group_by}" if group_by else ""
+    sql = f"SELECT {group_select}COUNT({error}), AVG({error}), AVG(ABS({error})), AVG({error} * {error}) FROM verification WHERE {' AND '.join(where)} {group_clause}"
+    db = connect(db_path)
+    results = []
+    for row in db.execute(sql, params):
+        key, (count, bias, mae, mse) = (row[0], row[1:]) if group_by else (None, row)
+        if not count:
+            continue
+        result = {group_by: key} if group_by else {}
+        result.update({'count': count, 'bias': bias, 'mae': mae, 'rmse': math.sqrt(mse)})
+        results.append(result)
+    db.close()
+    return results
+
+def _time_bound(value):
+    # (datetime, whether it was just a day) for a query bound
+    if isinstance(value, dt.datetime):
+        return value, False
+    if isinstance(value, dt.date):
+        return dt.datetime.combine(value, dt.time()), True
+    value = str(value).strip()
+    return dt.datetime.fromisoformat(value), len(value) <= 10
+
+def import_csvs(db_path, paths):
+    # backfill from existing *_model_stats_*.csv and verified_*.csv files (folders are searched recursively)
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, "**", "*.csv"), recursive=True)) if os.path.isdir(path) else [path]
+    added_stats, added_verified = 0, 0
+    for path in files:
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None:
+                continue
+            rows = list(reader)
+        if 'Error_Temp' in reader.fieldnames:
+            added_verified += append_verification(db_path, rows)
+        elif 'Temperature (F)' in reader.fieldnames:
+            added_stats += append_model_stats(db_path, rows)
+    print(f"imported {added_stats} model stats rows and {added_verified} verified rows from {len(files)} CSVs into {db_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Query or backfill the UGA-WRF verification history database.')
+    parser.add_argument('db_path', type=str, help='Path to the verification SQLite file.')
+    parser.add_argument('--import-csvs', type=str, nargs='+', default=None, help='CSVs or folders of model stats/verified CSVs to add to the database.')
+    parser.add_argument('--variable', type=str, default='temp', choices=list(ERROR_VARIABLES), help='Verified variable to summarize.')
+    parser.add_argument('--airport', type=str, nargs='*', default=None, help='Airports to include. Defaults to all.')
+    parser.add_argument('--start', type=str, default=None, help='Earliest init time, "YYYY-MM-DD" or "YYYY-MM-DD HH:MM".')
+    parser.add_argument('--end', type=str, default=None, help='Latest init time (inclusive - a day on its own takes in the whole day).')
+    parser.add_argument('--by', type=str, default='forecast_hour', choices=GROUPS + ['none'], help='How to group the errors.')
+    args = parser.parse_args()
+    if args.import_csvs:
+        import_csvs(args.db_path, args.import_csvs)
+        return
+    group_by = None if args.by == 'none' else args.by
+    results = query_errors(args.db_path, args.variable, args.airport, args.start, args.end, group_by=group_by)
+    print(f"{(group_by or 'all'):>16} | {'count':>6} | {'bias':>7} | {'mae':>7} | {'rmse':>7}")
+    for result in results:
+        print(f"{str(result.get(group_by, 'all')):>16} | {result['count']:>6} | {result['bias']:>7.2f} | {result['mae']:>7.2f} | {result['rmse']:>7.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Shared setup for the tests. The modules live in the script folder and import each other by name, so it goes on
+# the path first. synthetic_wrfout is a small made-up wrfout (regression_check.make_synthetic_wrfout) that the tests
+# needing real model fields read, made once per session, and known_indices puts every station on that grid without
+# wrf-python.
+# run from the repo root or the script folder: python -m pytest -q
+
+import sys
+import os
+import json
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def synthetic_wrfout(tmp_path_factory):
+    pytest.importorskip("pyproj")
+    import regression_check
+    path = str(tmp_path_factory.mktemp("wrfout") / "wrfout_d01_2025-01-15_00_00_00")
+    regression_check.make_synthetic_wrfout(path, hours=4, ny=30, nx=36, nz=12)
+    return path
+
+@pytest.fixture
+def wrf_file(synthetic_wrfout):
+    from netCDF4 import Dataset
+    wrf_file = Dataset(synthetic_wrfout)
+    yield wrf_file
+    wrf_file.close()
+
+@pytest.fixture
+def known_indices(wrf_file, tmp_path, monkeypatch):
+    # every station's grid x/y already in the index cache file, like a domain seen on an earlier run, so these
+    # tests don't need wrf-python's ll_to_xy
+    import pointdata
+    import stations
+    indices = {f"{lat},{lon}": [3 + 2 * i % 30, 2 + i] for i, (lat, lon) in enumerate(stations.airports.values())}
+    cache_file = tmp_path / "station_indices.json"
+    cache_file.write_text(json.dumps({pointdata.domain_signature(wrf_file): indices}))
+    monkeypatch.setattr(pointdata, "INDEX_CACHE_FILE", str(cache_file))
+    monkeypatch.setattr(pointdata, "_index_cache", {"file": None, "domains": {}})
+    return {name: indices[f"{lat},{lon}"] for name, (lat, lon) in stations.airports.items()}
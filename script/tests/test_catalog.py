@@ -0,0 +1,53 @@
+import json
+import os
+import catalog
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+def load(base):
+    with open(os.path.join(base, catalog.CATALOG_NAME)) as f:
+        return json.load(f)
+
+def test_scan_product_lists_what_is_on_disk(tmp_path):
+    product = tmp_path / "temperature"
+    for name in ["hour_2.png", "hour_0.png", "hour_10.png", "hour_0_atlanta.png", "hour_1.png.tmp", "hour_0.thumb.webp"]:
+        touch(str(product / name))
+    touch(str(product / "ahn" / "hour_3.png"))
+    assert catalog.scan_product(str(product)) == {"hours": [0, 2, 10], "regions": {"atlanta": [0]}, "stations": {"ahn": {"hours": [3]}}}
+    assert catalog.scan_product(str(tmp_path / "nothing")) is None
+
+def test_update_product_adds_and_drops_entries(tmp_path):
+    base = str(tmp_path)
+    run = "2025-03-13_21_00_00"
+    touch(os.path.join(base, run, "d01", "temperature", "hour_0.png"))
+    metadata = {"init_time": "2025-03-13 21:00", "in_progress": True, "previews": {"pattern": "{product}/hour_{hour}.{size}.webp", "products": {"temperature": [0]}}}
+    catalog.update_product(base, run, "d01", "temperature", metadata)
+    entry = load(base)["runs"][run]["d01"]
+    assert entry["products"] == {"temperature": {"hours": [0]}}
+    assert entry["in_progress"] is True
+    # which frames have previews stays in, for the site to fall back on the full frame for the rest
+    assert entry["previews"]["products"] == {"temperature": [0]}
+    catalog.update_run(base, run, "d01", {"in_progress": False})
+    assert load(base)["runs"][run]["d01"]["in_progress"] is False
+    os.remove(os.path.join(base, run, "d01", "temperature", "hour_0.png"))
+    catalog.update_product(base, run, "d01", "temperature")
+    assert load(base)["runs"][run]["d01"]["products"] == {}
+
+def test_catalog_keeps_the_newest_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog, "KEEP_RUNS", 2)
+    base = str(tmp_path)
+    runs = ["2025-03-12_00_00_00", "2025-03-13_00_00_00", "2025-03-14_00_00_00"]
+    for run in runs:
+        touch(os.path.join(base, run, "d01", "temperature", "hour_0.png"))
+    touch(os.path.join(base, "verification", "d01", "temperature", "hour_0.png"))
+    catalog.rebuild(base)
+    assert list(load(base)["runs"]) == runs[:0:-1]
+    # an update that changes nothing leaves the file alone
+    updated = load(base)["updated"]
+    catalog.update_product(base, runs[2], "d01", "temperature")
+    assert load(base)["updated"] == updated
+    touch(os.path.join(base, "2025-03-15_00_00_00", "d01", "temperature", "hour_0.png"))
+    catalog.update_product(base, "2025-03-15_00_00_00", "d01", "temperature")
+    assert list(load(base)["runs"]) == ["2025-03-15_00_00_00", "2025-03-14_00_00_00"]
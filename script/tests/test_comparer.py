@@ -0,0 +1,42 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+import comparer
+
+def model_rows():
+    return pd.DataFrame({
+        'Init Time (UTC)': ['2025-03-13 21:00'] * 3,
+        'Airport': ['ATL', 'ATL', 'AHN'],
+        'Forecast Hour': [1, 2, 1],
+        'Valid Time (UTC)': pd.to_datetime(['2025-03-13 22:00', '2025-03-13 23:00', '2025-03-13 22:00']).astype('datetime64[ns]'),
+        'Temperature (F)': [60.0, 58.0, 55.0],
+        'Dew Point (F)': [50.0, 50.0, 45.0],
+        'Wind Speed (mph)': [10.0, 10.0, 5.0],
+        'Pressure (mb)': [1015.0, 1016.0, 1014.0],
+    })
+
+def test_verify_takes_the_nearest_ob_of_the_same_station_within_30_minutes():
+    obs = comparer.clean_observations(pd.DataFrame({
+        'station': ['atl', 'atl', 'ahn', 'atl'],
+        'valid': ['2025-03-13 21:52', '2025-03-13 22:20', '2025-03-13 21:59', '2025-03-13 23:45'],
+        'tmpf': [61.0, 70.0, 54.0, 40.0],
+        'dwpf': [49.0, 49.0, 44.0, 40.0],
+        'sknt': [10.0, 10.0, 0.0, 0.0],
+        'mslp': [1014.0, 1014.0, 1014.5, 1020.0],
+    }))
+    merged = comparer.verify(model_rows(), obs)
+    # ATL hour 2 (23:00) has no ob within 30 minutes, so only two hours are verified
+    assert merged[['Airport', 'Forecast Hour']].values.tolist() == [['AHN', 1], ['ATL', 1]]
+    assert merged['Observed Temperature (F)'].tolist() == [54.0, 61.0]
+    assert merged['Error_Temp'].tolist() == [1.0, -1.0]
+    assert merged['Error_Wind'].iloc[1] == pytest.approx(10.0 - 10 * 1.15078)
+    assert merged['Obs Time (UTC)'].iloc[0] == pd.Timestamp('2025-03-13 21:59')
+
+def test_store_observations_merges_repeated_imports(tmp_path):
+    obs = pd.DataFrame({'station': ['ATL', 'ATL'], 'valid': ['2025-03-13 21:52', '2025-03-13 22:52'], 'tmpf': [61.0, 60.0], 'dwpf': [49.0, 48.0], 'sknt': [5.0, 5.0], 'mslp': [1014.0, 1014.0]})
+    comparer.store_observations(obs, str(tmp_path))
+    obs.loc[1, 'tmpf'] = 59.0
+    comparer.store_observations(obs, str(tmp_path))
+    stored = comparer.load_observations(['atl'], str(tmp_path))
+    assert len(stored) == 2
+    assert stored['tmpf'].tolist() == [61.0, 59.0]
@@ -0,0 +1,89 @@
+import costmodel
+
+def task(product, frames=10, module="weathermaps"):
+    return {"id": f"{product}.0-{frames - 1}", "module": module, "products": [product], "frames": frames}
+
+def test_record_and_load_history(tmp_path):
+    history = str(tmp_path / "data" / costmodel.HISTORY_NAME)
+    tasks = [task("wind"), task("dewpoint"), task("cape")]
+    costmodel.record_run(history, "2025031321", "d01", tasks, {
+        "wind.0-9": {"status": "done", "seconds": 20.0, "peak_mb": 400},
+        "dewpoint.0-9": {"status": "error", "seconds": 1.0, "peak_mb": 100},
+        "cape.0-9": {"status": "skipped", "seconds": 0},
+    })
+    costmodel.record_run(history, "2025031403", "d01", tasks[:1], {"wind.0-9": {"status": "done", "seconds": 40.0, "peak_mb": 600}})
+    costmodel.record_run(history, "2025031403", "d02", tasks[:1], {"wind.0-9": {"status": "done", "seconds": 500.0, "peak_mb": 9000}})
+    with open(history, "a") as f:
+        f.write("not json\n")
+    model = costmodel.load(history, "d01")
+    # errored and skipped tasks don't count
+    assert set(model["products"]) == {"wind"}
+    assert model["products"]["wind"] == {"seconds_per_frame": 3.0, "peak_mb": 600, "runs": 2}
+    assert model["modules"]["weathermaps"]["seconds_per_frame"] == 3.0
+    assert costmodel.load(str(tmp_path / "missing.jsonl")) == {"products": {}, "modules": {}}
+
+def test_summarize_keeps_the_last_runs():
+    rows = [{"run": f"run{i:02d}", "seconds": 10.0 * (i + 1), "frames": 10, "peak_mb": i} for i in range(costmodel.HISTORY_RUNS + 5)]
+    entry = costmodel.summarize(rows)
+    assert entry["runs"] == costmodel.HISTORY_RUNS
+    assert entry["peak_mb"] == costmodel.HISTORY_RUNS + 4
+    assert entry["seconds_per_frame"] == 10.5
+
+def test_estimate_and_makespan():
+    model = {"products": {"wind": {"seconds_per_frame": 2.0, "peak_mb": 500}},
+             "modules": {"skewt": {"seconds_per_frame": 1.0, "peak_mb": None}}}
+    assert costmodel.estimate(model, task("wind", 5)) == (10.0, 500)
+    # products without history fall back to their module, or to nothing
+    assert costmodel.estimate(model, task("station", 5, module="skewt")) == (5.0, None)
+    assert costmodel.estimate(model, task("cape")) == (None, None)
+    tasks = [task("wind", 10), task("wind", 5), task("wind", 5), task("cape")]
+    assert costmodel.makespan(model, tasks, 2) == (20.0, 1)
+    assert costmodel.makespan(model, tasks, 1) == (40.0, 1)
+    assert costmodel.makespan(model, tasks, 0) == (40.0, 1)
+
+def test_choose_processes_fits_the_free_memory(monkeypatch):
+    model = {"products": {"wind": {"seconds_per_frame": 2.0, "peak_mb": 1000}}, "modules": {}}
+    tasks = [task("wind") for i in range(8)]
+    monkeypatch.setattr(costmodel, "available_memory_mb", lambda: 4000)
+    assert costmodel.choose_processes(model, tasks, max_processes=8) == 3
+    assert costmodel.choose_processes(model, tasks, max_processes=8, memory_budget=500) == 6
+    assert costmodel.choose_processes(model, tasks[:2], max_processes=8) == 2
+    assert costmodel.choose_processes(model, tasks, max_processes=8, memory_budget=100000) == 1
+    monkeypatch.setattr(costmodel, "available_memory_mb", lambda: None)
+    assert costmodel.choose_processes(model, tasks, max_processes=8) == 8
+
+def test_wait_for_memory_counts_this_process_once(monkeypatch):
+    free = [1500, 1500, 2500]
+    monkeypatch.setattr(costmodel, "available_memory_mb", lambda: free.pop(0) if len(free) > 1 else free[0])
+    monkeypatch.setattr(costmodel, "resident_memory_mb", lambda: 1000)
+    monkeypatch.setattr(costmodel.time, "sleep", lambda seconds: None)
+    big = dict(task("wind"), estimated_peak_mb=3000)
+    # 3000 MB at the peak, 1000 of them already held: 2000 more are needed, which another worker frees up
+    costmodel.wait_for_memory(big, 4000, others_running=lambda: True)
+    assert free == [2500]
+    # already enough once this process's own memory is taken off
+    free[:] = [2100]
+    costmodel.wait_for_memory(big, 4000, others_running=lambda: True)
+
+def test_wait_for_memory_starts_right_away_when_nothing_else_runs(monkeypatch):
+    monkeypatch.setattr(costmodel, "available_memory_mb", lambda: 100)
+    monkeypatch.setattr(costmodel, "resident_memory_mb", lambda: 200)
+    def sleep(seconds):
+        raise AssertionError("waited for memory nobody will free")
+    monkeypatch.setattr(costmodel.time, "sleep", sleep)
+    big = dict(task("wind"), estimated_peak_mb=3000)
+    costmodel.wait_for_memory(big, 4000)
+    costmodel.wait_for_memory(big, 4000, others_running=lambda: False)
+    # a worker that stops partway through the wait lets the task go
+    running = [True, False]
+    costmodel.wait_for_memory(big, 4000, others_running=lambda: running.pop(0))
+
+def test_wait_for_memory_gives_up_after_memory_wait(monkeypatch, capsys):
+    clock = [0]
+    monkeypatch.setattr(costmodel, "available_memory_mb", lambda: 100)
+    monkeypatch.setattr(costmodel, "resident_memory_mb", lambda: None)
+    monkeypatch.setattr(costmodel.time, "time", lambda: clock[0])
+    monkeypatch.setattr(costmodel.time, "sleep", lambda seconds: clock.__setitem__(0, clock[0] + seconds * 100))
+    costmodel.wait_for_memory(task("cape"), 500, others_running=lambda: True)
+    assert clock[0] > costmodel.MEMORY_WAIT
+    assert f"waited {costmodel.MEMORY_WAIT}s for memory" in capsys.readouterr().out
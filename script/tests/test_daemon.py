@@ -0,0 +1,28 @@
+import json
+import os
+import pytest
+import daemon
+
+def test_job_args_pins_jobs_to_one_process():
+    assert daemon.job_args(["wrfout_d01_2025-03-13_21_00_00", "out", "-p"]) == ["wrfout_d01_2025-03-13_21_00_00", "out", "-p"]
+    assert daemon.job_args(["wrfout_d01_2025-03-13_21_00_00", "--processes", "4"])[-2:] == ["--processes", "1"]
+    with pytest.raises(ValueError):
+        daemon.job_args(["wrfout_d01_2025-03-13_21_00_00", "--queue", "shared"])
+
+def test_a_failed_job_is_logged_and_filed(tmp_path):
+    pytest.importorskip("netCDF4")
+    queue = str(tmp_path / "queue")
+    for folder in daemon.QUEUE_FOLDERS:
+        os.makedirs(os.path.join(queue, folder))
+    job_path = daemon.submit(queue, [str(tmp_path / "wrfout_d01_missing"), str(tmp_path / "out")])
+    assert os.listdir(os.path.join(queue, "incoming")) == [os.path.basename(job_path)]
+    name = os.path.basename(job_path)
+    os.replace(job_path, os.path.join(queue, "running", name))
+    result = daemon.run_job(os.path.join(queue, "running", name))
+    assert result["status"] == "failed" and result["error"]
+    daemon.finish_job(queue, name, result)
+    base = name[:-len(".json")]
+    assert sorted(os.listdir(os.path.join(queue, "failed"))) == sorted([name, f"{base}.log", f"{base}.result.json"])
+    with open(os.path.join(queue, "failed", f"{base}.result.json")) as f:
+        assert json.load(f)["status"] == "failed"
+    assert os.listdir(os.path.join(queue, "running")) == []
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("matplotlib")
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from PIL import Image
+import framewriter
+
+@pytest.fixture
+def figure():
+    fig, ax = plt.subplots(figsize=(3, 2))
+    ax.pcolormesh(np.arange(12.0).reshape(3, 4))
+    ax.set_title("frame")
+    yield fig
+    plt.close(fig)
+
+@pytest.fixture
+def writer():
+    framewriter.start(workers=2, max_pending=2)
+    yield
+    framewriter.stop()
+
+def test_background_write_matches_savefig(figure, tmp_path):
+    figure.savefig(tmp_path / "direct.png", dpi=80)
+    framewriter.start()
+    try:
+        framewriter.save_figure(figure, str(tmp_path / "queued.png"), dpi=80)
+        assert framewriter.flush() == 0
+    finally:
+        framewriter.stop()
+    direct, queued = Image.open(tmp_path / "direct.png"), Image.open(tmp_path / "queued.png")
+    assert direct.size == queued.size
+    assert np.array_equal(np.asarray(direct.convert("RGBA")), np.asarray(queued.convert("RGBA")))
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
+
+def test_flush_waits_for_every_frame_and_counts_failures(figure, tmp_path, writer):
+    saved = framewriter.frames_saved()
+    for i in range(5):
+        framewriter.save_figure(figure, str(tmp_path / f"hour_{i}.png"))
+    framewriter.save_figure(figure, str(tmp_path / "missing" / "hour_0.png"))
+    assert framewriter.flush() == 1
+    assert sorted(path.name for path in tmp_path.glob("*.png")) == [f"hour_{i}.png" for i in range(5)]
+    assert framewriter.frames_saved() == saved + 6
+    # the failure count starts over after each flush
+    assert framewriter.flush() == 0
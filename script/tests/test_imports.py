@@ -0,0 +1,23 @@
+import subprocess
+import sys
+import os
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["matplotlib", "cartopy", "metpy", "wrf", "xarray", "pandas"]
+
+def loaded_after(statement):
+    # the heavy modules a fresh interpreter has loaded after running statement in the script folder
+    code = f"import sys; {statement}; print(','.join(name for name in {HEAVY!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return [name for name in result.stdout.strip().split(",") if name]
+
+@pytest.mark.parametrize("statement", [
+    "import ugawrf; ugawrf.parse_args(['wrfout_d01_2025-03-13_21_00_00'])",
+    "import pointdata, textgen, modelstats",
+    "import catalog, costmodel, runmetrics, statsdb, workqueue, daemon",
+])
+def test_light_paths_leave_the_plotting_stack_alone(statement):
+    pytest.importorskip("netCDF4")
+    assert loaded_after(statement) == []
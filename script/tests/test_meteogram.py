@@ -0,0 +1,45 @@
+import datetime as dt
+import numpy as np
+import pytest
+
+pytest.importorskip("matplotlib")
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import meteogram
+
+HOURS = np.arange(1, 49)
+TIMES = [dt.datetime(2025, 3, 13, 21) + dt.timedelta(hours=t) for t in range(49)]
+
+def station(offset):
+    temperatures = 50 + offset + 15 * np.sin(HOURS / 24 * 2 * np.pi)
+    return (temperatures, temperatures - 8, 1012 + offset / 5 + np.cos(HOURS / 12), np.full(48, 3.0 + offset / 10), np.full(48, -2.0))
+
+def render(fig):
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba()).copy()
+
+def test_reused_figure_draws_the_same_as_a_fresh_one():
+    shared = meteogram.create_blank_meteogram(HOURS, TIMES)
+    meteogram.draw_meteogram(shared, "ahn", HOURS, *station(-30), TIMES, "run")
+    drawn = list(shared["artists"])
+    meteogram.clear_meteogram(shared)
+    # the first airport's annotations and barbs are gone, not piling up
+    children = shared["ax1"].get_children() + shared["ax2"].get_children()
+    assert drawn and not any(artist in children for artist in drawn)
+    meteogram.draw_meteogram(shared, "atl", HOURS, *station(10), TIMES, "run")
+    fresh = meteogram.create_blank_meteogram(HOURS, TIMES)
+    meteogram.draw_meteogram(fresh, "atl", HOURS, *station(10), TIMES, "run")
+    assert np.array_equal(render(shared["fig"]), render(fresh["fig"]))
+    plt.close(shared["fig"])
+    plt.close(fresh["fig"])
+
+def test_freezing_line_only_shows_when_it_gets_that_cold():
+    shared = meteogram.create_blank_meteogram(HOURS, TIMES)
+    meteogram.draw_meteogram(shared, "ahn", HOURS, *station(-30), TIMES, "run")
+    assert shared["freezing_line"].get_visible()
+    meteogram.clear_meteogram(shared)
+    meteogram.draw_meteogram(shared, "atl", HOURS, *station(10), TIMES, "run")
+    assert not shared["freezing_line"].get_visible()
+    assert "Frz (32°F)" not in [text.get_text() for text in shared["ax1"].get_legend().get_texts()]
+    plt.close(shared["fig"])
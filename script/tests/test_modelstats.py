@@ -0,0 +1,25 @@
+import csv
+import numpy as np
+import pytest
+import modelstats
+import pointdata
+import statsdb
+import stations
+
+def test_run_stats_cover_every_airport_and_hour(wrf_file, known_indices, tmp_path):
+    airports = {name: stations.airports[name] for name in ["ahn", "atl", "sav"]}
+    times = pointdata.read_times(wrf_file)
+    db_path = str(tmp_path / "verification.sqlite")
+    rows = modelstats.generate_run_stats(wrf_file, airports, len(times), times, "2025-01-15_00_00_00", str(tmp_path), db_path)
+    # hour 0 is left out, like before
+    assert len(rows) == 3 * (len(times) - 1)
+    x, y = known_indices["atl"]
+    t2 = np.asarray(wrf_file.variables["T2"][:])[:, y, x]
+    atl = [row for row in rows if row["Airport"] == "ATL"]
+    assert [row["Forecast Hour"] for row in atl] == list(range(1, len(times)))
+    assert [float(row["Temperature (F)"]) for row in atl] == pytest.approx((t2[1:] - 273.15) * 9/5 + 32, abs=0.01)
+    with open(tmp_path / "atl_model_stats_2025-01-15_00_00_00.csv") as f:
+        assert list(csv.DictReader(f)) == [{key: str(value) for key, value in row.items()} for row in atl]
+    with open(tmp_path / "model_stats_2025-01-15_00_00_00.csv") as f:
+        assert len(list(csv.DictReader(f))) == len(rows)
+    assert statsdb.append_model_stats(db_path, rows) == 0
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+import pointdata
+import stations
+
+def test_station_indices_come_from_the_cache_file(wrf_file, known_indices):
+    names, xs, ys = pointdata.station_indices(wrf_file, {"ahn": stations.airports["ahn"], "atl": stations.airports["atl"]})
+    assert names == ["ahn", "atl"]
+    assert [xs.tolist(), ys.tolist()] == [[known_indices["ahn"][0], known_indices["atl"][0]], [known_indices["ahn"][1], known_indices["atl"][1]]]
+
+def test_read_points_matches_the_full_field(wrf_file):
+    xs, ys = np.array([4, 30, 10]), np.array([20, 2, 2])
+    full = wrf_file.variables["T2"][:]
+    assert np.array_equal(pointdata.read_points(wrf_file, "T2", xs, ys), full[:, ys, xs])
+    assert np.array_equal(pointdata.read_points(wrf_file, "T2", xs, ys, timeidx=2), full[2, ys, xs])
+
+def test_point_series_derived_variables(wrf_file):
+    xs, ys = np.array([5, 6]), np.array([7, 8])
+    series = pointdata.point_series(wrf_file, xs, ys, ["wspd", "wdir", "mslp"])
+    # netCDF4 indexes each axis on its own, so the points are picked out of the full fields with numpy
+    u, v = wrf_file.variables["U10"][:][:, ys, xs], wrf_file.variables["V10"][:][:, ys, xs]
+    assert np.allclose(series["wspd"], np.hypot(u, v))
+    # a west wind (u > 0, v = 0) comes from 270
+    assert pointdata.wind_direction(np.array([5.0]), np.array([0.0]))[0] == pytest.approx(270.0)
+    assert np.array_equal(series["mslp"], wrf_file.variables["AFWA_MSLP"][:][:, ys, xs])
+
+def test_open_run_series_for_named_stations(synthetic_wrfout, known_indices):
+    with pointdata.open_run(synthetic_wrfout) as run:
+        assert len(run.times) == run.wrf_file.dimensions["Time"].size
+        data = run.stations(["AHN", "atl"]).series(["T2", "td2"])
+        x, y = known_indices["atl"]
+        assert data["T2"].shape == (len(run.times), 2)
+        assert np.array_equal(data["T2"][:, 1], np.asarray(run.wrf_file.variables["T2"][:])[:, y, x])
+        with pytest.raises(KeyError):
+            run.stations(["nowhere"])
+
+def test_open_run_series_as_xarray(synthetic_wrfout, known_indices):
+    pytest.importorskip("xarray")
+    with pointdata.open_run(synthetic_wrfout) as run:
+        ds = run.stations().series(["T2", "wspd"], as_xarray=True)
+    assert list(ds["station"].values) == list(stations.airports)
+    assert ds["T2"].attrs["units"] == "K"
+    assert ds["wspd"].dims == ("time", "station")
+    assert int(ds["x"].sel(station="sav")) == known_indices["sav"][0]
+
+def full_column_fields(wrf_file, timeidx):
+    # the sounding fields on the whole grid, worked out straight from the raw variables
+    raw = lambda varname: np.ma.getdata(wrf_file.variables[varname][timeidx])
+    pressure = raw("P") + raw("PB")
+    tk = (raw("T") + 300.0) * (pressure / 100000.0) ** (2.0 / 7.0)
+    geopotential = raw("PH") + raw("PHB")
+    u, v = raw("U"), raw("V")
+    return {
+        "pressure": pressure / 100,
+        "tc": tk - 273.15,
+        "td": pointdata.dewpoint(pressure / 100, raw("QVAPOR")),
+        "ua": 0.5 * (u[..., :-1] + u[..., 1:]),
+        "va": 0.5 * (v[:, :-1] + v[:, 1:]),
+        "z": 0.5 * (geopotential[:-1] + geopotential[1:]) / 9.81,
+    }
+
+def test_read_column_matches_the_full_grid(wrf_file):
+    full = full_column_fields(wrf_file, 2)
+    column = pointdata.read_column(wrf_file, 12, 20, 2)
+    for name, values in full.items():
+        assert column[name].shape == (values.shape[0],)
+        assert np.allclose(column[name], values[:, 12, 20]), name
+    # a window is cut off at the edge of the domain
+    window = pointdata.read_column(wrf_file, 1, 34, 2, halo=3)
+    for name, values in full.items():
+        assert np.allclose(window[name], values[:, 0:5, 31:36]), name
+
+def test_dewpoint_at_saturation():
+    # air at 0C holding the saturation mixing ratio (6.11 hPa of vapor at 1000 hPa) has a 0C dewpoint
+    qv = 0.622 * 6.112 / (1000 - 6.112)
+    assert pointdata.dewpoint(np.array([1000.0]), np.array([qv]))[0] == pytest.approx(0.0, abs=0.05)
+
+def test_read_columns_matches_read_column_at_each_point(wrf_file):
+    ys, xs = np.array([0, 12, 29, 12]), np.array([35, 20, 0, 21])
+    columns = pointdata.read_columns(wrf_file, ys, xs, 1)
+    for i in range(len(ys)):
+        column = pointdata.read_column(wrf_file, ys[i], xs[i], 1)
+        for name, values in column.items():
+            assert np.allclose(columns[name][:, i], values), name
+
+def test_interp_level_matches_interpolating_the_full_grid(wrf_file):
+    full = full_column_fields(wrf_file, 1)
+    pressure = full["pressure"]
+    qv = np.ma.getdata(wrf_file.variables["QVAPOR"][1])
+    tk = full["tc"] + 273.15
+    saturation_pressure = 6.112 * np.exp(17.67 * full["tc"] / (tk - 29.65))
+    full["rh"] = 100 * np.clip(qv / (0.622 * saturation_pressure / (pressure - 0.378 * saturation_pressure)), 0, 1)
+    # a level the lowest model level is above somewhere, so some columns are under the ground
+    level = float(np.percentile(pressure[0], 30))
+    for variable in pointdata.LEVEL_VARIABLES:
+        values = pointdata.interp_level(wrf_file, variable, 1, level)
+        assert values.dtype == np.float32, variable
+        expected = full[variable] if variable != "pressure" else pressure
+        for y, x in np.ndindex(*pressure.shape[1:]):
+            if pressure[0, y, x] < level:
+                assert values.mask[y, x], variable
+            else:
+                # np.interp wants the pressures increasing, so the column goes top down
+                assert values[y, x] == pytest.approx(np.interp(level, pressure[::-1, y, x], expected[::-1, y, x]), rel=1e-4, abs=1e-3), variable
+    assert values.mask.any() and not values.mask.all()
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import numpy as np
+import pytest
+import regression_check
+
+def save_image(path, pixels):
+    from PIL import Image
+    Image.fromarray(np.asarray(pixels, dtype=np.uint8)).save(path)
+
+def test_compare_images_counts_changed_pixels(tmp_path):
+    pytest.importorskip("PIL")
+    golden = np.full((8, 8, 3), 100)
+    new = golden.copy()
+    # a small shift is within pixel_delta, a big one in one 2x2 block (one pixel at half size) isn't
+    new[:, :, 0] += 3
+    new[0:2, 0:2] = 250
+    save_image(tmp_path / "golden.png", golden)
+    save_image(tmp_path / "new.png", new)
+    save_image(tmp_path / "small.png", golden[:4])
+    fraction, half, changed = regression_check.compare_images(tmp_path / "golden.png", tmp_path / "new.png", 8)
+    assert fraction == 1 / 16
+    assert half.shape == (4, 4, 3) and changed[0, 0] and changed.sum() == 1
+    assert regression_check.compare_images(tmp_path / "golden.png", tmp_path / "golden.png", 0)[0] == 0
+    assert regression_check.compare_images(tmp_path / "golden.png", tmp_path / "small.png", 8) == (1.0, None, None)
+
+def fake_run(returncode, stdout=""):
+    def run(args, cwd=None, capture_output=False, text=False):
+        return subprocess.CompletedProcess(args, returncode, stdout, "Traceback...\nValueError: bad\n" if returncode else "")
+    return run
+
+def test_run_products_reports_failed_runs(tmp_path, monkeypatch):
+    run_folder = tmp_path / "ok" / "2025-01-15_00_00_00" / "d01"
+    os.makedirs(run_folder)
+    (run_folder / "metadata.json").write_text(json.dumps({"timing": {"products": {"wind": {"seconds": 2.5}}}}))
+    monkeypatch.setattr(subprocess, "run", fake_run(0, "error processing wind: oops!\n"))
+    run_path, seconds, errors = regression_check.run_products("wrfout", str(tmp_path / "ok"), [])
+    assert run_path == str(run_folder) and seconds == {"wind": 2.5}
+    assert errors == ["error processing wind: oops!"]
+    # a run that wrote no metadata.json, or crashed, is an error instead of an exception
+    monkeypatch.setattr(subprocess, "run", fake_run(0))
+    os.makedirs(tmp_path / "empty")
+    run_path, seconds, errors = regression_check.run_products("wrfout", str(tmp_path / "empty"), [])
+    assert run_path is None and seconds == {} and errors[-1].startswith("no metadata.json")
+    monkeypatch.setattr(subprocess, "run", fake_run(1))
+    os.makedirs(tmp_path / "crashed")
+    assert regression_check.run_products("wrfout", str(tmp_path / "crashed"), [])[2] == ["ugawrf exited with 1: ValueError: bad"]
@@ -0,0 +1,49 @@
+import runmetrics
+
+def tasks():
+    return [{"id": "wind.0-9", "module": "weathermaps", "frames": 10}, {"id": "cape.0-9", "module": "weathermaps", "frames": 10},
+            {"id": "rh.0-19", "module": "weathermaps", "frames": 20}, {"id": "text", "module": "textgen"}]
+
+def test_tasks_are_counted_once_and_the_eta_follows_the_rate(tmp_path):
+    textfile = str(tmp_path / "ugawrf.prom")
+    runmetrics.start({"file_path": ["2025-01-15_00_00_00", "d01"]}, tasks(), processes=2, textfile=textfile)
+    runmetrics.task_started("wind.0-9", worker="other")
+    runmetrics.task_finished("wind.0-9", {"status": "done", "seconds": 30.0, "host": "other", "peak_mb": 512.0,
+                                          "caches": {"accumulations": {"hits": 3, "misses": 1}}})
+    # the same task seen again in the queue's done folder
+    runmetrics.task_finished("wind.0-9", {"status": "done", "seconds": 30.0, "caches": {"accumulations": {"hits": 3, "misses": 1}}})
+    runmetrics.task_finished("cape.0-9", {"status": "error", "seconds": 1.0})
+    runmetrics.task_finished("text", {"status": "skipped", "seconds": 0})
+    assert runmetrics.is_finished("wind.0-9") and not runmetrics.is_finished("rh.0-19")
+    numbers = runmetrics.snapshot()
+    assert numbers["tasks"] == {"pending": 1, "running": 0, "done": 1, "error": 1, "skipped": 1}
+    assert numbers["frames"] == {"weathermaps": 10, "textgen": 0}
+    assert numbers["frames_per_minute"] == {"weathermaps": 20.0}
+    assert numbers["caches"] == {"accumulations": {"hits": 3, "misses": 1, "hit_rate": 0.75}}
+    assert numbers["worker_rss_mb"]["other"] == 512.0
+    # rh's 20 frames at wind's 3s per frame, over 2 processes
+    assert numbers["eta_seconds"] == 30.0
+    text = runmetrics.render(numbers)
+    assert 'ugawrf_tasks{run="2025-01-15_00_00_00",domain="d01",state="done"} 1' in text
+    assert 'ugawrf_cache_misses{run="2025-01-15_00_00_00",domain="d01",cache="accumulations"} 1' in text
+    final = runmetrics.finish()
+    assert final["tasks"]["done"] == 1 and runmetrics._metrics == {}
+    with open(textfile) as f:
+        assert "ugawrf_eta_seconds" in f.read()
+
+def test_the_eta_uses_the_task_history_and_is_unknown_without_any_rate():
+    model = {"products": {}, "modules": {"weathermaps": {"seconds_per_frame": 2.0, "peak_mb": None}}}
+    run = {"file_path": ["2025-01-15_00_00_00", "d01"]}
+    run_tasks = [dict(task, products=[task["id"].split(".")[0]]) for task in tasks()]
+    runmetrics.start(run, run_tasks[:3], model=model)
+    assert runmetrics.snapshot()["eta_seconds"] == 80.0
+    runmetrics.start(run, run_tasks)
+    assert runmetrics.snapshot()["eta_seconds"] is None
+    runmetrics.stop()
+
+def test_cache_counts_are_handed_over_once():
+    runmetrics.take_cache_counts()
+    runmetrics.count_cache("render_context", hits=1)
+    runmetrics.count_cache("render_context", misses=2)
+    assert runmetrics.take_cache_counts() == {"render_context": {"hits": 1, "misses": 2}}
+    assert runmetrics.take_cache_counts() == {}
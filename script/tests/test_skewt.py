@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("metpy")
+pytest.importorskip("adjustText")
+import pointdata
+import stations
+import skewt
+
+def test_station_profile_reads_every_site_once_per_hour(wrf_file, known_indices, monkeypatch):
+    sites = {name: stations.airports[name] for name in ["ahn", "atl", "mcn"]}
+    reads = []
+    read_columns = pointdata.read_columns
+    monkeypatch.setattr(pointdata, "read_columns", lambda *args: reads.append(args[1:]) or read_columns(*args))
+    skewt.clear_profiles()
+    for name in sites:
+        pressure, temperature, dewpoint, u, v, height = skewt.station_profile(wrf_file, sites, name, 2)
+        # the same grid point the full-field skew-T used, [:, x_y[0], x_y[1]]
+        x, y = known_indices[name]
+        column = pointdata.read_column(wrf_file, x, y, 2)
+        assert np.allclose(pressure.m, column["pressure"]) and str(pressure.units) == "hectopascal"
+        assert np.allclose(temperature.m, column["tc"]) and np.allclose(height.m, column["z"])
+    assert len(reads) == 1
+    skewt.station_profile(wrf_file, sites, "ahn", 3)
+    assert len(reads) == 2
+    skewt.clear_profiles()
+
+def test_station_profile_leaves_out_sites_off_the_grid(wrf_file, known_indices, monkeypatch):
+    sites = {name: stations.airports[name] for name in ["ahn", "atl"]}
+    monkeypatch.setattr(pointdata, "station_indices", lambda wrf_file, stations: (["ahn", "atl"], np.array([4, 500]), np.array([5, 6])))
+    skewt.clear_profiles()
+    assert np.allclose(skewt.station_profile(wrf_file, sites, "ahn", 0)[1].m, pointdata.read_column(wrf_file, 4, 5, 0)["tc"])
+    with pytest.raises(IndexError):
+        skewt.station_profile(wrf_file, sites, "atl", 0)
+    skewt.clear_profiles()
@@ -0,0 +1,41 @@
+import datetime as dt
+import pytest
+import statsdb
+
+def verified(init_time, airport, hour, error):
+    return {'Init Time (UTC)': init_time, 'Airport': airport, 'Forecast Hour': hour, 'Valid Time (UTC)': init_time, 'Error_Temp': error}
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "verification.sqlite")
+    statsdb.append_verification(path, [
+        verified('2025-03-13 00:00', 'atl', 1, 1.0),
+        verified('2025-03-13 18:00', 'atl', 1, 3.0),
+        verified('2025-03-13 18:00', 'ahn', 2, -2.0),
+        verified('2025-03-14 00:00', 'atl', 2, 5.0),
+    ])
+    return path
+
+def test_appending_the_same_rows_again_adds_nothing(db_path):
+    assert statsdb.append_verification(db_path, [verified('2025-03-13 00:00', 'ATL', 1, 9.0)]) == 0
+
+def test_query_errors_by_forecast_hour(db_path):
+    results = statsdb.query_errors(db_path, airports='atl')
+    assert [result['forecast_hour'] for result in results] == [1, 2]
+    assert results[0]['count'] == 2
+    assert results[0]['bias'] == pytest.approx(2.0)
+    assert results[0]['mae'] == pytest.approx(2.0)
+    assert results[0]['rmse'] == pytest.approx((5.0) ** 0.5)
+
+def test_query_errors_end_day_takes_in_the_whole_day(db_path):
+    assert statsdb.query_errors(db_path, end='2025-03-13', group_by=None)[0]['count'] == 3
+    assert statsdb.query_errors(db_path, end=dt.date(2025, 3, 13), group_by=None)[0]['count'] == 3
+    assert statsdb.query_errors(db_path, end='2025-03-13 12:00', group_by=None)[0]['count'] == 1
+    assert statsdb.query_errors(db_path, start=dt.datetime(2025, 3, 13, 18), end='2025-03-13 18:00', group_by=None)[0]['count'] == 2
+    assert statsdb.query_errors(db_path, start='2025-03-14', end='2025-03-14', group_by='airport') == [{'airport': 'ATL', 'count': 1, 'bias': 5.0, 'mae': 5.0, 'rmse': 5.0}]
+
+def test_query_errors_checks_its_arguments(db_path):
+    with pytest.raises(ValueError):
+        statsdb.query_errors(db_path, variable='snow')
+    with pytest.raises(ValueError):
+        statsdb.query_errors(db_path, group_by='valid_time')
@@ -0,0 +1,34 @@
+import os
+import pytest
+from PIL import Image, features
+import thumbnails
+
+pytestmark = pytest.mark.skipif(not features.check("webp"), reason="Pillow without WebP")
+
+def frame(path, size=(1500, 1000)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size, "white").save(path)
+
+def test_generate_run_makes_every_size_and_lists_the_frames(tmp_path):
+    frame(str(tmp_path / "temperature" / "hour_0.png"))
+    frame(str(tmp_path / "temperature" / "hour_1.png"))
+    frame(str(tmp_path / "skewt" / "ahn" / "hour_0.png"), (400, 300))
+    summary = thumbnails.generate_run(str(tmp_path), workers=2)
+    assert summary["products"] == {"skewt/ahn": [0], "temperature": [0, 1]}
+    with Image.open(tmp_path / "temperature" / "hour_1.preview.webp") as preview:
+        assert preview.size == (thumbnails.SIZES["preview"][0], 480)
+    with Image.open(tmp_path / "temperature" / "hour_1.thumb.webp") as thumb:
+        assert thumb.width == thumbnails.SIZES["thumb"][0]
+    # frames smaller than a size aren't blown up
+    with Image.open(tmp_path / "skewt" / "ahn" / "hour_0.preview.webp") as preview:
+        assert preview.size == (400, 300)
+
+def test_up_to_date_previews_are_kept_and_bad_frames_left_out(tmp_path):
+    frame(str(tmp_path / "temperature" / "hour_0.png"))
+    thumbnails.generate_run(str(tmp_path))
+    preview = tmp_path / "temperature" / "hour_0.preview.webp"
+    made = os.path.getmtime(preview)
+    (tmp_path / "temperature" / "hour_1.png").write_bytes(b"not a png")
+    summary = thumbnails.generate_run(str(tmp_path))
+    assert os.path.getmtime(preview) == made
+    assert summary["products"] == {"temperature": [0]}
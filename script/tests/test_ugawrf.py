@@ -0,0 +1,87 @@
+import datetime as dt
+import threading
+import signal
+import time
+import pytest
+import ugawrf
+
+def make_run(hours):
+    init = dt.datetime(2025, 3, 13, 21)
+    return {"init_dt": init, "forecast_times": [init + dt.timedelta(hours=h) for h in range(hours)]}
+
+def product_task(product, hours, module="weathermaps", **extra):
+    return dict({"id": f"{product}.{hours[0]}-{hours[-1]}", "product": product, "products": [product], "module": module,
+                 "hours": list(hours), "frames": len(hours)}, **extra)
+
+def test_schedule_tasks_runs_priorities_and_early_hours_first():
+    run = make_run(48)
+    tasks = [product_task("skewt", range(48), module="skewt"), product_task("wind", range(48)),
+             product_task("temperature", range(48)), product_task("wind_500mb", range(48), level=500),
+             {"id": "text", "product": "text", "products": ["text"], "module": "text"}]
+    scheduled = ugawrf.schedule_tasks(run, tasks)
+    assert [task["id"] for task in scheduled] == [
+        "temperature.0-23", "text", "wind.0-23", "temperature.24-47",
+        "skewt.0-23", "wind.24-47", "wind_500mb.0-23", "skewt.24-47", "wind_500mb.24-47"]
+    assert [task["rank"] for task in scheduled] == list(range(len(scheduled)))
+    assert [task["priority"] for task in scheduled] == sorted(task["priority"] for task in scheduled)
+    assert scheduled[0]["frames"] == 24 and scheduled[0]["hours"] == list(range(24))
+
+def test_schedule_tasks_puts_the_longest_tasks_first_within_a_priority():
+    run = make_run(12)
+    model = {"products": {"wind": {"seconds_per_frame": 1.0, "peak_mb": 300},
+                          "dewpoint": {"seconds_per_frame": 5.0, "peak_mb": 900}}, "modules": {}}
+    tasks = [product_task("wind", range(12)), product_task("dewpoint", range(12)), product_task("cape", range(12))]
+    scheduled = ugawrf.schedule_tasks(run, tasks, deadline=123.0, model=model)
+    assert [task["product"] for task in scheduled] == ["dewpoint", "wind", "cape"]
+    assert [task.get("estimated_peak_mb") for task in scheduled] == [900, 300, None]
+    assert [task.get("estimated_seconds") for task in scheduled] == [60.0, 12.0, None]
+    assert all(task["deadline"] == 123.0 for task in scheduled)
+    # without a model the build order is kept
+    assert [task["product"] for task in ugawrf.schedule_tasks(run, tasks)] == ["wind", "dewpoint", "cape"]
+
+def test_run_frame_retries_then_records_the_failure():
+    run = {"options": {"frame_retries": 2}, "failures": []}
+    calls = []
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ValueError("bad hour")
+    assert ugawrf.run_frame(run, {"id": "wind.0-9"}, 4, flaky)
+    assert len(calls) == 3 and run["failures"] == []
+    def broken():
+        raise ValueError("bad hour")
+    assert not ugawrf.run_frame(run, {"id": "wind.0-9"}, 5, broken)
+    assert [{key: failure[key] for key in ["task", "frame", "attempts", "error"]} for failure in run["failures"]] == [
+        {"task": "wind.0-9", "frame": 5, "attempts": 3, "error": "ValueError: bad hour"}]
+
+def test_run_frame_closes_the_figures_of_a_failed_attempt():
+    plt = pytest.importorskip("matplotlib.pyplot")
+    kept = plt.figure()
+    def draw():
+        plt.figure()
+        raise ValueError("half drawn")
+    assert not ugawrf.run_frame({"options": {"frame_retries": 1}, "failures": []}, {"id": "wind.0-9"}, 0, draw)
+    assert plt.get_fignums() == [kept.number]
+    plt.close(kept)
+
+def test_frame_timeout_stops_a_slow_frame():
+    if not hasattr(signal, "setitimer"):
+        pytest.skip("no SIGALRM here")
+    run = {"options": {"frame_retries": 0, "frame_timeout": 0.05}, "failures": []}
+    started = time.time()
+    assert not ugawrf.run_frame(run, {"id": "wind.0-9"}, 0, lambda: time.sleep(5))
+    assert time.time() - started < 2
+    assert run["failures"][0]["error"] == "FrameTimeout: took longer than 0.05s"
+    # the alarm is off again afterwards
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+def test_frame_timeout_off_the_main_thread_warns_once(capsys, monkeypatch):
+    monkeypatch.setattr(ugawrf, "_frame_timeout", {"warned": False})
+    def frames():
+        for i in range(2):
+            with ugawrf.frame_timeout(1):
+                pass
+    thread = threading.Thread(target=frames)
+    thread.start()
+    thread.join()
+    assert capsys.readouterr().out.count("warning: --frame-timeout") == 1
@@ -0,0 +1,210 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("wrf")
+pytest.importorskip("cartopy")
+import weathermaps
+
+def rgba_of(color):
+    import matplotlib.colors
+    return matplotlib.colors.to_rgba(color)
+
+def test_raster_field_bands_follow_the_levels():
+    import matplotlib.pyplot as plt
+    rgba, mappable = weathermaps.raster_field(np.array([[5.0, 15.0, 0.0, 20.0]]), levels=[0, 10, 20], cmap="viridis")
+    cmap = plt.get_cmap("viridis")
+    # each band gets the color of its midpoint, and the bottom level belongs to the first band like contourf
+    assert np.allclose(rgba[0, 0], cmap(0.25))
+    assert np.allclose(rgba[0, 1], cmap(0.75))
+    assert np.allclose(rgba[0, 2], cmap(0.25))
+    assert np.allclose(rgba[0, 3], cmap(0.75))
+    assert mappable.norm.boundaries.tolist() == [0, 10, 20]
+
+def test_raster_field_leaves_out_of_range_and_missing_clear_unless_extended():
+    values = np.array([[-5.0, 25.0, np.nan]])
+    rgba, _ = weathermaps.raster_field(values, levels=[0, 10, 20], cmap="viridis")
+    assert rgba[0, :, 3].tolist() == [0, 0, 0]
+    rgba, _ = weathermaps.raster_field(values, levels=[0, 10, 20], cmap="viridis", extend="both")
+    assert rgba[0, 0, 3] == 1 and rgba[0, 1, 3] == 1 and rgba[0, 2, 3] == 0
+
+def test_raster_field_colors_leave_values_past_the_top_level_clear_unless_extended():
+    levels = [50, 100, 200, 300]
+    rgba, _ = weathermaps.raster_field(np.array([[75.0, 250.0, 900.0]]), levels=levels, colors=["green", "blue", "red", "black"], alpha=0.5)
+    assert np.allclose(rgba[0, 0], rgba_of("green")[:3] + (0.5,))
+    assert np.allclose(rgba[0, 1], rgba_of("red")[:3] + (0.5,))
+    # contourf only uses the extra color with extend='max', past the top level is unfilled otherwise
+    assert rgba[0, 2, 3] == 0
+    rgba, _ = weathermaps.raster_field(np.array([[900.0]]), levels=levels, colors=["green", "blue", "red", "black"], extend="max")
+    assert np.allclose(rgba[0, 0], rgba_of("black"))
+
+def test_native_grid_reaches_the_outer_cell_edges(wrf_file):
+    from wrf import cartopy_xlim, cartopy_ylim
+    projection, (x0, x1, y0, y1) = weathermaps.native_grid(wrf_file)
+    (cx0, cx1), (cy0, cy1) = cartopy_xlim(wrfin=wrf_file), cartopy_ylim(wrfin=wrf_file)
+    nx, ny = len(wrf_file.dimensions["west_east"]), len(wrf_file.dimensions["south_north"])
+    # the corner cell centers are half a cell in from the edges
+    assert x1 - x0 == pytest.approx((cx1 - cx0) * nx / (nx - 1))
+    assert y1 - y0 == pytest.approx((cy1 - cy0) * ny / (ny - 1))
+    assert (x0 + x1) / 2 == pytest.approx((cx0 + cx1) / 2)
+    assert weathermaps.native_grid(wrf_file)[1] is weathermaps.native_grid(wrf_file)[1]
+
+def small_grid():
+    lons, lats = np.meshgrid(np.linspace(-88, -80, 5), np.linspace(30, 36, 4))
+    return lons, lats, np.arange(20.0).reshape(4, 5) + 1
+
+def test_plot_maxmin_only_looks_at_the_view():
+    import matplotlib.pyplot as plt
+    lons, lats, values = small_grid()
+    fig, ax = plt.subplots()
+    assert weathermaps.plot_maxmin(ax, values, lons, lats).get_text() == "Max: 20.0\nMin: 1.0"
+    # extents are [west, east, north, south]
+    assert weathermaps.plot_maxmin(ax, values, lons, lats, [-88, -84, 32, 30]).get_text() == "Max: 8.0\nMin: 1.0"
+    plt.close(fig)
+
+def test_plot_maxmin_skips_a_view_with_no_grid_points():
+    import matplotlib.pyplot as plt
+    lons, lats, values = small_grid()
+    fig, ax = plt.subplots()
+    assert weathermaps.plot_maxmin(ax, values, lons, lats, [-70, -60, 45, 40]) is None
+    plt.close(fig)
+
+def test_extent_in_domain():
+    lons, lats, values = small_grid()
+    assert weathermaps.extent_in_domain([-85, -83, 34, 33], lons, lats)
+    assert weathermaps.extent_in_domain([-81, -78, 37, 35], lons, lats)
+    assert not weathermaps.extent_in_domain([-79, -77, 34, 33], lons, lats)
+
+def test_render_context_is_kept_across_timesteps_of_a_product():
+    from matplotlib._pylab_helpers import Gcf
+    weathermaps.close_render_context()
+    first = weathermaps.get_render_context("temperature", None)
+    fig = first["fig"]
+    first["ax"].set_extent([-88, -80, 30, 36])
+    first["busy"] = False
+    again = weathermaps.get_render_context("temperature", None)
+    assert again["fig"] is fig
+    # the view is reset for the next timestep's autoscaling
+    assert again["ax"].get_autoscale_on()
+    # still busy = the last timestep failed partway, so it starts over on a new figure and the old one is closed
+    assert weathermaps.get_render_context("temperature", None)["fig"] is not fig
+    assert fig not in [manager.canvas.figure for manager in Gcf.get_all_fig_managers()]
+    weathermaps.close_render_context()
+
+def test_render_context_changes_with_the_product_or_extent():
+    weathermaps.close_render_context()
+    # (the context is one dict that's updated in place, so the figure is taken out before the next call)
+    context = weathermaps.get_render_context("temperature", None)
+    fig = context["fig"]
+    context["busy"] = False
+    context = weathermaps.get_render_context("temperature", [-85, -83, 34, 33])
+    assert context["fig"] is not fig
+    fig = context["fig"]
+    context["busy"] = False
+    assert weathermaps.get_render_context("dewp", [-85, -83, 34, 33])["fig"] is not fig
+    weathermaps.close_render_context()
+    assert weathermaps._render_context == {}
+
+def test_working_array_makes_float32_copies_only_when_asked():
+    field = np.array([[273.15, 300.0]], dtype=np.float64)
+    values = weathermaps.working_array(field)
+    assert values.dtype == np.float64 and not np.shares_memory(values, field)
+    values = weathermaps.working_array(field, float32=True)
+    assert values.dtype == np.float32 and np.allclose(values, field)
+    # integer fields (categories, masks) keep their type
+    assert weathermaps.working_array(np.array([1, 2]), float32=True).dtype == np.array([1, 2]).dtype
+    # copy=False hands back the field itself when there's nothing to convert
+    assert weathermaps.working_array(field, copy=False) is field
+
+def test_unit_conversions_are_in_place():
+    field = np.array([273.15, 300.0], dtype=np.float32)
+    working = weathermaps.working_array(field)
+    assert weathermaps.k_to_f(working) is working
+    assert np.allclose(working, [32.0, 80.33], atol=0.01)
+    assert np.allclose(field, [273.15, 300.0])
+    celsius = np.array([0.0, 100.0, -40.0])
+    assert weathermaps.c_to_f(celsius) is celsius
+    assert celsius.tolist() == [32.0, 212.0, -40.0]
+
+def test_accumulation_differences_the_run_totals(wrf_file, synthetic_wrfout):
+    from netCDF4 import Dataset
+    weathermaps.clear_accumulations()
+    total = wrf_file.variables["AFWA_TOTPRECIP"][:]
+    fields = weathermaps.accumulation(wrf_file, "AFWA_TOTPRECIP")
+    assert np.allclose(fields["total"], total)
+    # the first hour's increment is the total so far, every later one is the change from the hour before
+    assert np.allclose(fields["hourly"][0], total[0])
+    for t in range(1, total.shape[0]):
+        assert np.allclose(fields["hourly"][t], total[t] - total[t - 1])
+    assert weathermaps.accumulation(wrf_file, "AFWA_TOTPRECIP") is fields
+    # another wrfout starts over
+    with Dataset(synthetic_wrfout) as other:
+        assert weathermaps.accumulation(other, "AFWA_TOTPRECIP") is not fields
+        assert weathermaps._accumulations["file"] is other
+    weathermaps.clear_accumulations()
+
+def test_hourly_change_reuses_the_last_hour():
+    fields = {t: np.full((2, 2), 10.0 * t) for t in range(4)}
+    reads = []
+    def read_previous(t):
+        reads.append(t)
+        return fields[t]
+    window = {}
+    assert np.array_equal(weathermaps.hourly_change(window, 0, fields[0], lambda: read_previous(-1)), np.zeros((2, 2)))
+    for t in range(1, 4):
+        change = weathermaps.hourly_change(window, t, fields[t], lambda: read_previous(t - 1))
+        assert np.array_equal(change, np.full((2, 2), 10.0))
+        assert list(window) == [t]
+    assert reads == []
+    # a chunk starting partway through the run, or no window at all, reads the hour before
+    assert np.array_equal(weathermaps.hourly_change({}, 2, fields[2], lambda: read_previous(1)), np.full((2, 2), 10.0))
+    assert np.array_equal(weathermaps.hourly_change(None, 3, fields[3], lambda: read_previous(2)), np.full((2, 2), 10.0))
+    assert reads == [1, 2]
+
+def test_kuchera_snowfall_matches_the_full_columns(wrf_file):
+    weathermaps.clear_accumulations()
+    raw = lambda varname, t: np.ma.getdata(wrf_file.variables[varname][t])
+    expected = 0
+    totals = []
+    for t in range(wrf_file.dimensions["Time"].size):
+        pressure = raw("P", t) + raw("PB", t)
+        temp = (raw("T", t) + 300.0) * (pressure / 100000.0) ** (2.0 / 7.0) - 273.15
+        t_max = np.where(pressure >= 50000, temp, -999).max(axis=0)
+        assert np.allclose(weathermaps.max_temp_below(wrf_file, t, 500), t_max)
+        snow = weathermaps.accumulation(wrf_file, "AFWA_SNOW")["hourly"][t]
+        expected = expected + snow / 25.4 * weathermaps.kuchera_ratio_from_max(t_max)
+        totals.append(expected)
+    # asked for out of order, each hour still adds on the earlier ones
+    assert np.allclose(weathermaps.kuchera_snowfall(wrf_file, 2), totals[2])
+    assert np.allclose(weathermaps.kuchera_snowfall(wrf_file, 0), totals[0])
+    assert np.allclose(weathermaps.kuchera_snowfall(wrf_file, 3), totals[3])
+    assert weathermaps._kuchera["through"] == 3
+    weathermaps.clear_accumulations()
+    assert weathermaps._kuchera == {"totals": None, "through": -1}
+
+def test_max_temp_below_marks_columns_without_levels():
+    import types
+    # one column at 600 hPa everywhere, the other already above 500 hPa
+    shape = (2, 1, 2)
+    variables = {"P": np.zeros(shape), "PB": np.array([[[60000.0, 40000.0]], [[50000.0, 30000.0]]]), "T": np.zeros(shape)}
+    wrf_file = types.SimpleNamespace(variables={name: values[None] for name, values in variables.items()})
+    t_max = weathermaps.max_temp_below(wrf_file, 0, 500)
+    assert t_max[0, 1] == -999
+    assert t_max[0, 0] == pytest.approx(300.0 * 0.6 ** (2.0 / 7.0) - 273.15)
+
+def test_level_field_in_float32_skips_the_3d_getvar(wrf_file, monkeypatch):
+    def getvar(*args, **kwargs):
+        raise AssertionError("built a 3D diagnostic")
+    monkeypatch.setattr(weathermaps, "getvar", getvar)
+    values = weathermaps.level_field(wrf_file, "tc", 1, 700, float32=True)
+    assert values.dtype == np.float32
+    assert np.array_equal(values, weathermaps.pointdata.interp_level(wrf_file, "tc", 1, 700))
+
+def test_level_field_shares_the_frames_3d_fields(wrf_file, monkeypatch):
+    import wrf
+    reads = []
+    monkeypatch.setattr(weathermaps, "getvar", lambda wrf_file, name, timeidx: reads.append(name) or wrf.getvar(wrf_file, name, timeidx=timeidx))
+    fields = {}
+    for level in [850, 700, 500]:
+        weathermaps.level_field(wrf_file, "tc", 0, level, fields=fields)
+    weathermaps.level_field(wrf_file, "td", 0, 850, fields=fields)
+    assert reads == ["tc", "pressure", "td"]
@@ -0,0 +1,79 @@
+import json
+import os
+import workqueue
+
+def make_run(tmp_path, tasks):
+    run = {"wrf_path": str(tmp_path / "wrfout_d01"), "base_output": str(tmp_path / "out"), "options": {}}
+    return workqueue.submit(str(tmp_path / "queue"), "run", run, tasks)
+
+def test_tasks_are_claimed_in_rank_order_and_completed_once(tmp_path):
+    tasks = [{"id": "late", "rank": 2}, {"id": "early", "rank": 0}, {"id": "middle", "rank": 1}]
+    queue_run = make_run(tmp_path, tasks)
+    order = []
+    while True:
+        claimed = workqueue.claim(queue_run, "me")
+        if claimed is None:
+            break
+        order.append(claimed[1]["id"])
+        assert os.path.exists(claimed[2])
+        assert workqueue.complete(queue_run, workqueue.task_name(claimed[1]), {"status": "done"}, claimed[2])
+    assert order == ["early", "middle", "late"]
+    assert workqueue.queue_files(os.path.join(queue_run, "claimed")) == []
+    # a second copy finishing later doesn't count
+    backup_path = os.path.join(queue_run, "claimed", "0000.early@other@0.json")
+    workqueue.write_json(backup_path, tasks[1])
+    assert not workqueue.complete(queue_run, "0000.early", {"status": "done"}, backup_path)
+    assert not os.path.exists(backup_path)
+
+def test_stale_claims_are_requeued_then_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(workqueue, "STALE_AFTER", 0)
+    queue_run = make_run(tmp_path, [{"id": "crashy"}])
+    for attempt in range(1, workqueue.MAX_ATTEMPTS):
+        claim_path = workqueue.claim(queue_run, f"worker{attempt}")[2]
+        workqueue.requeue_stale(queue_run)
+        assert not os.path.exists(claim_path)
+        with open(os.path.join(queue_run, "pending", "0000.crashy.json")) as f:
+            assert json.load(f)["attempts"] == attempt
+    workqueue.claim(queue_run, "last")
+    workqueue.requeue_stale(queue_run)
+    assert workqueue.queue_files(os.path.join(queue_run, "pending")) == []
+    with open(os.path.join(queue_run, "failed", "0000.crashy.json")) as f:
+        failure = json.load(f)
+    assert failure["status"] == "error" and failure["host"] == "last"
+    assert failure["failures"][0]["attempts"] == workqueue.MAX_ATTEMPTS
+
+def test_live_claims_are_left_alone(tmp_path):
+    queue_run = make_run(tmp_path, [{"id": "busy"}])
+    claim_path = workqueue.claim(queue_run, "me")[2]
+    workqueue.requeue_stale(queue_run)
+    assert os.path.exists(claim_path)
+    assert workqueue.claim(queue_run, "other") is None
+
+def test_others_running_here_only_counts_other_local_workers(tmp_path):
+    import socket
+    queue_run = make_run(tmp_path, [{"id": "wind"}])
+    queue = str(tmp_path / "queue")
+    me = workqueue.worker_id()
+    workqueue.claim(queue_run, me)
+    assert not workqueue.others_running_here(queue, me)
+    workqueue.write_json(os.path.join(queue_run, "claimed", "0000.cape@elsewhere-12@0.json"), {"id": "cape"})
+    assert not workqueue.others_running_here(queue, me)
+    workqueue.write_json(os.path.join(queue_run, "claimed", f"0000.rh@{socket.gethostname()}-1@0.json"), {"id": "rh"})
+    assert workqueue.others_running_here(queue, me)
+
+def test_backup_copies_wait_for_the_tasks_expected_time(tmp_path, monkeypatch):
+    assert workqueue.straggler_after({"id": "new"}) == workqueue.STRAGGLER_AFTER
+    assert workqueue.straggler_after({"id": "short", "estimated_seconds": 5}) == workqueue.STRAGGLER_MIN
+    assert workqueue.straggler_after({"id": "long", "estimated_seconds": 1800}) == 1800 * workqueue.STRAGGLER_FACTOR
+    queue_run = make_run(tmp_path, [{"id": "long", "estimated_seconds": 1800}])
+    claim_path = workqueue.claim(queue_run, "slow")[2]
+    clock = [1000.0]
+    monkeypatch.setattr(workqueue.time, "monotonic", lambda: clock[0])
+    assert workqueue.claim_straggler(queue_run, "me") is None
+    # well past STRAGGLER_AFTER, but a healthy run of this task takes longer than that
+    clock[0] += workqueue.STRAGGLER_AFTER * 2
+    assert workqueue.claim_straggler(queue_run, "me") is None
+    clock[0] += 1800 * workqueue.STRAGGLER_FACTOR
+    backup = workqueue.claim_straggler(queue_run, "me")
+    assert backup[1]["id"] == "long" and backup[2] != claim_path
+    assert workqueue.claim_straggler(queue_run, "other") is None
@@ -1,26 +1,31 @@
 # This module generates our text forecasts.
+# Station values come from one point extraction for all airports (pointdata.py), so this needs netCDF4 and numpy only.
 
-from wrf import getvar, to_np, ll_to_xy
+import pointdata
 
-def get_text_data(wrf_file, airport, coords, hours, forecast_times, run_time):
+def get_text_data_all(wrf_file, airports, hours, forecast_times, run_time):
+    # {airport: [lines]} for every airport
+    names, xs, ys = pointdata.station_indices(wrf_file, airports)
+    series = pointdata.point_series(wrf_file, xs, ys, ["T2", "td2", "wspd", "wdir", "mslp"])
+    t_f = (series["T2"] - 273.15) * 9/5 + 32
+    td = series["td2"] * 9/5 + 32
+    wspd = series["wspd"] * 2.23694
+    pressure_mb = series["mslp"] / 100
     forecast_time = forecast_times[1].strftime("%Y-%m-%d %H:%M UTC")
-    x, y = ll_to_xy(wrf_file, coords[0], coords[1])
-    output_lines = []
-    output_lines.append(f"UGA-WRF {run_time} - Init: {forecast_times[0]} - Text Forecast for {airport.upper()}")
-    output_lines.append(f"Forecast Start Time: {forecast_time}")
-    output_lines.append(f"UTC (Fcst) Hr | Temp | Dewp | Wind (dir) | Pressure")
-    for t in range(1, hours):
-        t_data = getvar(wrf_file, "T2", timeidx=t)[y, x].values
-        td_data = getvar(wrf_file, "td2", timeidx=t)[y, x].values
-        wspd_data = getvar(wrf_file, "wspd_wdir10", timeidx=t, units="mph")
-        pressure_data = getvar(wrf_file, "AFWA_MSLP", timeidx=t)[y, x].values
-        t_f = (t_data - 273.15) * 9/5 + 32
-        td = td_data * 9/5 + 32
-        wspd = to_np(wspd_data[0][y, x])
-        wdir = to_np(wspd_data[1][y, x])
-        pressure_mb = to_np(pressure_data) / 100
-        output_lines.append(f"{forecast_times[t].strftime('%H UTC')} ({str(t).zfill(2)}) | {t_f:.1f} F | {td:.1f} F | {wspd:.1f} mph {deg_to_cardinal(wdir)} | {pressure_mb:.1f} mb")
-    return output_lines
+    texts = {}
+    for i, airport in enumerate(names):
+        output_lines = []
+        output_lines.append(f"UGA-WRF {run_time} - Init: {forecast_times[0]} - Text Forecast for {airport.upper()}")
+        output_lines.append(f"Forecast Start Time: {forecast_time}")
+        output_lines.append(f"UTC (Fcst) Hr | Temp | Dewp | Wind (dir) | Pressure")
+        for t in range(1, hours):
+            output_lines.append(f"{forecast_times[t].strftime('%H UTC')} ({str(t).zfill(2)}) | {t_f[t, i]:.1f} F | {td[t, i]:.1f} F | {wspd[t, i]:.1f} mph {deg_to_cardinal(series['wdir'][t, i])} | {pressure_mb[t, i]:.1f} mb")
+        texts[airport] = output_lines
+    return texts
+
+def get_text_data(wrf_file, airport, coords, hours, forecast_times, run_time):
+    # single airport version, kept for older callers
+    return get_text_data_all(wrf_file, {airport: coords}, hours, forecast_times, run_time)[airport]
 
 def deg_to_cardinal(deg):
     # N, NNE NE, etc
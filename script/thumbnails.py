@@ -0,0 +1,91 @@
+# This module makes the small WebP copies of our frames that the site loads first.
+# Every hour_N.png in a run (map products and the per-station folders like skewt/ahn) gets two siblings:
+#   hour_N.thumb.webp   - product picker size
+#   hour_N.preview.webp - what the site shows while scrubbing/looping, before the full png is fetched
+# They're made in parallel after all products are written, and skipped when already newer than their png
+# (so repeated partial runs only do the new hours).
+# ex: python thumbnails.py ../site/runs/2025-03-13_21_00_00/d01
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, features
+import os
+import re
+
+# name: (max width in pixels, webp quality)
+SIZES = {"thumb": (240, 70), "preview": (720, 80)}
+HOUR_FILE = re.compile(r"hour_(\d+)\.png")
+
+def generate_run(run_path, workers=None):
+    # makes every missing/outdated thumbnail+preview under one run/domain folder and returns the summary that goes
+    # in metadata.json: {"sizes": {...}, "pattern": ..., "products": {"temperature": [0, 1, ...], "skewt/ahn": [...]}}
+    if not features.check("webp"):
+        print("warning: this Pillow build has no WebP support, skipping thumbnails!")
+        return None
+    frames = find_frames(run_path)
+    jobs = [(os.path.join(run_path, product, f"hour_{hour}.png"), product, hour) for product, hours in frames.items() for hour in hours]
+    workers = workers or min(8, os.cpu_count() or 1)
+    # pillow lets go of the GIL while resizing and encoding, so threads run these in parallel
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda job: make_previews(job[0]), jobs))
+    made = {}
+    for (path, product, hour), ok in zip(jobs, results):
+        if ok:
+            made.setdefault(product, []).append(hour)
+    return {
+        "sizes": {name: width for name, (width, quality) in SIZES.items()},
+        "pattern": "{product}/hour_{hour}.{size}.webp",
+        "products": {product: sorted(hours) for product, hours in sorted(made.items())},
+    }
+
+def find_frames(run_path):
+    # {"temperature": [0, 1, ...], "skewt/ahn": [...]} - product folders and one level of station folders
+    frames = {}
+    for root, dirs, files in os.walk(run_path):
+        product = os.path.relpath(root, run_path).replace(os.sep, "/")
+        if product == "." or product.count("/") > 1:
+            continue
+        hours = [int(match.group(1)) for match in map(HOUR_FILE.fullmatch, files) if match]
+        if hours:
+            frames[product] = sorted(hours)
+    return frames
+
+def preview_path(path, size):
+    return f"{path[:-len('.png')]}.{size}.webp"
+
+def make_previews(path):
+    # returns False if the png couldn't be read, so it's left out of the metadata
+    targets = [(size, preview_path(path, size)) for size in SIZES]
+    try:
+        source_time = os.path.getmtime(path)
+        if all(os.path.exists(target) and os.path.getmtime(target) >= source_time for size, target in targets):
+            return True
+        with Image.open(path) as image:
+            image = image.convert("RGBA")
+            for size, target in targets:
+                width, quality = SIZES[size]
+                height = max(1, round(image.height * width / image.width))
+                small = image.resize((width, height), Image.LANCZOS) if image.width > width else image
+                small.save(f"{target}.tmp", format="WEBP", quality=quality, method=4)
+                os.replace(f"{target}.tmp", target)
+        return True
+    except Exception as e:
+        print(f"error making previews for {path}: {e}!")
+        return False
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    parser = argparse.ArgumentParser(description='Make WebP thumbnails/previews for every frame of a run and record them in its metadata.json.')
+    parser.add_argument('run_path', type=str, help='Run/domain folder, e.g. ../site/runs/2025-03-13_21_00_00/d01')
+    parser.add_argument('--workers', type=int, default=None, help='Threads to use. Defaults to the CPU count (max 8).')
+    args = parser.parse_args()
+    previews = generate_run(args.run_path, args.workers)
+    metadata_path = os.path.join(args.run_path, "metadata.json")
+    if previews is not None and os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        metadata["previews"] = previews
+        with open(f"{metadata_path}.tmp", "w") as f:
+            json.dump(metadata, f, indent=4)
+        os.replace(f"{metadata_path}.tmp", metadata_path)
+    print(f"previews for {sum(len(hours) for hours in (previews or {}).get('products', {}).values())} frames in {args.run_path}")
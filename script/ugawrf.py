@@ -4,36 +4,44 @@ warnings.simplefilter(action='ignore', category=FutureWarning)
 import os
 import argparse
 from pathlib import Path
-from netCDF4 import Dataset 
-from wrf import extract_times, ll_to_xy
-import numpy as np
 import datetime as dt
+import contextlib
+import threading
+import signal
 import json
+from stations import high_prio_airports, other_airports, airports
+
+# only light modules are imported up here. the product modules (and with them matplotlib, cartopy, metpy and wrf-python)
+# are imported right before their section runs, so a text/modelstats-only run doesn't pay for the mapping stack.
+# python startup_benchmark.py times the startup of each path
 
 # Specify your wrfout and output folder in the commandline. Arg1 is your wrfout, arg2 is where you plan to store the products created.
 # If you do not specify one, it will try to use the defaults of (parent folder)/site/runs for your image output
 # An example input: python.exe ugawrf.py "D:\ugawrf_fork\ugawrf\wrfout_d01_2025-03-13_21_00_00" "D:\ugawrf_fork\ugawrf\run"
-parser = argparse.ArgumentParser(description='A tool to process UGA-WRF model output and generate human-readable products.')
-parser.add_argument('wrf_file', type=str, help='Path to the wrfout file.')
-parser.add_argument('output_folder', type=str, nargs='?', help='Base output folder for products. Defaults to ../site/runs.', default=None)
-parser.add_argument('-r', '--run_flags', type=str, nargs='?', help='Run flags to disable certain products. See comments in file for more info.', default="0")
-parser.add_argument('-p', '--partial', help='Denotes this is a partial wrfout (i.e. one that is only one hour long) and skips plots that require multiple hours like 1-hour temp change. Omit to only plot products skipped in a partial run.', action='store_true')
-parser.add_argument('-a', '--all', help="Process all products, regardless of partial status.", action='store_true')
-args = parser.parse_args()
-print(args)
-try:
-    WRF_FILE = args.wrf_file
-except:
-    root_dir = Path(__file__).resolve().parent
-    WRF_FILE = root_dir / "wrfout_d01_2025-03-13_21_00_00"
-try:
-    if args.output_folder == None:
-        BASE_OUTPUT = Path(__file__).resolve().parent.parent / "site" / "runs"
-    else:
-        BASE_OUTPUT = args.output_folder
-except:
-    root_dir = Path(__file__).resolve().parent.parent
-    BASE_OUTPUT = root_dir / "site" / "runs"
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='A tool to process UGA-WRF model output and generate human-readable products.')
+    parser.add_argument('wrf_file', type=str, help='Path to the wrfout file.')
+    parser.add_argument('output_folder', type=str, nargs='?', help='Base output folder for products. Defaults to ../site/runs.', default=None)
+    parser.add_argument('-r', '--run_flags', type=str, nargs='?', help='Run flags to disable certain products. See comments in file for more info.', default="0")
+    parser.add_argument('-p', '--partial', help='Denotes this is a partial wrfout (i.e. one that is only one hour long) and skips plots that require multiple hours like 1-hour temp change. Omit to only plot products skipped in a partial run.', action='store_true')
+    parser.add_argument('-a', '--all', help="Process all products, regardless of partial status.", action='store_true')
+    parser.add_argument('--stats-db', type=str, help="Verification history database that modelstats appends to. Defaults to (parent folder)/data/verification.sqlite.", default=None)
+    parser.add_argument('--stats-parquet', help="Also write the run's model stats table as parquet (needs pyarrow).", action='store_true')
+    parser.add_argument('--writers', type=int, help="Background threads that compress and write the images while the next ones are drawn. 0 writes them in the main loop.", default=2)
+    parser.add_argument('--skip-previews', help="Don't make the small WebP thumbnail/preview copies of each frame at the end of the run.", action='store_true')
+    parser.add_argument('--raster', help="Draw shaded map fields as images instead of filled contours. Looks nearly the same and renders several times faster.", action='store_true')
+    parser.add_argument('--queue', type=str, help="Shared work queue folder. The run's tasks are put there and split between this process and any hosts running 'python workqueue.py work (queue)'. The wrfout and output folder have to be on a filesystem every host sees.", default=None)
+    parser.add_argument('--no-work', help="With --queue, only hand out the tasks and wait for the other hosts to finish them.", action='store_true')
+    parser.add_argument('--chunk-hours', type=int, help="Split each map product into tasks of this many timesteps, so several workers can share a product. Defaults to one task per product.", default=None)
+    parser.add_argument('--processes', type=int, help="Processes to make the products with on this machine. 0 picks the count from the task history (see costmodel.py) and the free memory.", default=1)
+    parser.add_argument('--deadline', type=float, help="Minutes from the start of the run. Tasks that haven't started by then are skipped, except priority 0 ones (see PRIORITIES).", default=None)
+    parser.add_argument('--float32', help="Compute the map fields in float32 instead of wrf-python's float64. Upper level fields (and the levels k_index, total_totals and the level barbs use) are interpolated from the wrfout's raw float32 fields a model level at a time instead of from full 3D diagnostics, which is most of a level product's peak memory; the maps look nearly the same.", action='store_true')
+    parser.add_argument('--memory-budget', type=float, help="MB of memory each process may use. A task that the task history says needs more memory than is free waits for it (while other processes here are busy) instead of running the machine out of memory, and --processes 0 fits the process count to it.", default=None)
+    parser.add_argument('--frame-timeout', type=float, help="Seconds a single frame (one hour of a product, or one station) may take before it's stopped and counts as failed. 0 for no limit. Uses SIGALRM, so it has no effect on Windows or when ugawrf runs outside the main thread (e.g. called from a thread of another program) - a warning is printed once then.", default=600)
+    parser.add_argument('--frame-retries', type=int, help="Times a failed frame is tried again before it's recorded in metadata.json's failures and the product goes on with its next frame.", default=1)
+    parser.add_argument('--metrics-file', type=str, help="Keep live progress metrics (tasks done and left, frames per minute, cache hits, memory, ETA) in this file in the prometheus text format, e.g. for node_exporter's textfile collector. See runmetrics.py.", default=None)
+    parser.add_argument('--metrics-port', type=int, help="Serve the same metrics at http://localhost:(port)/metrics while the run goes.", default=None)
+    return parser.parse_args(argv)
 
 # use run flags, arg3 to specify if you want to disable a certain product or not. This is useful for debugging/concurrent running.
 # 1 - textgen
@@ -41,72 +49,31 @@ except:
 # 3 - special (one off plots or plots with special code requirements like 4-panel cloud cover or 24-hour change)
 # 4 - meteogram
 # 5 - skewt
-# 6 - modelstats (reports hourly outputs at specified airports into a CSV file for easy verification testing)
+# 6 - modelstats (reports hourly outputs at specified airports into a run-level CSV, plus one CSV per airport, for easy verification testing)
 # ex: python.exe ugawrf.py "D:\ugawrf_fork\ugawrf\wrfout_d01_2025-03-13_21_00_00" default "245"
 # this will run all modules except for meteogram and skewt
-run_flags = args.run_flags
-
-
 # processing modules - located in the same folder as (module).py
-modules_enabled = []
-if "1" not in run_flags:
-    import textgen
-    modules_enabled.append("textgen")
-if "2" not in run_flags:
-    import weathermaps
-    modules_enabled.append("weathermaps")
-if "3" not in run_flags:
-    import special
-    modules_enabled.append("special")
-if "4" not in run_flags:
-    import meteogram
-    modules_enabled.append("meteogram")
-if "5" not in run_flags:
-    import skewt
-    modules_enabled.append("skewt")
-if "6" not in run_flags:
-    import modelstats
-    modules_enabled.append("modelstats")
+MODULE_FLAGS = {"1": "textgen", "2": "weathermaps", "3": "special", "4": "meteogram", "5": "skewt", "6": "modelstats"}
 
-print("UGA-WRF Data Processing Program")
-print(f'Modules: {modules_enabled}')
-start_time = dt.datetime.now()
+def enabled_modules(run_flags):
+    return [module for flag, module in MODULE_FLAGS.items() if flag not in run_flags]
 
 # --- START CONFIG --- #
 
 # whenever you add a new product, it will automatically make a new folder at BASE_OUTPUT/(runname)/(product).
-# whenever you add a new airport, it will automatically make new folders at BASE_OUTPUT/(runname)/skewt/(airport) and BASE_OUTPUT/(runname)/text/(airport).
+# whenever you add a new airport (stations.py), it will automatically make new folders at BASE_OUTPUT/(runname)/skewt/(airport) and BASE_OUTPUT/(runname)/text/(airport).
+# files that are ours but not the site's (verification history, task history) go in DATA_FOLDER, outside the web root
+DATA_FOLDER = Path(__file__).resolve().parent.parent / "data"
 # BASE_OUTPUT is whatever you pass in arg2. If you pass nothing, it defaults to (parent folder)/site/runs
 # you should not have to manually add new folders.
-high_prio_airports ={
-    "ahn": (33.95167820706025, -83.32489875559355),
-    "cni": (34.30887599509864, -84.4273590802223),
-    "ffc": (33.358755552804176, -84.5711101702346),
-    "mcn": (32.70076950826015, -83.64790511895201),
-    "csg": (32.51571975545047, -84.9392150850212),
-    "bmx": (33.17895986702925, -86.7823825539515),
-    "gsp": (34.883261598428625, -82.22035185765819),
-    "hun": (34.72526357496368, -86.64485933237611),
-    "tae": (30.394458005924445, -84.3398597480267),
-    "sav": (32.128213416567114, -81.19987457392587),
-    "ags": (33.369475015594105, -81.96517834789427),
-} # locations to plot numbers on map, text products, meteograms. meant for airports, you could put any location in domain here
-# !!! IMPORTANT !!! our current skewt plot function is considerably intensive, taking about ~50 seconds per airport to finish (on my hardware).
-# this will scale up quick, so try not to add too many airports to this one right now
-other_airports = {
-    "atl": (33.6391621022899, -84.43061412634862),
-    "rmg": (34.35267229676656, -85.16328449820841),
-    "aby": (31.53370678927006, -84.18738548637639),
-    "vdi": (32.19211787190395, -82.36896971377632),
-    "avl": (35.437208530161925, -82.53944681688363),
-    "jax": (30.492570769985885, -81.68571176177561),
-    "gvl": (34.2736228317857, -83.83156673325958),
-    "cha": (35.037647142434366, -85.20214251419357)
-} # same as above minus generating a skewt (time saving) - more ok to plot many here
-# format is "folder_name": (lat, lon)
-
-#extents = {"ga": [-86.2, -80.46, 35.33, 30.49]}
-#^^^ temporarily disabling this due to our new small domain. will rewrite to handle empty extents later
+# airports (high_prio_airports, other_airports) live in stations.py so other tools can use the same list without running this script
+
+extents = {
+    "ngeorgia": [-85.61, -82.93, 35.0, 33.55],
+    "atlanta": [-84.8, -83.95, 34.15, 33.4],
+} # regional crops of each map product, saved next to the full map as hour_(fhour)_(region).png
+# format is "region_name": [west, east, north, south]. these are cut from the same figure as the full map, so each one only costs a savefig.
+# regions that don't overlap the model domain are skipped
 
 PRODUCTS = {
     "helicity": "UP_HELI_MAX",
@@ -175,55 +142,270 @@ PRODUCTS = {
 # format is "folder_name": "variable_name"
 # if you're plotting upper air, appending _(level)mb to the end of your folder name interps your pressure level to (level)
 
+PRIORITIES = {
+    "text": 0,
+    "temperature": 0,
+    "comp_reflectivity": 0,
+    "ptype": 0,
+    "skewt": 2,
+} # the order products are made in: 0 first, then 1, 2...
+# products not listed here are 1, or 2 for upper level (_(level)mb) products. hours past EARLY_HOURS go one later than
+# the same product's early hours, so the first day of what the site shows first is out before anything else.
+# with --deadline, priority 0 work is never skipped
+EARLY_HOURS = 24
+PUBLISH_INTERVAL = 15 # seconds between catalog updates while a product is being made, so finished hours show up on the site
+CYCLE_WINDOW = 6 * 60 # minutes a run has before the next cycle's wrfout arrives. we warn if the task history says a run will take longer
+
 # --- END CONFIG --- #
-airports = {**high_prio_airports, **other_airports}
-
-wrf_file = Dataset(WRF_FILE)
-run_time = str(wrf_file.START_DATE).replace(":", "_")
-init_dt = dt.datetime.strptime(str(wrf_file.START_DATE), "%Y-%m-%d_%H:%M:%S")
-init_str = init_dt.strftime("%Y-%m-%d %H:%M UTC")
-domain = os.path.basename(WRF_FILE).split("_")[1]
-file_path = (run_time, domain)
-
-print(f"wrfout: {WRF_FILE}")
-print(f'image output: {BASE_OUTPUT}/{domain}')
-print(f"let's go! processing data for run {run_time}")
-
-#Added "[]" around the wrf_file since this newer version of netCDF packages
-#it treats individual wrf files are multiple iterables causing an error so here we simply
-# and explicitly states there is one file
-times = extract_times([wrf_file], timeidx=None)
-def convert_time(nc_time):
-    return np.datetime64(nc_time).astype('datetime64[s]').astype(dt.datetime)
-forecast_times = [convert_time(t) for t in times]
-hours = len(times)
-fhour = int(round((forecast_times[-1] - init_dt).total_seconds() / 3600))
-
-run_metadata = {
-    "init_time": str(init_str),
-    "step_time": str(forecast_times[0]),
-    "domain": domain,
-    "forecast_hours": (fhour if args.partial else hours),
-    "products": list(PRODUCTS.keys()),
-    "in_progress": (True if args.partial else False),
-    "generation_time": str(dt.datetime.now())
-}
-json_output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1], "metadata.json")
-os.makedirs(os.path.dirname(json_output_path), exist_ok=True)
-with open(json_output_path, "w") as json_file:
-    json.dump(run_metadata, json_file, indent=4)
-print(f"Metadata JSON saved: {json_output_path}")
-
-# processing starts here
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(args)
+    process_run(args)
+
+def run_options(args):
+    # everything a worker needs besides the wrfout and output folder - plain values, so it can go in the work queue
+    return {
+        "partial": args.partial,
+        "all": args.all,
+        "raster": args.raster,
+        "stats_db": args.stats_db,
+        "stats_parquet": args.stats_parquet,
+        "regions": extents,
+        "float32": args.float32,
+        "memory_budget": args.memory_budget,
+        "frame_timeout": args.frame_timeout,
+        "frame_retries": args.frame_retries,
+    }
+
+def open_run(wrf_path, output_folder, options):
+    # the opened wrfout plus everything derived from it that the tasks share
+    from netCDF4 import Dataset
+    import pointdata
+    if output_folder == None:
+        output_folder = Path(__file__).resolve().parent.parent / "site" / "runs"
+    wrf_file = Dataset(wrf_path)
+    run_time = str(wrf_file.START_DATE).replace(":", "_")
+    init_dt = dt.datetime.strptime(str(wrf_file.START_DATE), "%Y-%m-%d_%H:%M:%S")
+    domain = os.path.basename(wrf_path).split("_")[1]
+    # station grid indices are kept between runs, so the text/modelstats/meteogram paths don't need wrf-python
+    pointdata.INDEX_CACHE_FILE = os.path.join(output_folder, "station_indices.json")
+    # valid times read with netCDF4 directly (no wrf-python needed)
+    forecast_times = pointdata.read_times(wrf_file)
+    return {
+        "wrf_path": wrf_path,
+        "wrf_file": wrf_file,
+        "base_output": output_folder,
+        "run_path": os.path.join(output_folder, run_time, domain),
+        "file_path": (run_time, domain),
+        "init_dt": init_dt,
+        "init_str": init_dt.strftime("%Y-%m-%d %H:%M UTC"),
+        "forecast_times": forecast_times,
+        "hours": len(forecast_times),
+        "stats_db": options["stats_db"] if options["stats_db"] else os.path.join(DATA_FOLDER, "verification.sqlite"),
+        "options": options,
+    }
+
+def build_tasks(run, modules_enabled, chunk_hours=None):
+    # the run split into independent tasks: {"id", "module", "products" (catalog entries it fills), "frames" (images, or
+    # stations for the point products - what its cost scales with), ...}.
+    # map products are split into chunks of chunk_hours timesteps if given, so several workers can share one product
+    partial = run["options"]["partial"]
+    hour_chunks = [list(range(start, min(start + (chunk_hours or run["hours"]), run["hours"]))) for start in range(0, run["hours"], chunk_hours or run["hours"])]
+    tasks = []
+    if "textgen" in modules_enabled and not partial:
+        tasks.append({"id": "text", "module": "textgen", "products": ["text"], "frames": len(airports)})
+    elif partial and "textgen" in modules_enabled:
+        print('warning: partial run detected. despite text data not being skipped via run flags, this product requires a full run! skipping!')
+    if "weathermaps" in modules_enabled:
+        for product, variable in PRODUCTS.items():
+            level = None
+            if "_" in product and "mb" in product:
+                level = int(product.split("_")[-1].replace("mb", ""))
+            for hours in hour_chunks:
+                tasks.append({"id": f"{product}.{hours[0]}-{hours[-1]}", "module": "weathermaps", "products": [product], "product": product, "variable": variable, "level": level, "hours": hours, "frames": len(hours)})
+    if "special" in modules_enabled:
+        for product in ["4panel_cloudcover", "4panel_ptype"]:
+            for hours in hour_chunks:
+                tasks.append({"id": f"{product}.{hours[0]}-{hours[-1]}", "module": "special", "products": [product], "product": product, "hours": hours, "frames": len(hours)})
+    if ("meteogram" in modules_enabled) and not partial:
+        tasks.append({"id": "meteogram", "module": "meteogram", "products": ["meteogram"], "frames": len(airports)})
+    elif partial and "meteogram" in modules_enabled:
+        print('warning: partial run detected. despite meteograms not being skipped via run flags, this product requires a full run! skipping!')
+    if "skewt" in modules_enabled:
+        # every station's sounding for an hour comes from one read of that hour's columns, so skew-Ts are split by
+        # hours like the maps rather than by station
+        for hours in hour_chunks:
+            tasks.append({"id": f"skewt.{hours[0]}-{hours[-1]}", "module": "skewt", "products": ["skewt"], "product": "skewt", "hours": hours, "frames": len(hours) * len(high_prio_airports)})
+    if "modelstats" in modules_enabled and not partial:
+        tasks.append({"id": "modelstats", "module": "modelstats", "products": ["modelstats"], "frames": len(airports)})
+    elif "modelstats" in modules_enabled and partial:
+        print('warning: partial run detected. despite modelstats not being skipped via run flags, this product requires a full run. skipping!')
+    return tasks
+
+def schedule_tasks(run, tasks, deadline=None, model=None):
+    # puts the tasks in PRIORITIES order and numbers them with "rank". tasks spanning EARLY_HOURS are split there first,
+    # so the early hours can go ahead of everything later. within a priority the longest tasks go first if there's a
+    # cost model (see costmodel.py) so no long task is left running alone at the end, otherwise build order is kept.
+    # deadline is a unix time
+    import costmodel
+    scheduled = []
+    for order, task in enumerate(tasks):
+        for part in split_early_hours(run, task):
+            product = part["products"][0]
+            part["priority"] = PRIORITIES.get(product, 2 if part.get("level") else 1)
+            if "hours" in part and forecast_hour(run, part["hours"][0]) >= EARLY_HOURS:
+                part["priority"] += 1
+            if deadline is not None:
+                part["deadline"] = deadline
+            seconds, peak_mb = costmodel.estimate(model, part) if model else (None, None)
+            if seconds:
+                part["estimated_seconds"] = seconds
+            if peak_mb:
+                part["estimated_peak_mb"] = peak_mb
+            scheduled.append(((part["priority"], -(seconds or 0), order), part))
+    scheduled.sort(key=lambda item: item[0])
+    for rank, (key, task) in enumerate(scheduled):
+        task["rank"] = rank
+    return [task for key, task in scheduled]
+
+def split_early_hours(run, task):
+    if "hours" not in task:
+        return [task]
+    early = [t for t in task["hours"] if forecast_hour(run, t) < EARLY_HOURS]
+    late = [t for t in task["hours"] if forecast_hour(run, t) >= EARLY_HOURS]
+    if not early or not late:
+        return [task]
+    return [dict(task, id=f"{task['product']}.{hours[0]}-{hours[-1]}", hours=hours, frames=len(hours)) for hours in (early, late)]
+
+def forecast_hour(run, timestep):
+    return int(round((run["forecast_times"][timestep] - run["init_dt"]).total_seconds() / 3600))
+
+def publish(run, products, force=False):
+    # lists the frames that are on disk so far in the site's catalog - at most every PUBLISH_INTERVAL seconds per
+    # product while a task is going, and always (force) when it's done
+    import framewriter
+    import catalog
+    import runmetrics
+    now = dt.datetime.now()
+    published = run.setdefault("published", {})
+    due = [product for product in products if force or product not in published or (now - published[product]).total_seconds() >= PUBLISH_INTERVAL]
+    runmetrics.refresh()
+    if not due:
+        return
+    run["failed_frames"] = run.get("failed_frames", 0) + framewriter.flush()
+    for product in due:
+        try:
+            catalog.update_product(run["base_output"], run["file_path"][0], run["file_path"][1], product, run.get("metadata"))
+        except Exception as e:
+            print(f"error updating catalog for {product}: {e}!")
+        published[product] = now
+
+def run_task(run, task):
+    # runs one task, waits for its images to be on disk and lists its products in the site's catalog.
+    # returns {"seconds", "status", "failed_frames", "peak_mb", "start_time", "caches" (see runmetrics.take_cache_counts),
+    # "failures" (frames that failed, see run_frame)}. a task with any failed frame is an error
+    import costmodel
+    import runmetrics
+    started = dt.datetime.now()
+    if task.get("deadline") and task.get("priority", 0) > 0 and started.timestamp() > task["deadline"]:
+        print(f"-> skipping {task['id']}, it didn't start before the deadline")
+        result = {"seconds": 0, "status": "skipped", "failed_frames": 0, "start_time": str(started)}
+        runmetrics.task_finished(task["id"], result)
+        return result
+    if run["options"].get("memory_budget"):
+        costmodel.wait_for_memory(task, run["options"]["memory_budget"], run.get("others_running"))
+    runmetrics.task_started(task["id"])
+    status = "done"
+    run["failed_frames"] = 0
+    run["failures"] = []
+    costmodel.reset_peak_memory()
+    try:
+        TASK_RUNNERS[task["module"]](run, task)
+    except Exception as e:
+        print(f"error processing {task['id']}: {e}!")
+        status = "error"
+        run["failures"].append({"task": task["id"], "frame": None, "attempts": 1, "error": f"{type(e).__name__}: {e}"})
+    if run["failures"]:
+        status = "error"
+    publish(run, task["products"], force=True)
+    result = {"seconds": round((dt.datetime.now() - started).total_seconds(), 2), "status": status, "failed_frames": run["failed_frames"], "peak_mb": costmodel.peak_memory_mb(), "start_time": str(started), "caches": runmetrics.take_cache_counts(), "failures": run["failures"]}
+    runmetrics.task_finished(task["id"], result)
+    return result
+
+class FrameTimeout(Exception):
+    pass
+
+def run_frame(run, task, frame, draw):
+    # makes one frame of a task (an hour of a product, or a station) on its own: if draw raises or takes longer than
+    # --frame-timeout seconds it's tried again up to --frame-retries times, then recorded in run["failures"] and the
+    # task goes on with its next frame. one bad hour costs that frame, not the rest of the product. returns whether it was made
+    options = run["options"]
+    attempts = options.get("frame_retries", 1) + 1
+    for attempt in range(1, attempts + 1):
+        frame_time = dt.datetime.now()
+        figures = open_figures()
+        try:
+            with frame_timeout(options.get("frame_timeout")):
+                draw()
+            return True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"error processing {task['id']} frame {frame} (attempt {attempt} of {attempts}): {e}!")
+            discard_frame(figures)
+    run["failures"].append({"task": task["id"], "frame": frame, "attempts": attempts, "error": error, "seconds": round((dt.datetime.now() - frame_time).total_seconds(), 2)})
+    return False
+
+def open_figures():
+    import sys
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return set(pyplot.get_fignums()) if pyplot else set()
+
+def discard_frame(figures):
+    # a frame that raised (or was stopped by the timeout) can leave its figure half drawn. the cached map figure is
+    # dropped and any figure the frame opened is closed, so the retry and the next frames start from clean ones
+    import sys
+    if "weathermaps" in sys.modules:
+        sys.modules["weathermaps"].close_render_context()
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot:
+        for number in set(pyplot.get_fignums()) - figures:
+            pyplot.close(number)
+
+_frame_timeout = {"warned": False}
+@contextlib.contextmanager
+def frame_timeout(seconds):
+    # raises FrameTimeout in the frame once it's run for seconds. it's a SIGALRM, so it only works in the main thread on
+    # unix (elsewhere frames have no time limit, which is said once), and a frame stuck inside C code is stopped once
+    # that call returns
+    if not seconds:
+        yield
+        return
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        if not _frame_timeout["warned"]:
+            print(f"warning: --frame-timeout needs SIGALRM in the main thread, frames {'here' if hasattr(signal, 'setitimer') else 'on this platform'} have no time limit!")
+            _frame_timeout["warned"] = True
+        yield
+        return
+    def expired(signum, stack):
+        raise FrameTimeout(f"took longer than {seconds:g}s")
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
 # text data
-if "textgen" in modules_enabled and not args.partial:
+def run_text(run, task):
+    import textgen
     text_start_time = dt.datetime.now()
-    for airport, coords in airports.items():
+    texts = textgen.get_text_data_all(run["wrf_file"], airports, run["hours"], run["forecast_times"], run["file_path"])
+    for airport, text_data in texts.items():
         try:
             text_time = dt.datetime.now()
-            text_data = textgen.get_text_data(wrf_file, airport, coords, hours, forecast_times, file_path)
-            output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1], "text", airport)
+            output_path = os.path.join(run["run_path"], "text", airport)
             os.makedirs(output_path, exist_ok=True)
             with open(os.path.join(output_path, "forecast.txt"), 'w') as f:
                 for line in text_data:
@@ -232,97 +414,220 @@ if "textgen" in modules_enabled and not args.partial:
         except Exception as e:
             print(f"error processing {airport} text: {e}!")
     print(f'texts processed successfuly - took {dt.datetime.now() - text_start_time}')
-elif args.partial and "textgen" in modules_enabled:
-    print('warning: partial run detected. despite text data not being skipped via run flags, this product requires a full run! skipping!')
 
 # weathermaps
-if "weathermaps" in modules_enabled:
-    map_time = dt.datetime.now()
-    for product, variable in PRODUCTS.items():
-        try:
-            times_elapsed = []
-            product_time = dt.datetime.now()
-            output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1], product)
-            level = None
-            if "_" in product and "mb" in product:
-                level = int(product.split("_")[-1].replace("mb", ""))
-            for t in range(hours):
-                t_time = dt.datetime.now()
-                weathermaps.plot_variable(product, variable, t, output_path, forecast_times, airports, None, None, file_path, init_dt, init_str, wrf_file, level, args.partial, args.all)
-                #for loc, extent in extents.items():
-                    #weathermaps.plot_variable(product, variable, t, output_path, forecast_times, airports, loc, extent, file_path, wrf_file, level, args.partial, args.all)
-                times_elapsed.append(dt.datetime.now() - t_time)
-            avg_time = sum(times_elapsed, dt.timedelta()) / len(times_elapsed)
-            print(f"processed {product} in {dt.datetime.now() - product_time} - avg time per timestep: {avg_time}")
-        except Exception as e:
-            print(f"error processing {product}: {e}! last timestep: {t}")
-    print(f"graphics processed successfully - took {dt.datetime.now() - map_time}")
+def run_weathermaps(run, task):
+    import weathermaps
+    product = task["product"]
+    options = run["options"]
+    times_elapsed = []
+    product_time = dt.datetime.now()
+    output_path = os.path.join(run["run_path"], product)
+    # the 1 hour change products keep each hour's field here for the next hour (see weathermaps.hourly_change)
+    window = {}
+    for t in task["hours"]:
+        t_time = dt.datetime.now()
+        draw = lambda: weathermaps.plot_variable(product, task["variable"], t, output_path, run["forecast_times"], airports, None, None, run["file_path"], run["init_dt"], run["init_str"], run["wrf_file"], task["level"], options["partial"], options["all"], raster=options["raster"], regions=options["regions"], float32=options.get("float32", False), window=window)
+        if run_frame(run, task, t, draw):
+            times_elapsed.append(dt.datetime.now() - t_time)
+        publish(run, task["products"])
+    if times_elapsed:
+        avg_time = sum(times_elapsed, dt.timedelta()) / len(times_elapsed)
+        print(f"processed {product} in {dt.datetime.now() - product_time} - avg time per timestep: {avg_time}")
 
 # special plots
-if "special" in modules_enabled:
+def run_special(run, task):
+    import special
     special_plot_time = dt.datetime.now()
-    try:
-        output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1])
-        if not args.partial:
-            pass
-            #special.hr24_change(os.path.join(output_path, "24hr_change"), airports, hours - 1, forecast_times, file_path[0], init_dt, init_str, wrf_file)
-        elif args.partial:
-            pass
-            #print("warning: partial run detected. 24 hour temp change plot skipped.")
-        for t in range(hours):
-            special.generate_cloud_cover(t, os.path.join(output_path, "4panel_cloudcover"), forecast_times, file_path[0], init_dt, init_str, wrf_file)
-            special.plot_4panel_ptype(t, os.path.join(output_path, "4panel_ptype"), forecast_times, file_path[0], init_dt, init_str, wrf_file)
-        print(f"processed special plots in {dt.datetime.now() - special_plot_time}")
-    except Exception as e:
-        print(f"error processing special plots: {e}!")
-    print(f"special plots processed successfully - took {dt.datetime.now() - special_plot_time}")
+    plot = {"4panel_cloudcover": special.generate_cloud_cover, "4panel_ptype": special.plot_4panel_ptype}[task["product"]]
+    #special.hr24_change(os.path.join(run["run_path"], "24hr_change"), airports, run["hours"] - 1, run["forecast_times"], run["file_path"][0], run["init_dt"], run["init_str"], run["wrf_file"])
+    for t in task["hours"]:
+        run_frame(run, task, t, lambda: plot(t, os.path.join(run["run_path"], task["product"]), run["forecast_times"], run["file_path"][0], run["init_dt"], run["init_str"], run["wrf_file"]))
+        publish(run, task["products"])
+    print(f"processed {task['product']} in {dt.datetime.now() - special_plot_time}")
 
 # meteograms
-if ("meteogram" in modules_enabled) and not args.partial:
+def run_meteogram(run, task):
+    import meteogram
     meteogram_plot_time = dt.datetime.now()
-
-    for airport, coords in airports.items():
-        try:
-            meteogram_time = dt.datetime.now()
-            output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1], "meteogram", airport)
-            meteogram.plot_meteogram(wrf_file, airport, coords, output_path, forecast_times, hours, file_path)
-            print(f"processed {airport} meteogram in {dt.datetime.now() - meteogram_time}")
-        except Exception as e:
-            print(f"error processing {airport} meteogram: {e}!")
+    # one figure and one point extraction for every airport
+    meteogram.plot_meteograms(run["wrf_file"], airports, os.path.join(run["run_path"], "meteogram"), run["forecast_times"], run["hours"], run["file_path"], run_frame=lambda airport, draw: run_frame(run, task, airport, draw))
     print(f"meteograms processed successfully - took {dt.datetime.now() - meteogram_plot_time}")
-elif args.partial and "meteogram" in modules_enabled:
-    print('warning: partial run detected. despite meteograms not being skipped via run flags, this product requires a full run! skipping!')
 
 # upper air plots
-if "skewt" in modules_enabled:
-    skewt_plot_time = dt.datetime.now()
-    for airport, coords in high_prio_airports.items():
-        try:
-            skewt_time = dt.datetime.now()
-            x_y = ll_to_xy(wrf_file, coords[0], coords[1])
-            output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1], "skewt", airport)
-            for t in range(hours):
-                skewt.plot_sounding(wrf_file, x_y, t, airport, output_path, forecast_times, init_dt, init_str, file_path)
-            print(f"processed {airport} skewt in {dt.datetime.now() - skewt_time}")
-        except Exception as e:
-           print(f"error processing {airport} upper air plot: {e}!")  
-    print(f"skewt processed successfully - took {dt.datetime.now() - skewt_plot_time}")
-    
+def run_skewt(run, task):
+    import skewt
+    import pointdata
+    skewt_time = dt.datetime.now()
+    names, xs, ys = pointdata.station_indices(run["wrf_file"], high_prio_airports)
+    for t in task["hours"]:
+        # the columns of every sounding site are read together the first time an hour is needed (see skewt.station_profile)
+        for airport, x_y in zip(names, zip(xs, ys)):
+            output_path = os.path.join(run["run_path"], "skewt", airport)
+            draw = lambda: skewt.plot_sounding(run["wrf_file"], x_y, t, airport, output_path, run["forecast_times"], run["init_dt"], run["init_str"], run["file_path"], profile=skewt.station_profile(run["wrf_file"], high_prio_airports, airport, t))
+            run_frame(run, task, f"{airport} {t}", draw)
+        publish(run, task["products"])
+    print(f"processed skewts for hours {task['hours'][0]}-{task['hours'][-1]} in {dt.datetime.now() - skewt_time}")
+
 # model stats
-if "modelstats" in modules_enabled and not args.partial:
+def run_modelstats(run, task):
+    import modelstats
     modelstats_time = dt.datetime.now()
-    for airport, coords in airports.items():
+    output_path = os.path.join(run["run_path"], "modelstats")
+    os.makedirs(output_path, exist_ok=True)
+    modelstats.generate_run_stats(run["wrf_file"], airports, run["hours"], run["forecast_times"], run["file_path"][0], output_path, run["stats_db"], run["options"]["stats_parquet"])
+    print(f"model stats processed successfully - took {dt.datetime.now() - modelstats_time}")
+
+TASK_RUNNERS = {"textgen": run_text, "weathermaps": run_weathermaps, "special": run_special, "meteogram": run_meteogram, "skewt": run_skewt, "modelstats": run_modelstats}
+
+def finish_tasks():
+    # drops anything a worker keeps between tasks (the cached map figure, accumulation time series and sounding profiles)
+    import sys
+    if "weathermaps" in sys.modules:
+        sys.modules["weathermaps"].close_render_context()
+        sys.modules["weathermaps"].clear_accumulations()
+    if "skewt" in sys.modules:
+        sys.modules["skewt"].clear_profiles()
+
+def process_run(args):
+    import framewriter
+    import catalog
+    import costmodel
+    import runmetrics
+
+    modules_enabled = enabled_modules(args.run_flags)
+    print("UGA-WRF Data Processing Program")
+    print(f'Modules: {modules_enabled}')
+    start_time = dt.datetime.now()
+
+    run = open_run(args.wrf_file, args.output_folder, run_options(args))
+    file_path = run["file_path"]
+    print(f"wrfout: {args.wrf_file}")
+    print(f'image output: {run["base_output"]}/{file_path[1]}')
+    print(f"let's go! processing data for run {file_path[0]}")
+
+    forecast_times = run["forecast_times"]
+    fhour = int(round((forecast_times[-1] - run["init_dt"]).total_seconds() / 3600))
+    run_metadata = {
+        "init_time": str(run["init_str"]),
+        "step_time": str(forecast_times[0]),
+        "domain": file_path[1],
+        "forecast_hours": (fhour if args.partial else run["hours"]),
+        "products": list(PRODUCTS.keys()),
+        "in_progress": True,
+        "generation_time": str(dt.datetime.now())
+    }
+    run["metadata"] = run_metadata
+    json_output_path = os.path.join(run["run_path"], "metadata.json")
+    def write_metadata():
+        # replaced in one step so the site never reads a half-written file
+        os.makedirs(os.path.dirname(json_output_path), exist_ok=True)
+        with open(f"{json_output_path}.tmp", "w") as json_file:
+            json.dump(run_metadata, json_file, indent=4)
+        os.replace(f"{json_output_path}.tmp", json_output_path)
+        print(f"Metadata JSON saved: {json_output_path}")
         try:
-            stats_time = dt.datetime.now()
-            output_path = os.path.join(BASE_OUTPUT, file_path[0], file_path[1], "modelstats")
-            os.makedirs(output_path, exist_ok=True)
-            modelstats.generate_model_stats(wrf_file, airport, coords, hours, forecast_times, file_path[0], output_path)
-            print(f"processed {airport} model stats in {dt.datetime.now() - stats_time}")
+            catalog.update_run(run["base_output"], file_path[0], file_path[1], run_metadata)
         except Exception as e:
-            print(f"error processing {airport} model stats: {e}!")
-    print(f"model stats processed successfully - took {dt.datetime.now() - modelstats_time}")
-elif "modelstats" in modules_enabled and args.partial:
-    print('warning: partial run detected. despite modelstats not being skipped via run flags, this product requires a full run. skipping!')
+            print(f"error updating catalog: {e}!")
+    # the run shows as in progress until every image is on disk, then gets its real status at the end
+    write_metadata()
+
+    # processing starts here. most viewed products (and their first day) first, see PRIORITIES
+    history_path = os.path.join(DATA_FOLDER, costmodel.HISTORY_NAME)
+    model = costmodel.load(history_path, file_path[1])
+    deadline = start_time.timestamp() + args.deadline * 60 if args.deadline else None
+    tasks = schedule_tasks(run, build_tasks(run, modules_enabled, args.chunk_hours), deadline, model)
+    processes = args.processes if args.processes > 0 else costmodel.choose_processes(model, tasks, memory_budget=args.memory_budget)
+    estimated, unknown = costmodel.makespan(model, tasks, processes)
+    print(f"{len(tasks)} tasks on {processes} processes, estimated {dt.timedelta(seconds=round(estimated))}{f' plus {unknown} tasks with no history yet' if unknown else ''}")
+    if estimated > CYCLE_WINDOW * 60:
+        print(f"warning: this run is estimated to take {dt.timedelta(seconds=round(estimated))}, longer than the {CYCLE_WINDOW} minute cycle window! (new products/airports, or fewer processes than usual?)")
+    if args.metrics_file or args.metrics_port:
+        runmetrics.start(run, tasks, processes, model, args.metrics_file, args.metrics_port)
+    try:
+        if args.queue or processes > 1:
+            # other hosts running "python workqueue.py work (queue)" take tasks too; we work on them as well unless --no-work.
+            # more than one process on just this machine goes through a private queue folder the same way
+            import workqueue
+            import tempfile
+            import shutil
+            queue = args.queue or tempfile.mkdtemp(prefix="ugawrf_queue_")
+            results = workqueue.run_distributed(queue, run, tasks, work=not args.no_work, writers=args.writers, helpers=processes - 1)
+            if not args.queue:
+                shutil.rmtree(queue, ignore_errors=True)
+        else:
+            if args.writers > 0:
+                framewriter.start(workers=args.writers, max_pending=4 * args.writers)
+            results = {}
+            for task in tasks:
+                results[task["id"]] = run_task(run, task)
+    finally:
+        # daemon workers (daemon.py) run job after job in the same process, so nothing of this run may stay behind:
+        # the cached figure, accumulations and profiles go, and the wrfout is closed
+        finish_tasks()
+        run["wrf_file"].close()
+        framewriter.stop()
+
+    # every task flushed its images before reporting, so everything is written and synced at this point
+    failed_frames = sum(result.get("failed_frames", 0) for result in results.values())
+    if failed_frames:
+        print(f"warning: {failed_frames} images failed to write!")
+    # the run's manifest of what's missing: every frame that failed after its retries, and why
+    run_metadata["failures"] = [failure for task in tasks for failure in results.get(task["id"], {}).get("failures", [])]
+    if run_metadata["failures"]:
+        failed = [f"{failure['task']} {failure['frame']}" for failure in run_metadata["failures"]]
+        print(f"warning: {len(failed)} frames failed after retries: {', '.join(failed[:10])}{' ...' if len(failed) > 10 else ''}")
+    skipped = [task_id for task_id, result in results.items() if result["status"] == "skipped"]
+    if skipped:
+        print(f"warning: {len(skipped)} tasks missed the {args.deadline} minute deadline and were skipped: {skipped}")
+    run_metadata["timing"] = task_timing(tasks, results, dt.datetime.now() - start_time)
+    peaks = sorted(((product["peak_mb"], name) for name, product in run_metadata["timing"]["products"].items() if product["peak_mb"]), reverse=True)
+    if peaks:
+        print(f"largest peak memory: {', '.join(f'{name} {peak_mb} MB' for peak_mb, name in peaks[:5])}")
+    try:
+        costmodel.record_run(history_path, file_path[0], file_path[1], tasks, results)
+    except Exception as e:
+        print(f"error saving task history: {e}!")
+    if not args.skip_previews:
+        import thumbnails
+        preview_time = dt.datetime.now()
+        try:
+            run_metadata["previews"] = thumbnails.generate_run(run["run_path"])
+            print(f"thumbnails/previews processed successfully - took {dt.datetime.now() - preview_time}")
+        except Exception as e:
+            print(f"error processing thumbnails/previews: {e}!")
+    metrics = runmetrics.finish()
+    if metrics:
+        run_metadata["metrics"] = metrics
+    run_metadata["in_progress"] = True if args.partial else False
+    write_metadata()
+
+    process_time = dt.datetime.now() - start_time
+    print(f"modules {modules_enabled} processed successfully, this is run {file_path} - took {process_time}")
+
+def task_timing(tasks, results, wall_time):
+    # what goes in metadata.json: per-task seconds (and which host ran it), totals per host, and per product the
+    # total seconds and the largest peak memory of any of its tasks
+    hosts, products = {}, {}
+    for task in tasks:
+        result = results.get(task["id"])
+        if not result:
+            continue
+        host = hosts.setdefault(result.get("host", "local"), {"tasks": 0, "seconds": 0})
+        host["tasks"] += 1
+        host["seconds"] = round(host["seconds"] + result["seconds"], 2)
+        product = products.setdefault(task["products"][0], {"seconds": 0, "peak_mb": None})
+        product["seconds"] = round(product["seconds"] + result["seconds"], 2)
+        if result.get("peak_mb") and result["status"] != "skipped":
+            product["peak_mb"] = max(product["peak_mb"] or 0, result["peak_mb"])
+    return {
+        "wall_seconds": round(wall_time.total_seconds(), 2),
+        "task_seconds": round(sum(result["seconds"] for result in results.values()), 2),
+        "tasks": results,
+        "hosts": hosts,
+        "products": products,
+    }
 
-process_time = dt.datetime.now() - start_time
-print(f"modules {modules_enabled} processed successfully, this is run {file_path} - took {process_time}")
+if __name__ == "__main__":
+    main()
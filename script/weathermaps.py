@@ -1,6 +1,6 @@
 # This module plots our maps.
 
-from wrf import getvar, to_np, latlon_coords, smooth2d, ll_to_xy, interplevel
+from wrf import getvar, to_np, latlon_coords, smooth2d, ll_to_xy, interplevel, get_cartopy, cartopy_xlim, cartopy_ylim
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
@@ -8,151 +8,129 @@ import os
 import datetime as dt
 import cartopy.crs as ccrs
 from metpy.plots import ctables, USCOUNTIES
-import metpy.calc as mpcalc
-from metpy.units import units
 import cartopy.feature as cfeature
-from matplotlib import colors
+from matplotlib import colors, ticker, cm
 import numpy as np
+import framewriter
+import runmetrics
+import pointdata
 
-def plot_variable(product, variable, timestep, output_path, forecast_times, airports, loc, extent, run_time, init_dt, init_str, wrf_file, level=None, partial_bool=False, process_all=False):
-    data = getvar(wrf_file, variable, timeidx=timestep)
-    data_copy = data.copy()
+# products only made on full runs (unless --all), and products skipped on partial runs
+FULL_RUN_PRODUCTS = ['temperature', 'apparent_temperature', 'dewp', 'rh', 'wind', 'wind_gust', 'comp_reflectivity', 'total_precip', 'afwarain', 'afwasnow', 'afwafrz', 'visby', 'pressure', 'echo_tops', 'cloudcover', 'mcape', 'mcin', 'k_index', 'total_totals', 'stargazing']
+FULL_RUN_LEVEL_PRODUCTS = ['temp', 'td', 'rh', 'te', 'wind', 'height', 'omega']
+NOT_PARTIAL_PRODUCTS = ['1hr_temp_c', '1hr_dewp_c', '1hr_precip', 'ptype']
+
+def plot_variable(product, variable, timestep, output_path, forecast_times, airports, loc, extent, run_time, init_dt, init_str, wrf_file, level=None, partial_bool=False, process_all=False, raster=False, regions=None, float32=False, window=None):
+    if product in NOT_PARTIAL_PRODUCTS or (product.startswith('1hr_temp_c') and level != None):
+        if partial_bool is True:
+            print(f'-> skipping {product} {timestep} due to partial flag being enabled')
+            return
+    elif product in FULL_RUN_PRODUCTS or (level != None and product.startswith(tuple(FULL_RUN_LEVEL_PRODUCTS))):
+        if not partial_bool and not process_all:
+            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
+            return
+    # 3D fields this frame has read, shared by everything that interpolates them to a level (see level_field)
+    fields = {}
+    # data_copy is a plain numpy array that belongs to this frame, so the unit conversions below happen in place
+    # instead of making a new full grid at every step
     if level:
-        pressure = getvar(wrf_file, "pressure", timeidx=timestep)
-        data_copy = to_np(interplevel(data, pressure, level))
+        data_copy = working_array(level_field(wrf_file, variable, timestep, level, float32, fields), float32, copy=False)
+        # the float32 mode never reads the 3D field, a 2D one carries the lat/lon coordinates instead
+        data = fields[variable] if variable in fields else getvar(wrf_file, "T2", timeidx=timestep)
+    else:
+        data = getvar(wrf_file, variable, timeidx=timestep)
+        data_copy = working_array(data, float32)
     valid_time = forecast_times[timestep]
     f_hour = int(round((valid_time - init_dt).total_seconds() / 3600))
     valid_time_str = valid_time.strftime("%Y-%m-%d %H:%M UTC")
-    fig, ax = plt.subplots(figsize=(12, 10), subplot_kw=dict(projection=ccrs.PlateCarree()))
+    context = get_render_context(product, extent)
+    fig, ax = context["fig"], context["ax"]
     if extent is not None:
-        ax.set_extent(extent, crs=ccrs.PlateCarree())
-    ax.add_feature(USCOUNTIES.with_scale('20m'), alpha=0.05)
+        ax.set_extent(to_map_extent(extent), crs=ccrs.PlateCarree())
+    existing = set(ax.get_children())
     lats, lons = latlon_coords(data)
+    # raster frames are placed on the grid's own projection (see plot_filled)
+    if raster:
+        raster = native_grid(wrf_file)
     if product == 'temperature':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = (data_copy - 273.15) * 9/5 + 32
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='nipy_spectral', levels=np.arange(-10, 110, 5), extend='both')
+        k_to_f(data_copy)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='nipy_spectral', levels=np.arange(-10, 110, 5), extend='both')
         smooth_temp = smooth2d(data_copy, 4)
         ax.contour(to_np(lons), to_np(lats), to_np(smooth_temp), levels=[32], linestyles='dashed')
         plot_title = f"2m Temperature (°F) (32°F Dashed) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Temp (°F)"
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == '1hr_temp_c':
-        if partial_bool is True:
-            print(f'-> skipping {product} {timestep} due to partial flag being enabled')
-            plt.close(fig)
-            return
-        if timestep > 0:
-            temp_now = getvar(wrf_file, "T2", timeidx=timestep)
-            temp_prev = getvar(wrf_file, "T2", timeidx=timestep - 1)
-            temp_change_1hr = (temp_now - temp_prev) * 9/5
-            data_copy = temp_change_1hr.copy()
-        else:
+        data_copy = hourly_change(window, timestep, data_copy, lambda: working_array(getvar(wrf_file, "T2", timeidx=timestep - 1), float32))
+        data_copy *= 9/5
+        if timestep == 0:
             ax.annotate("This product starts on hour 1.", xy=(0.5, 0.5), xycoords='figure fraction', fontsize=8, color='black', ha='right', va='bottom', bbox=dict(facecolor='white', alpha=0.9, edgecolor='none'))
-            temp_change_1hr = data_copy * 0
-            data_copy = data_copy * 0
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(temp_change_1hr), cmap="coolwarm", vmin=-10, vmax=10, extend='both')
+        contour = plot_filled(ax, lons, lats, data_copy, raster=raster, cmap="coolwarm", vmin=-10, vmax=10, extend='both')
         plot_title = f"1 Hour 2m Temp Change (°F) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Temperature Change (°F)'
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == "apparent_temperature":
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = ((data_copy - 273.15) * 9/5 + 32) * units.degF
+        # metpy.calc sets up the whole pint unit registry, so it's only imported for the one product that needs it
+        import metpy.calc as mpcalc
+        from metpy.units import units
+        data_copy = k_to_f(data_copy) * units.degF
         rh = getvar(wrf_file, 'rh2', timeidx=timestep)
         wspdir = getvar(wrf_file, 'wspd_wdir10', timeidx = timestep)
         wsp = wspdir[0]
         apparent_temperature = mpcalc.apparent_temperature(data_copy, rh, wsp)
         data_copy = apparent_temperature
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='nipy_spectral', levels=np.arange(-10, 110, 5), extend='both')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='nipy_spectral', levels=np.arange(-10, 110, 5), extend='both')
         plot_title = f'2m Apparent Temperature (°F) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}'
         label = f'Temperature (°F)'
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == 'dewp':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy * 9/5 + 32
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='BrBG', levels=np.arange(10, 85, 5), extend='both')
+        c_to_f(data_copy)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='BrBG', levels=np.arange(10, 85, 5), extend='both')
         plot_title = f"2m Dewpoint (°F) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Dewpoint (°F)"
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == '1hr_dewp_c':
-        if partial_bool is True:
-            print(f'-> skipping {product} {timestep} due to partial flag being enabled')
-            plt.close(fig)
-            return
-        if timestep > 0:
-            dewp_now = getvar(wrf_file, "td2", timeidx=timestep)
-            dewp_prev = getvar(wrf_file, "td2", timeidx=timestep - 1)
-            dewp_change_1hr = (dewp_now - dewp_prev) * 9/5
-            data_copy = dewp_change_1hr.copy()
-        else:
+        data_copy = hourly_change(window, timestep, data_copy, lambda: working_array(getvar(wrf_file, "td2", timeidx=timestep - 1), float32))
+        data_copy *= 9/5
+        if timestep == 0:
             ax.annotate("This product starts on hour 1.", xy=(0.5, 0.5), xycoords='figure fraction', fontsize=8, color='black', ha='right', va='bottom', bbox=dict(facecolor='white', alpha=0.9, edgecolor='none'))
-            dewp_change_1hr = data_copy * 0
-            data_copy = data_copy * 0
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(dewp_change_1hr), cmap="BrBG", vmin=-20, vmax=20, extend='both')
+        contour = plot_filled(ax, lons, lats, data_copy, raster=raster, cmap="BrBG", vmin=-20, vmax=20, extend='both')
         plot_title = f"1 Hour 2m Dewpoint Change (°F) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Dewpoint Change (°F)'
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == 'rh':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         levels = np.arange(0, 100, 5)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='BrBG', levels=levels, extend="max")
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='BrBG', levels=levels, extend="max")
         plot_title = f"2m Relative Humidity (%) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Relative Humidity (%)"
     elif product == 'wind':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data[0].copy()
-        data_copy = data_copy * 2.23694
+        # wspd_wdir10 is speed and direction - the speed is a view into our copy, no need for another
+        data_copy = data_copy[0]
+        data_copy *= 2.23694
         divnorm = colors.TwoSlopeNorm(vmin=0, vcenter=30, vmax=90)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='YlOrRd', norm=divnorm)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='YlOrRd', norm=divnorm)
         plot_title = f"10m Wind Speed (mph) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = "Wind Speed (mph)"
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
         plot_streamlines(ax, wrf_file, timestep, lons, lats)
     elif product == 'wind_gust':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy * 2.23694
+        data_copy *= 2.23694
         divnorm = colors.TwoSlopeNorm(vmin=0, vcenter=50, vmax=110)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='YlOrRd', norm=divnorm)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='YlOrRd', norm=divnorm)
         plot_title = f"10m Wind Gust (mph) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Wind Max (mph)"
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
         plot_streamlines(ax, wrf_file, timestep, lons, lats)
     elif product == 'comp_reflectivity':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         refl_cmap = ctables.registry.get_colortable('NWSReflectivity')
         data_masked = np.ma.masked_less(data_copy, 2)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_masked), cmap=refl_cmap, levels=np.arange(0, 75, 5), extend='max')
+        contour = plot_filled(ax, lons, lats, to_np(data_masked), raster=raster, cmap=refl_cmap, levels=np.arange(0, 75, 5), extend='max')
         plot_title = f"Composite Reflectivity (dbZ) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Composite Reflectivity (dbZ)"
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == 'total_precip':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy / 25.4
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), 
+        data_copy /= 25.4
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, 
                               colors=['white','lime','lawngreen','green','darkblue','blue','cyan','darkorchid','blueviolet','darkmagenta','maroon','firebrick','orangered','orange','goldenrod','gold','yellow','salmon'],
                               levels=[0.0,0.01,0.1,0.25,0.5,0.75,1,1.25,1.50,1.75,2,2.5,3,4,5,7,10,15,20],
                               extend='max')
@@ -160,62 +138,40 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         label = f"Precipitation (in)"
         ticks = [0.0,0.01,0.1,0.25,0.5,0.75,1,1.25,1.50,1.75,2,2.5,3,4,5,7,10,15,20]
     elif product == 'afwarain':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy / 25.4
-        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap=get_truncated_cmap('Greens', min_val=0.2), levels=np.arange(0, 10, 0.25), extend='max')
+        data_copy /= 25.4
+        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy, copy=False)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap=get_truncated_cmap('Greens', min_val=0.2), levels=np.arange(0, 10, 0.25), extend='max')
         plot_title = f"Total Rainfall (in) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Rainfall (in)"
     elif product == 'afwasnow':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         snow_ratio = 10.0
-        data_copy = (data_copy / 25.4) * snow_ratio
-        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap=get_truncated_cmap('Blues', min_val=0.2), levels=np.arange(0, 15, 0.25), extend='max')
+        data_copy *= snow_ratio / 25.4
+        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy, copy=False)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap=get_truncated_cmap('Blues', min_val=0.2), levels=np.arange(0, 15, 0.25), extend='max')
         plot_title = f"Total Snowfall (in) (10:1 ratio) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Snowfall (in)"
     elif product == 'afwafrz':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy / 25.4
-        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap=get_truncated_cmap('RdPu', min_val=0.2), levels=np.arange(0, 3, 0.1), extend='max')
+        data_copy /= 25.4
+        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy, copy=False)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap=get_truncated_cmap('RdPu', min_val=0.2), levels=np.arange(0, 3, 0.1), extend='max')
         plot_title = f"Total Freezing Rain (in) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Freezing Rain (in)"
     elif product == 'afwaslt':
-        data_copy = data_copy / 25.4
-        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap=get_truncated_cmap('Oranges', min_val=0.2), levels=np.arange(0, 3, 0.1), extend='max')
+        data_copy /= 25.4
+        data_copy = np.ma.masked_where(data_copy <= 0.01, data_copy, copy=False)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap=get_truncated_cmap('Oranges', min_val=0.2), levels=np.arange(0, 3, 0.1), extend='max')
         plot_title = f"Total Ice Pellets (in) (liquid equiv.) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Ice Pellets (in)"
     elif product == 'visby':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         data_copy = data_copy
         afwa_vis = getvar(wrf_file, 'AFWA_VIS', timeidx=timestep)
-        contour = ax.contourf(to_np(lons), to_np(lats), afwa_vis, levels=np.arange(0,10,0.1), cmap="Greys", transform=ccrs.PlateCarree())
+        contour = plot_filled(ax, lons, lats, afwa_vis, raster=raster, levels=np.arange(0,10,0.1), cmap="Greys", transform=ccrs.PlateCarree())
         plot_title = f"Total Visibility (mi){f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Visibility (mi)"
     elif product == '1hr_precip':
-        if partial_bool is True:
-            print(f'-> skipping {product} {timestep} due to partial flag being enabled')
-            plt.close(fig)
-            return
-        rain_now = getvar(wrf_file, "AFWA_TOTPRECIP", timeidx=timestep)
-        rain_prev = getvar(wrf_file, "AFWA_TOTPRECIP", timeidx=timestep - 1) if timestep > 0 else rain_now * 0
-        precip_1hr = (rain_now - rain_prev) / 25.4
-        data_copy = precip_1hr.copy()
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(precip_1hr), 
+        precip_1hr = accumulation(wrf_file, "AFWA_TOTPRECIP")["hourly"][timestep] / 25.4
+        data_copy = precip_1hr
+        contour = plot_filled(ax, lons, lats, precip_1hr, raster=raster, 
                               colors=['white','palegreen','limegreen','green','yellow','gold','orange','red','firebrick','darkred','magenta','darkviolet','black',],
                               levels=[0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0, 4.0],
                               extend='max')
@@ -223,24 +179,16 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         label = f'1 Hour Rainfall (in)'
         ticks = [0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5, 3.0, 4.0]
     elif product == 'pressure':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy / 100
+        data_copy /= 100
         divnorm = colors.TwoSlopeNorm(vmin=970, vcenter=1013, vmax=1050)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='bwr_r', norm=divnorm, extend='both')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='bwr_r', norm=divnorm, extend='both')
         smooth_slp = smooth2d(data_copy, 8, cenweight=6)
         ax.contour(to_np(lons), to_np(lats), to_np(smooth_slp), colors="black", transform=ccrs.PlateCarree(), levels=np.arange(960, 1060, 4))
         plot_title = f"MSLP (mb) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"MSLP (mb)"
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == 'echo_tops':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data), cmap='cividis_r', vmin=0, vmax=50000, extend='max')
+        contour = plot_filled(ax, lons, lats, to_np(data), raster=raster, cmap='cividis_r', vmin=0, vmax=50000, extend='max')
         plot_title = f"Echo Tops (m) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"Echo Tops (m)"
     elif product == 'helicity':
@@ -251,94 +199,61 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         reflectivity = getvar(wrf_file, "REFD_COM", timeidx=timestep)
         reflectivity_masked = np.ma.masked_less(reflectivity, 2)
         refl_cmap = ctables.registry.get_colortable("NWSReflectivity")
-        ax.contourf(to_np(lons), to_np(lats), to_np(reflectivity_masked), cmap=refl_cmap, levels=np.arange(0, 75, 5), alpha=0.3)
-        contour = ax.contourf(to_np(lons), to_np(lats), helicity_sum, levels=[50, 100, 200, 300, 400, 500], colors=['green', 'cyan', 'blue', 'purple', 'red', 'black'], alpha=0.7)
+        plot_filled(ax, lons, lats, to_np(reflectivity_masked), raster=raster, cmap=refl_cmap, levels=np.arange(0, 75, 5), alpha=0.3)
+        contour = plot_filled(ax, lons, lats, helicity_sum, raster=raster, levels=[50, 100, 200, 300, 400, 500], colors=['green', 'cyan', 'blue', 'purple', 'red', 'black'], alpha=0.7)
         ax.contour(to_np(lons), to_np(lats), helicity_sum, levels=[50, 100, 200, 300, 400, 500], colors=['green', 'cyan', 'blue', 'purple', 'red', 'black'], linestyles='dashed')
         plot_title = f"Helicity Tracks (m^2/s^2) + Comp. Reflectivity (dbZ, transparent) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Helicity m^2/s^2'
         plot_wind_barbs(ax, wrf_file, timestep, lons, lats)
     elif product == 'cloudcover':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        low_cloud_frac = to_np(data_copy[0]) * 100 
-        mid_cloud_frac = to_np(data_copy[1]) * 100
-        high_cloud_frac = to_np(data_copy[2]) * 100
-        total_cloud_frac = low_cloud_frac + mid_cloud_frac + high_cloud_frac
+        total_cloud_frac = data_copy[0] + data_copy[1]
+        total_cloud_frac += data_copy[2]
+        total_cloud_frac *= 100
         data_copy = total_cloud_frac
         contour = ax.pcolormesh(to_np(lons), to_np(lats), total_cloud_frac, cmap="Blues_r", norm=plt.Normalize(0, 100), transform=ccrs.PlateCarree())
         plot_title = f"Cloud Cover - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Cloud Fraction (%)'
     elif product == 'mcape':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data[0].copy()
+        data_copy = data_copy[0]
         label = f'CAPE (J/kg)'
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='magma_r', vmin=0, vmax=6000)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='magma_r', vmin=0, vmax=6000)
         plot_title = f"Max CAPE (MU 500m Parcel) (J/kg) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
     elif product == 'mcin':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data[1].copy()
+        data_copy = data_copy[1]
         label = f'CIN (J/kg)'
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='magma_r', vmin=0, vmax=6000)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='magma_r', vmin=0, vmax=6000)
         plot_title = f"Max CIN (MU 500m Parcel) (J/kg) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
     elif product == 'k_index':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        pressure = getvar(wrf_file, "pressure", timeidx=timestep)
-        tc = getvar(wrf_file, "tc", timeidx=timestep)
-        td = getvar(wrf_file, "td", timeidx=timestep)
-        tc_850mb = interplevel(tc, pressure, 850)
-        tc_700mb = interplevel(tc, pressure, 700)
-        tc_500mb = interplevel(tc, pressure, 500)
-        td_850mb = interplevel(td, pressure, 850)
-        td_500mb = interplevel(td, pressure, 500)
+        tc_850mb = level_field(wrf_file, "tc", timestep, 850, float32, fields)
+        tc_700mb = level_field(wrf_file, "tc", timestep, 700, float32, fields)
+        tc_500mb = level_field(wrf_file, "tc", timestep, 500, float32, fields)
+        td_850mb = level_field(wrf_file, "td", timestep, 850, float32, fields)
+        td_500mb = level_field(wrf_file, "td", timestep, 500, float32, fields)
         data_copy = ((tc_850mb)-(tc_500mb))+(td_850mb)-((tc_700mb)-(td_500mb))
         label = f'K Index (°C)'
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='magma_r', levels=np.arange(20,40,1), extend="max")
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='magma_r', levels=np.arange(20,40,1), extend="max")
         plot_title = f"K Index (°C) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
     elif product == 'total_totals':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        pressure = getvar(wrf_file, "pressure", timeidx=timestep)
-        tc = getvar(wrf_file, "tc", timeidx=timestep)
-        td = getvar(wrf_file, "td", timeidx=timestep)
-        tc_850mb = interplevel(tc, pressure, 850)
-        tc_500mb = interplevel(tc, pressure, 500)
-        td_850mb = interplevel(td, pressure, 850)
+        tc_850mb = level_field(wrf_file, "tc", timestep, 850, float32, fields)
+        tc_500mb = level_field(wrf_file, "tc", timestep, 500, float32, fields)
+        td_850mb = level_field(wrf_file, "td", timestep, 850, float32, fields)
         VT = tc_850mb - tc_500mb
         CT = td_850mb - tc_500mb
         data_copy = VT + CT
         label = f'Total Totals (°C)'
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='magma_r', levels=np.arange(45,60,2), extend="max")
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='magma_r', levels=np.arange(45,60,2), extend="max")
         plot_title = f"Total Totals (°C) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
     elif product == 'mslp_850_t_w':
-        tc = getvar(wrf_file, "tc", timeidx=timestep)
-        pressure = getvar(wrf_file, "pressure", timeidx=timestep)
-        tc_850mb = interplevel(tc, pressure, 850)
-        data_copy = data_copy / 100
+        tc_850mb = level_field(wrf_file, "tc", timestep, 850, float32, fields)
+        data_copy /= 100
         smooth_slp = smooth2d(data_copy, 8, cenweight=6)
         slp_contour = ax.contour(to_np(lons), to_np(lats), to_np(smooth_slp), transform=ccrs.PlateCarree(), colors="white", levels=np.arange(960, 1060, 4))
         ax.clabel(slp_contour)
         data_copy = tc_850mb
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='nipy_spectral', levels=np.arange(-20, 40, 2), extend='both')
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, 850)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='nipy_spectral', levels=np.arange(-20, 40, 2), extend='both')
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, 850, float32, fields)
         plot_title = f"850mb Temp (shaded, °C), MSLP (contours, mb), 850mb Winds (barbs, kt) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
     elif product.startswith("temp") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         cmax, cmin = None, None
         contour_freezing = False
         if level == 925:
@@ -353,7 +268,7 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
             cmax, cmin = 20, -50
         elif level == 300:
             cmax, cmin = 0, -70
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='nipy_spectral', levels=np.arange(cmin, cmax, 2), extend='both')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='nipy_spectral', levels=np.arange(cmin, cmax, 2), extend='both')
         if contour_freezing:
             smooth_temp = smooth2d(data_copy, 4)
             ax.contour(to_np(lons), to_np(lats), to_np(smooth_temp), levels=[0], linestyles='dashed')
@@ -361,12 +276,8 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         else:
             plot_title = f"{level}mb Temp (°C) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Temp (°C)'
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level)
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level, float32, fields)
     elif product.startswith("td") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         cmax, cmin = None, None
         if level == 850:
             cmax, cmin = 30, -20
@@ -376,24 +287,16 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
             cmax, cmin = 0, -50
         elif level == 300:
             cmax, cmin = -30, -70
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='BrBG', levels=np.arange(cmin, cmax, 2), extend='both')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='BrBG', levels=np.arange(cmin, cmax, 2), extend='both')
         plot_title = f"{level}mb Dew Point (°C) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Dew Point (°C)'
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level)
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level, float32, fields)
     elif product.startswith("rh") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         levels = np.arange(0, 100, 5)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='BrBG', levels=levels, extend='max')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='BrBG', levels=levels, extend='max')
         plot_title = f"{level}mb Relative Humidity (%) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Relative Humidity (%)'
     elif product.startswith("te") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         if level == 925:
             levels = np.arange(270, 330, 2)
         elif level == 850:
@@ -402,77 +305,52 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
             levels = np.arange(290, 350, 2)
         else:
             levels = np.linspace(np.nanmin(data_copy), np.nanmax(data_copy), 20)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='turbo', levels=levels, extend='both')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='turbo', levels=levels, extend='both')
         plot_title = f"{level}mb Theta E (K) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level)
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level, float32, fields)
         label = f'Theta E (K)'
     elif product.startswith("wind") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        va = interplevel(getvar(wrf_file, "va", timeidx=timestep), pressure, level)
-        ws = np.sqrt(to_np(data_copy)**2 + to_np(va)**2) * 1.944
+        va = level_field(wrf_file, "va", timestep, level, float32, fields)
+        ws = np.hypot(data_copy, to_np(va))
+        ws *= 1.944
         data_copy = ws
         cmax = None
         cmax = 135
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(ws), cmap="plasma", vmax=cmax)
+        contour = plot_filled(ax, lons, lats, to_np(ws), raster=raster, cmap="plasma", vmax=cmax)
         plot_title = f"{level}mb Wind Speed (kt) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Wind Speed (kt)'
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level)
-        plot_streamlines(ax, wrf_file, timestep, lons, lats, level)
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level, float32, fields)
+        plot_streamlines(ax, wrf_file, timestep, lons, lats, level, float32, fields)
     elif product.startswith("height") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         cmax, cmin = None, None
-        data_copy = data_copy / 10
+        data_copy /= 10
         if level == 700:
             cmax, cmin = 350, 250
         elif level == 500:
             cmax, cmin = 600, 500
         smooth_z = smooth2d(data_copy, 40, cenweight=6)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='coolwarm', vmax=cmax, vmin=cmin)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='coolwarm', vmax=cmax, vmin=cmin)
         ax.contour(to_np(lons), to_np(lats), to_np(smooth_z), colors="black", transform=ccrs.PlateCarree(), levels=np.arange(100, 1000, 5))
         plot_title = f"{level}mb Height (dam) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Height (dam)'
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level)
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level, float32, fields)
     elif product.startswith("omega") and level != None:
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
-        data_copy = data_copy / 100
+        data_copy /= 100
         divnorm = colors.TwoSlopeNorm(vmin=-2, vcenter=0, vmax=2)
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='RdBu', norm=divnorm)
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='RdBu', norm=divnorm)
         plot_title = f"{level}mb Omega (mb/s) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"{level}mb Omega (mb/s)"
     elif product.startswith('1hr_temp_c') and level != None:
-        if partial_bool is True:
-            print(f'-> skipping {product} {timestep} due to partial flag being enabled')
-            plt.close(fig)
-            return
-        if timestep > 0:
-            temp_now = getvar(wrf_file, "tc", timeidx=timestep)
-            temp_prev = getvar(wrf_file, "tc", timeidx=timestep - 1)
-            upper_temp_now = interplevel(temp_now, pressure, level)
-            upper_temp_prev = interplevel(temp_prev, pressure, level)
-            temp_change_1hr = (upper_temp_now - upper_temp_prev)
-            data_copy = temp_change_1hr.copy()
-        else:
+        # data_copy is already this hour's tc on the level
+        read_previous = lambda: working_array(level_field(wrf_file, "tc", timestep - 1, level, float32), float32, copy=False)
+        data_copy = hourly_change(window, timestep, data_copy, read_previous)
+        if timestep == 0:
             ax.annotate("This product starts on hour 1.", xy=(0.5, 0.5), xycoords='figure fraction', fontsize=8, color='black', ha='right', va='bottom', bbox=dict(facecolor='white', alpha=0.9, edgecolor='none'))
-            temp_change_1hr = data_copy * 0
-            data_copy = data_copy * 0
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(temp_change_1hr), cmap="coolwarm", vmin=-15, vmax=15)
+        contour = plot_filled(ax, lons, lats, data_copy, raster=raster, cmap="coolwarm", vmin=-15, vmax=15)
         plot_title = f"1-Hour {level}mb Temp Change (°C) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Temperature Change (°C)'
-        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level)
+        plot_wind_barbs(ax, wrf_file, timestep, lons, lats, level, float32, fields)
     elif product == 'stargazing':
-        if not partial_bool and not process_all:
-            print(f'-> skipping {product} {timestep} due to partial flag being disabled')
-            plt.close(fig)
-            return
         #wip
         low_clear_frac = 1.0 - to_np(data_copy[0])
         mid_clear_frac = 1.0 - to_np(data_copy[1])
@@ -481,8 +359,8 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         clear_sky_score = 1.0 - (total_cloud_frac)
         pwat = getvar(wrf_file, "AFWA_PWAT", timeidx=timestep)
         transparency_score = np.clip(1.0 - (to_np(pwat) / 30.0), 0.0, 1.0)
-        u_300 = interplevel(getvar(wrf_file, "ua", timeidx=timestep), getvar(wrf_file, "pressure", timeidx=timestep), 300)
-        v_300 = interplevel(getvar(wrf_file, "va", timeidx=timestep), getvar(wrf_file, "pressure", timeidx=timestep), 300)
+        u_300 = level_field(wrf_file, "ua", timestep, 300, float32, fields)
+        v_300 = level_field(wrf_file, "va", timestep, 300, float32, fields)
         wind_speed_300 = np.sqrt(to_np(u_300)**2 + to_np(v_300)**2)
         seeing_score = np.clip(1.0 - (wind_speed_300 / 70.0), 0.0, 1.0)
         wind_10m = getvar(wrf_file, "wspd_wdir10", timeidx=timestep)[0]
@@ -491,27 +369,14 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         rh2_penalty = np.where(to_np(rh2) > 85.0, 0.7, 1.0)
         index = (clear_sky_score * 75) + (transparency_score * 15) + (seeing_score * 10)
         index = np.clip(index * wind_10m_penalty * rh2_penalty, 0, 100)
-        contour = ax.contourf(to_np(lons), to_np(lats), index, cmap="RdYlGn", levels=np.arange(0, 105, 5), extend='both')
+        contour = plot_filled(ax, lons, lats, index, raster=raster, cmap="RdYlGn", levels=np.arange(0, 105, 5), extend='both')
         data_copy = index
         plot_title = f"Lobdell Stargazing Index (0-100) - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         ax.annotate(f'Index Explanation:\n75% Clear Sky\n15% Atmospheric Transparency\n10% Seeing Conditions\nPenalties for High Sfc. RH and Wind', xy=(0.01, 0.1), xycoords='axes fraction', fontsize=6, color='black', bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'))
         label = f'Index (100=Clear/Dry)'
     elif product == 'ptype':
-        if partial_bool is True:
-            print(f'-> skipping {product} {timestep} due to partial flag being enabled')
-            plt.close(fig)
-            return
-        if timestep > 0:
-            rain = getvar(wrf_file, "AFWA_RAIN", timeidx=timestep) - getvar(wrf_file, "AFWA_RAIN", timeidx=timestep - 1)
-            snow = getvar(wrf_file, "AFWA_SNOW", timeidx=timestep) - getvar(wrf_file, "AFWA_SNOW", timeidx=timestep - 1)
-            ice  = getvar(wrf_file, "AFWA_ICE",  timeidx=timestep) - getvar(wrf_file, "AFWA_ICE",  timeidx=timestep - 1)
-            fzra = getvar(wrf_file, "AFWA_FZRA", timeidx=timestep) - getvar(wrf_file, "AFWA_FZRA", timeidx=timestep - 1)
-        else:
-            rain = getvar(wrf_file, "AFWA_RAIN", timeidx=timestep)
-            snow = getvar(wrf_file, "AFWA_SNOW", timeidx=timestep)
-            ice  = getvar(wrf_file, "AFWA_ICE",  timeidx=timestep)
-            fzra = getvar(wrf_file, "AFWA_FZRA", timeidx=timestep)
-        precip_types = np.array([to_np(snow), to_np(ice), to_np(fzra), to_np(rain)])
+        # this hour's rain/snow/ice/freezing rain (the first hour is everything since the start of the run)
+        precip_types = np.array([accumulation(wrf_file, name)["hourly"][timestep] for name in ["AFWA_SNOW", "AFWA_ICE", "AFWA_FZRA", "AFWA_RAIN"]])
         type_id = np.argmax(precip_types, axis=0)
         total_rate = np.sum(precip_types, axis=0)
         intensity = np.zeros(total_rate.shape, dtype=int)
@@ -526,65 +391,346 @@ def plot_variable(product, variable, timestep, output_path, forecast_times, airp
         mesh = ax.pcolormesh(to_np(lons), to_np(lats), ptype_data, cmap=cmap, norm=norm, transform=ccrs.PlateCarree())
         plot_title = f"Potential Precipitation Type and Intensity - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f'Precipitation Type'
-        cbar = fig.colorbar(mesh, ax=ax, location="right", fraction=0.035, pad=0.02, shrink=0.85, aspect=25, ticks=[0, 1, 2, 3, 4])
+        cbar = draw_colorbar(context, mesh, ticks=[0, 1, 2, 3, 4])
         cbar.ax.set_yticks([0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5, 8.5, 9.5, 10.5, 11.5, 12.5], labels=['None', '--', 'Snow', '+', '--', 'Ice', '+', '--', 'FzRa', '+', '--', 'Rain', '+'])
         ax.annotate(f'P-TYPE IS A WORK IN PROGRESS!\nIntensity Breakpoints (Liquid Eq.):\nHeavy - 7.6mm/hr\nModerate - 2.5mm/hr\nLight - <2.5mm/hr', xy=(0.01, 0.1), xycoords='axes fraction', fontsize=8, color='red', bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'))
     else:
-        contour = ax.contourf(to_np(lons), to_np(lats), to_np(data_copy), cmap='coolwarm')
+        contour = plot_filled(ax, lons, lats, to_np(data_copy), raster=raster, cmap='coolwarm')
         plot_title = f"Unconfigured product: {data.description} - Hour {f_hour}\nValid: {valid_time_str}\nInit: {init_str}"
         label = f"{data.description}"
     if product != ("ptype"):
-        cbar = fig.colorbar(contour, ax=ax, location="right", fraction=0.035, pad=0.02, shrink=0.85, aspect=25)
+        cbar = draw_colorbar(context, contour)
         if product == 'total_precip' or product == '1hr_precip':
             cbar.ax.set_yticks(ticks, labels=ticks)
-    gl = ax.gridlines(crs=ccrs.PlateCarree(), draw_labels=True, linewidth=0.5, color='gray', alpha=0.5, linestyle='--')
-    gl.top_labels = False; gl.right_labels = False
-    ax.coastlines()
-    ax.add_feature(cfeature.BORDERS, linewidth=0.5)
-    ax.add_feature(cfeature.STATES.with_scale('50m'))
-    if product != ("cloudcover") and product != ("ptype"):
-        try:
-            west, east, north, south = extent
-            for airport, (lat, lon) in airports.items():
-                if not (west <= lon <= east and south <= lat <= north):
-                    continue
-                idx_x, idx_y = ll_to_xy(wrf_file, lat, lon)
-                value = to_np(data_copy)[idx_y, idx_x]
-                ax.text(lon, lat, f"{value:.1f}", color='black', fontsize=14, ha='center', va='bottom', bbox=dict(facecolor='white', alpha=0.2, edgecolor='none', boxstyle='round'))
-        except:
-            try:
-                for airport, (lat, lon) in airports.items():
-                    idx_x, idx_y = ll_to_xy(wrf_file, lat, lon)
-                    value = to_np(data_copy)[idx_y, idx_x]
-                    ax.text(lon, lat, f"{value:.1f}", color='black', fontsize=12, ha='center', va='bottom', bbox=dict(facecolor='white', alpha=0.2, edgecolor='none', boxstyle='round'))
-            except:
-                pass
-    if product != ("cloudcover") and product != ("ptype"):
-        maxmin = ""
-        max_value = to_np(data_copy).max()
-        min_value = to_np(data_copy).min()
-        if max_value != 0:
-            maxmin += f"Max: {max_value:.1f}"
-            if min_value != 0:
-                maxmin += f"\nMin: {min_value:.1f}"
-        ax.annotate(maxmin, xy=(0.98, 0.03), xycoords='axes fraction', fontsize=12, color='black', ha='right', va='bottom', bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'))
+    # everything added above belongs to this timestep and comes off again after saving
+    frame_artists = [artist for artist in ax.get_children() if artist not in existing]
+    if not context["static"]:
+        gl = ax.gridlines(crs=ccrs.PlateCarree(), draw_labels=True, linewidth=0.5, color='gray', alpha=0.5, linestyle='--')
+        gl.top_labels = False; gl.right_labels = False
+        # later timesteps add their contour lines/streamlines after the gridlines, so nudge the gridlines up to keep
+        # them drawn on top like they are on the first timestep
+        gl.set_zorder(2.001)
+        ax.coastlines()
+        ax.add_feature(cfeature.BORDERS, linewidth=0.5)
+        ax.add_feature(cfeature.STATES.with_scale('50m'))
+        ax.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='axes fraction', fontsize=8, color='black')
+        context["static"] = True
     ax.set_title(plot_title, fontweight='bold', loc='left')
-    ax.annotate(f"UGA-WRF Run {run_time}", xy=(0.01, 0.01), xycoords='axes fraction', fontsize=8, color='black')
     os.makedirs(output_path, exist_ok=True)
-    if loc is None:
-        fig.savefig(os.path.join(output_path, f"hour_{f_hour}.png"), bbox_inches='tight', dpi=125)
-    else:
-        fig.savefig(os.path.join(output_path, f"hour_{f_hour}_{loc}.png"), bbox_inches='tight', dpi=125)
-    plt.close(fig)
+    # the full view plus any regional crops all come from this one figure - each view only swaps the
+    # extent, the station numbers and the max/min box before its savefig
+    views = [(loc, extent)] + [(region, region_extent) for region, region_extent in (regions or {}).items() if extent_in_domain(region_extent, lons, lats)]
+    for view_loc, view_extent in views:
+        overlays = []
+        if product != ("cloudcover") and product != ("ptype"):
+            overlays += plot_station_values(ax, wrf_file, data_copy, airports, view_extent)
+            maxmin = plot_maxmin(ax, data_copy, lons, lats, view_extent)
+            if maxmin is not None:
+                overlays.append(maxmin)
+        if view_extent is not None:
+            ax.set_extent(to_map_extent(view_extent), crs=ccrs.PlateCarree())
+        if view_loc is None:
+            framewriter.save_figure(fig, os.path.join(output_path, f"hour_{f_hour}.png"), bbox_inches='tight', dpi=125)
+        else:
+            framewriter.save_figure(fig, os.path.join(output_path, f"hour_{f_hour}_{view_loc}.png"), bbox_inches='tight', dpi=125)
+        for artist in overlays:
+            artist.remove()
+    for artist in frame_artists:
+        # contour labels go away with their contour set, so they may already be gone
+        if artist.axes is not None:
+            artist.remove()
+    context["busy"] = False
     print(f'-> {product} hr {f_hour} with {extent}')
 
-def plot_wind_barbs(ax, wrf_file, timestep, lons, lats, pressure_level=None):
+def working_array(data, float32=False, copy=True):
+    # plain numpy values of a wrf-python field (float32 in the low memory mode) that are safe to change in place.
+    # copy=False is for fields that were just computed for this frame anyway, e.g. by interplevel
+    values = to_np(data)
+    dtype = np.float32 if float32 and np.issubdtype(values.dtype, np.floating) else values.dtype
+    if copy:
+        return np.array(values, dtype=dtype, subok=True)
+    return values.astype(dtype, copy=False)
+
+def level_field(wrf_file, variable, timestep, level, float32=False, fields=None):
+    # variable on a pressure level (hPa). fields keeps the 3D getvar fields for the rest of the frame, so the pressure
+    # and e.g. tc behind several levels are only worked out once. in the float32 mode the variables pointdata knows are
+    # interpolated straight from the raw float32 fields a model level at a time (pointdata.interp_level) - the float64 3D
+    # diagnostic and pressure getvar makes are most of a level product's memory. eth and omg still go through getvar
+    if float32 and variable in pointdata.LEVEL_VARIABLES:
+        return pointdata.interp_level(wrf_file, variable, timestep, level)
+    fields = {} if fields is None else fields
+    for name in [variable, "pressure"]:
+        if name not in fields:
+            fields[name] = getvar(wrf_file, name, timeidx=timestep)
+    return interplevel(fields[variable], fields["pressure"], level)
+
+def hourly_change(window, timestep, now, read_previous):
+    # now minus the same field an hour earlier (zeros on the first hour). window is a dict the caller keeps for one
+    # pass through a product's hours: each hour's field is left in it for the next hour, so every field is derived
+    # once instead of twice. read_previous is only called when the last hour isn't there (first hour of a chunk)
+    previous = None
+    if window is not None:
+        previous = window.pop(timestep - 1, None)
+        window.clear()
+        window[timestep] = now
+    if timestep == 0:
+        return np.zeros_like(now)
+    if previous is None:
+        previous = read_previous()
+    return now - previous
+
+def k_to_f(values):
+    # in place, and returns the same array so it can be used inline
+    values *= 9/5
+    values -= 459.67
+    return values
+
+def c_to_f(values):
+    values *= 9/5
+    values += 32
+    return values
+
+_render_context = {}
+def get_render_context(product, extent):
+    # one figure per product, kept across timesteps. the GeoAxes, map layers, gridlines, run label and colorbar axes
+    # are made once; each timestep only adds its own data artists, saves, and takes them back off
+    key = (product, None if extent is None else tuple(extent))
+    if _render_context.get("key") == key and not _render_context["busy"]:
+        # put the map back the way a fresh figure has it before any data goes on: full width (the colorbar takes
+        # its space afterwards), global view, autoscaling on and no data limits left from the last timestep.
+        # streamline arrows are sized off the current view, so anything else shifts the autoscaled full view
+        ax = _render_context["ax"]
+        ax.set_subplotspec(_render_context["subplotspec"])
+        ax.set_global()
+        ax.ignore_existing_data_limits = True
+        ax.set_autoscale_on(True)
+        _render_context["busy"] = True
+        runmetrics.count_cache("render_context", hits=1)
+        return _render_context
+    # new product, or the last timestep errored partway through and left artists behind
+    runmetrics.count_cache("render_context", misses=1)
+    close_render_context()
+    fig, ax = plt.subplots(figsize=(12, 10), subplot_kw=dict(projection=ccrs.PlateCarree()))
+    ax.add_feature(USCOUNTIES.with_scale('20m'), alpha=0.05)
+    _render_context.update({"key": key, "fig": fig, "ax": ax, "cbar": None, "subplotspec": ax.get_subplotspec(), "static": False, "busy": True})
+    return _render_context
+
+def close_render_context():
+    if _render_context:
+        plt.close(_render_context["fig"])
+        _render_context.clear()
+
+def draw_colorbar(context, mappable, **kwargs):
+    # the first timestep makes the colorbar axes next to the map; later ones redraw into that same axes
+    # since contour levels (and so the ticks) can change from hour to hour
+    fig, ax = context["fig"], context["ax"]
+    if context["cbar"] is None:
+        context["cbar"] = fig.colorbar(mappable, ax=ax, location="right", fraction=0.035, pad=0.02, shrink=0.85, aspect=25, **kwargs)
+        context["map_subplotspec"] = ax.get_subplotspec()
+    else:
+        ax.set_subplotspec(context["map_subplotspec"])
+        cax = context["cbar"].ax
+        cax.cla()
+        cax.set_axes_locator(None)
+        context["cbar"] = fig.colorbar(mappable, cax=cax, location="right", **kwargs)
+    return context["cbar"]
+
+def plot_station_values(ax, wrf_file, data, airports, extent=None):
+    # numbers at each airport. for a cropped view only the airports inside it get labeled (a bit bigger)
+    texts = []
+    try:
+        values = to_np(data)
+        for airport, (idx_x, idx_y) in get_station_indices(wrf_file, airports).items():
+            lat, lon = airports[airport]
+            if extent is not None:
+                west, east, north, south = extent
+                if not (west <= lon <= east and south <= lat <= north):
+                    continue
+            value = values[idx_y, idx_x]
+            texts.append(ax.text(lon, lat, f"{value:.1f}", color='black', fontsize=(12 if extent is None else 14), ha='center', va='bottom', bbox=dict(facecolor='white', alpha=0.2, edgecolor='none', boxstyle='round')))
+    except Exception:
+        pass
+    return texts
+
+def plot_maxmin(ax, data, lons, lats, extent=None):
+    # max/min box in the corner, taken over just the visible part of the grid for cropped views
+    values = to_np(data)
+    if extent is not None:
+        west, east, north, south = extent
+        lons, lats = to_np(lons), to_np(lats)
+        values = values[(lons >= west) & (lons <= east) & (lats >= south) & (lats <= north)]
+    if values.size == 0:
+        # no grid points in the view (a region just past the domain edge) - no box rather than a failed frame
+        return None
+    maxmin = ""
+    max_value = values.max()
+    min_value = values.min()
+    if max_value != 0:
+        maxmin += f"Max: {max_value:.1f}"
+        if min_value != 0:
+            maxmin += f"\nMin: {min_value:.1f}"
+    return ax.annotate(maxmin, xy=(0.98, 0.03), xycoords='axes fraction', fontsize=12, color='black', ha='right', va='bottom', bbox=dict(facecolor='white', alpha=0.6, edgecolor='none'))
+
+_station_indices = {}
+def get_station_indices(wrf_file, airports):
+    # grid x/y of each airport, looked up once per domain instead of once per frame. keyed on the domain's projection
+    # and grid (like pointdata's index cache), not the Dataset, whose id can come back for another wrfout in a daemon worker
+    key = (pointdata.domain_signature(wrf_file), tuple(airports.items()))
+    runmetrics.count_cache("station_indices", hits=int(key in _station_indices), misses=int(key not in _station_indices))
+    if key not in _station_indices:
+        _station_indices[key] = {airport: tuple(int(i) for i in ll_to_xy(wrf_file, lat, lon)) for airport, (lat, lon) in airports.items()}
+    return _station_indices[key]
+
+def to_map_extent(extent):
+    # our extents are written [west, east, north, south]; cartopy wants [west, east, south, north]
+    west, east, north, south = extent
+    return [west, east, south, north]
+
+def extent_in_domain(extent, lons, lats):
+    # regions that fall outside the model domain (e.g. after a domain change) are skipped instead of saving blank maps
+    west, east, north, south = extent
+    d_west, d_east, d_south, d_north = get_domain_extent(lons, lats)
+    return west < d_east and east > d_west and south < d_north and north > d_south
+
+def plot_filled(ax, lons, lats, data, raster=False, **kwargs):
+    # shaded field for a product. normally a contourf, but in raster mode (raster is then the domain's native_grid)
+    # the field is mapped through the same levels/cmap/norm with numpy and placed with imshow, which skips contour
+    # generation. the grid is only regular in the model's own projection, so that's what the image is placed in
+    if not raster:
+        return ax.contourf(to_np(lons), to_np(lats), to_np(data), **kwargs)
+    kwargs.pop('transform', None)
+    rgba, mappable = raster_field(to_np(data), **kwargs)
+    projection, grid_extent = raster
+    if ax.get_autoscale_on():
+        # cartopy warps the image onto the current view, so the full view has to be on the domain (where contourf
+        # would autoscale it to) before the image goes on
+        ax.set_extent(get_domain_extent(lons, lats), crs=ccrs.PlateCarree())
+    # at least two image pixels per grid cell so zoomed-in region views keep the cell edges where they belong
+    ax.imshow(rgba, origin='lower', extent=grid_extent, transform=projection, interpolation='nearest', regrid_shape=max(750, 2 * max(rgba.shape[:2])))
+    return mappable
+
+_native_grids = {}
+def native_grid(wrf_file):
+    # (cartopy projection, [x0, x1, y0, y1]) of the model grid in its own projection, out to the outer cell edges,
+    # worked out once per domain
+    key = pointdata.domain_signature(wrf_file)
+    if key not in _native_grids:
+        (x0, x1), (y0, y1) = cartopy_xlim(wrfin=wrf_file), cartopy_ylim(wrfin=wrf_file)
+        nx, ny = len(wrf_file.dimensions["west_east"]), len(wrf_file.dimensions["south_north"])
+        # the limits are the corner cells' centers
+        half_x, half_y = (x1 - x0) / (nx - 1) / 2, (y1 - y0) / (ny - 1) / 2
+        _native_grids[key] = (get_cartopy(wrfin=wrf_file), [x0 - half_x, x1 + half_x, y0 - half_y, y1 + half_y])
+    return _native_grids[key]
+
+def raster_field(data, levels=None, cmap=None, norm=None, vmin=None, vmax=None, colors=None, extend='neither', alpha=None):
+    # mirrors how contourf picks its levels and band colors so raster frames match the contoured ones
+    data = np.ma.masked_invalid(np.asanyarray(getattr(data, 'magnitude', data), dtype=float))
+    zmin, zmax = data.min(), data.max()
+    if levels is None:
+        levels = ticker.MaxNLocator(8, min_n_ticks=1).tick_values(zmin, zmax)
+        under = np.nonzero(levels < zmin)[0]
+        over = np.nonzero(levels > zmax)[0]
+        i0 = under[-1] if len(under) else 0
+        i1 = over[0] + 1 if len(over) else len(levels)
+        if extend in ('min', 'both'):
+            i0 += 1
+        if extend in ('max', 'both'):
+            i1 -= 1
+        if i1 - i0 >= 3:
+            levels = levels[i0:i1]
+    levels = np.asarray(levels, dtype=float)
+    n_bands = len(levels) - 1
+    extend_min = extend in ('min', 'both')
+    extend_max = extend in ('max', 'both')
+    if colors is not None:
+        color_list = matplotlib.colors.to_rgba_array(colors)
+        start = 1 if extend_min and len(color_list) == n_bands + extend_min + extend_max else 0
+        band_colors = np.resize(color_list[start:], (n_bands, 4))
+        under_color, over_color = color_list[0], color_list[-1]
+    else:
+        cmap = plt.get_cmap(cmap)
+        if norm is None:
+            norm = matplotlib.colors.Normalize(vmin=vmin, vmax=vmax)
+        norm.autoscale_None(levels)
+        band_colors = cmap(norm(0.5 * (levels[:-1] + levels[1:])))
+        under_color, over_color = np.array(cmap.get_under()), np.array(cmap.get_over())
+    clear = np.zeros(4)
+    # lookup rows: below range, each band, above range, masked. out of range values are left clear unless extended, like contourf
+    table = np.vstack([under_color if extend_min else clear, band_colors, over_color if extend_max else clear, clear])
+    values = data.filled(np.nan)
+    idx = np.searchsorted(levels, values, side='left')
+    idx[values == levels[0]] = 1
+    idx[np.ma.getmaskarray(data)] = n_bands + 2
+    rgba = table[idx]
+    if alpha is not None:
+        rgba[..., 3] *= alpha
+    bar_colors = ([under_color] if extend_min else []) + list(band_colors) + ([over_color] if extend_max else [])
+    bar_cmap = matplotlib.colors.ListedColormap(bar_colors)
+    bar_norm = matplotlib.colors.BoundaryNorm(levels, len(bar_colors), extend=extend)
+    return rgba, cm.ScalarMappable(norm=bar_norm, cmap=bar_cmap)
+
+_accumulations = {"file": None, "fields": {}}
+def accumulation(wrf_file, varname):
+    # {"total": (time, y, x), "hourly": (time, y, x)} for a run-total field like AFWA_RAIN or AFWA_TOTPRECIP.
+    # the whole time series is read once per wrfout and differenced along time in one go, instead of two getvars
+    # per frame. only the current wrfout's fields are kept
+    if _accumulations["file"] is not wrf_file:
+        clear_accumulations()
+        _accumulations["file"] = wrf_file
+    runmetrics.count_cache("accumulations", hits=int(varname in _accumulations["fields"]), misses=int(varname not in _accumulations["fields"]))
+    if varname not in _accumulations["fields"]:
+        total = np.ma.getdata(wrf_file.variables[varname][:])
+        _accumulations["fields"][varname] = {"total": total, "hourly": np.diff(total, axis=0, prepend=np.zeros_like(total[:1]))}
+    return _accumulations["fields"][varname]
+
+_kuchera = {"totals": None, "through": -1}
+def kuchera_snowfall(wrf_file, timestep):
+    # run-total snowfall (in) through timestep, each hour's snow (the AFWA_SNOW increment) at that hour's own Kuchera
+    # ratio. hours are added on in order and kept, so going through the run reads every input once however the
+    # hours are asked for. the accumulation call also clears what's kept here when the wrfout changes
+    hourly_snow = accumulation(wrf_file, "AFWA_SNOW")["hourly"]
+    if _kuchera["totals"] is None:
+        _kuchera["totals"] = np.zeros_like(hourly_snow)
+    for t in range(_kuchera["through"] + 1, timestep + 1):
+        snowfall = hourly_snow[t] / 25.4 * kuchera_ratio_from_max(max_temp_below(wrf_file, t, 500))
+        _kuchera["totals"][t] = snowfall if t == 0 else _kuchera["totals"][t - 1] + snowfall
+        _kuchera["through"] = t
+    return _kuchera["totals"][timestep]
+
+def max_temp_below(wrf_file, timestep, top):
+    # warmest temperature (degC) of each column between the ground and top (hPa), -999 where no level is below top.
+    # levels are read from the bottom up and the reading stops at the first level that's above top everywhere,
+    # so only the lower part of the atmosphere is read. same tk/pressure formulas as wrf-python
+    read = lambda varname, k: np.ma.getdata(wrf_file.variables[varname][timestep, k])
+    t_max = None
+    for k in range(wrf_file.variables["T"].shape[1]):
+        pressure = read("P", k) + read("PB", k)
+        below = pressure >= top * 100
+        if t_max is None:
+            t_max = np.full(pressure.shape, -999, dtype=pressure.dtype)
+        if not below.any():
+            break
+        temp = (read("T", k) + 300.0) * (pressure / 100000.0) ** (2.0 / 7.0) - 273.15
+        np.maximum(t_max, np.where(below, temp, -999), out=t_max)
+    return t_max
+
+def clear_accumulations():
+    _accumulations.update({"file": None, "fields": {}})
+    _kuchera.update({"totals": None, "through": -1})
+
+_domain_extents = {}
+def get_domain_extent(lons, lats):
+    # [west, east, south, north] of the model grid for imshow, worked out once per grid
+    lons, lats = to_np(lons), to_np(lats)
+    key = (lons.shape, float(lons[0, 0]), float(lats[0, 0]))
+    if key not in _domain_extents:
+        _domain_extents[key] = [float(lons.min()), float(lons.max()), float(lats.min()), float(lats.max())]
+    return _domain_extents[key]
+
+def plot_wind_barbs(ax, wrf_file, timestep, lons, lats, pressure_level=None, float32=False, fields=None):
     if pressure_level:
-        u = getvar(wrf_file, "ua", timeidx=timestep)
-        v = getvar(wrf_file, "va", timeidx=timestep)
-        pressure = getvar(wrf_file, "pressure", timeidx=timestep)
-        u_interp = interplevel(u, pressure, pressure_level)
-        v_interp = interplevel(v, pressure, pressure_level)
+        u_interp = level_field(wrf_file, "ua", timestep, pressure_level, float32, fields)
+        v_interp = level_field(wrf_file, "va", timestep, pressure_level, float32, fields)
     else:
         u_interp = getvar(wrf_file, "U10", timeidx=timestep)
         v_interp = getvar(wrf_file, "V10", timeidx=timestep)
@@ -594,13 +740,10 @@ def plot_wind_barbs(ax, wrf_file, timestep, lons, lats, pressure_level=None):
              length=6, color='black', pivot='middle',
              barb_increments={'half': 2.57222, 'full': 5.14444, 'flag': 25.7222})
 
-def plot_streamlines(ax, wrf_file, timestep, lons, lats, pressure_level=None):
+def plot_streamlines(ax, wrf_file, timestep, lons, lats, pressure_level=None, float32=False, fields=None):
     if pressure_level:
-        u = getvar(wrf_file, "ua", timeidx=timestep)
-        v = getvar(wrf_file, "va", timeidx=timestep)
-        pressure = getvar(wrf_file, "pressure", timeidx=timestep)
-        u_interp = interplevel(u, pressure, pressure_level)
-        v_interp = interplevel(v, pressure, pressure_level)
+        u_interp = level_field(wrf_file, "ua", timestep, pressure_level, float32, fields)
+        v_interp = level_field(wrf_file, "va", timestep, pressure_level, float32, fields)
     else:
         u_interp = getvar(wrf_file, "U10", timeidx=timestep)
         v_interp = getvar(wrf_file, "V10", timeidx=timestep)
@@ -614,7 +757,10 @@ def plot_streamlines(ax, wrf_file, timestep, lons, lats, pressure_level=None):
 def kuchera_ratio(temp, pres):
     #thanks random website on the internet for giving me what i think is the kuchera ratio formula
     temp_below_500 = np.where(pres >= 500, temp, -999)
-    t_max = np.nanmax(temp_below_500, axis=0)
+    return kuchera_ratio_from_max(np.nanmax(temp_below_500, axis=0))
+
+def kuchera_ratio_from_max(t_max):
+    # t_max is the warmest temperature (degC) in the column below 500mb
     threshold = -1.99
     ratio = np.where(t_max > threshold, 12 + (2 * (threshold - t_max)), 12 + (threshold - t_max))
     return np.clip(ratio, 0, 30)
@@ -0,0 +1,372 @@
+# This module spreads a run's tasks (see ugawrf.build_tasks) over several hosts that share a folder.
+# The wrfout, the output folder and the queue folder all have to be on a filesystem every host sees (nfs, smb...).
+# ugawrf.py --queue (queue) puts the run's tasks in (queue)/(run id)/pending and waits; every host running
+#   python workqueue.py work (queue)
+# takes tasks from there. Everything is plain files and renames, so there's no broker to run:
+#   pending/(task).json                 - waiting to be picked up. (task) is the task's rank and id (see task_name),
+#                                         so tasks are taken in ugawrf.schedule_tasks order
+#   claimed/(task)@(worker)@(time).json - being worked on since (time). taking a task is one rename out of pending/,
+#                                         so only one worker can get it. the worker touches the file every HEARTBEAT seconds
+#   done/(task).json                    - the task's result (seconds, status, host). created with O_EXCL after the task's
+#                                         images are written and synced, so each task is completed exactly once
+#   failed/(task).json                  - a task whose worker went quiet MAX_ATTEMPTS times (it keeps crashing or
+#                                         running out of memory). it's reported as an error instead of being tried forever
+#   backup/(task)                       - marks a task that has a second copy running (see below)
+# A claim that stops getting touched (its worker died or lost the share) is put back in pending/ once nobody has seen
+# it touched for STALE_AFTER seconds, with its "attempts" counted up in the task file. Staleness is timed with each
+# host's own clock from when it saw the file last change, so hosts whose clocks disagree with the file server (or each
+# other) don't requeue live claims. A worker with nothing left to do starts one backup copy of any task it's seen
+# running for STRAGGLER_FACTOR times its expected time (from the task history, see ugawrf.schedule_tasks), or for
+# STRAGGLER_AFTER seconds if it has no history. Whichever copy finishes first completes the task and the other one's result is dropped -
+# images are written to a temp file and renamed, so both copies writing the same frame is harmless.
+# ex: python workqueue.py work /mnt/wrf/queue --writers 2
+#     python workqueue.py status /mnt/wrf/queue
+
+import datetime as dt
+import threading
+import argparse
+import socket
+import shutil
+import json
+import time
+import os
+
+HEARTBEAT = 10
+STALE_AFTER = 60
+STRAGGLER_FACTOR = 2
+STRAGGLER_AFTER = 600 # for tasks without an estimate
+STRAGGLER_MIN = 60 # short tasks aren't worth a second copy before this
+MAX_ATTEMPTS = 3
+POLL = 1
+QUEUE_FOLDERS = ["pending", "claimed", "done", "failed", "backup"]
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def run_distributed(queue, run, tasks, work=True, writers=2, helpers=0):
+    # puts the run's tasks in the queue, works on them too (unless work is False) and waits until every one of them
+    # is done. helpers starts that many more worker processes on this machine. returns {task id: result}
+    run_id = f"{run['file_path'][0]}_{run['file_path'][1]}_{dt.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    queue_run = submit(queue, run_id, run, tasks)
+    print(f"queued {len(tasks)} tasks in {queue_run}")
+    helper_processes = start_helpers(queue, helpers, writers)
+    if work:
+        work_queue(queue, writers=writers, only_run=run_id)
+    results = wait(queue_run, tasks)
+    for process in helper_processes:
+        process.wait()
+    shutil.rmtree(queue_run, ignore_errors=True)
+    return results
+
+def start_helpers(queue, count, writers):
+    # "python workqueue.py work" processes on this machine that stop once the queue is empty
+    import subprocess
+    import sys
+    return [subprocess.Popen([sys.executable, os.path.abspath(__file__), "work", queue, "--writers", str(writers), "--exit-when-idle"]) for i in range(count)]
+
+def submit(queue, run_id, run, tasks):
+    queue_run = os.path.join(queue, run_id)
+    for folder in QUEUE_FOLDERS:
+        os.makedirs(os.path.join(queue_run, folder), exist_ok=True)
+    for task in tasks:
+        write_json(os.path.join(queue_run, "pending", f"{task_name(task)}.json"), task)
+    # run.json goes last - workers skip runs without one, so they never see a half-submitted run
+    write_json(os.path.join(queue_run, "run.json"), {
+        "wrf_file": os.path.abspath(run["wrf_path"]),
+        "output_folder": os.path.abspath(run["base_output"]),
+        "options": run["options"],
+        "metadata": run.get("metadata"),
+        "tasks": [task["id"] for task in tasks],
+    })
+    return queue_run
+
+def wait(queue_run, tasks):
+    # blocks until every task has a done (or failed) record, putting dead workers' tasks back in the meantime
+    while True:
+        finished = set(name[:-len(".json")] for folder in ["done", "failed"] for name in queue_files(os.path.join(queue_run, folder)))
+        if all(task_name(task) in finished for task in tasks):
+            break
+        requeue_stale(queue_run)
+        report_progress(queue_run)
+        time.sleep(POLL)
+    results = {}
+    for task in tasks:
+        folder = "done" if os.path.exists(os.path.join(queue_run, "done", f"{task_name(task)}.json")) else "failed"
+        with open(os.path.join(queue_run, folder, f"{task_name(task)}.json")) as f:
+            results[task["id"]] = json.load(f)
+        if folder == "failed":
+            print(f"error processing {task['id']}: {results[task['id']]['failures'][0]['error']}!")
+    return results
+
+def task_name(task):
+    # file name of a task in the queue folders. sorting these gives the order the tasks should be made in
+    return f"{task.get('rank', 0):04d}.{task['id']}"
+
+def work_queue(queue, writers=2, only_run=None, exit_when_idle=True):
+    # takes tasks from every run in the queue (or just only_run) until there are none left. with exit_when_idle off
+    # it keeps waiting for new runs, which is what "python workqueue.py work" does
+    import framewriter
+    import ugawrf
+    me = worker_id()
+    open_runs = {}
+    if writers > 0:
+        framewriter.start(workers=writers, max_pending=4 * writers)
+    try:
+        while True:
+            if only_run and os.path.isdir(os.path.join(queue, only_run)):
+                report_progress(os.path.join(queue, only_run))
+            claimed = None
+            for run_id in sorted(os.listdir(queue)) if os.path.isdir(queue) else []:
+                if only_run and run_id != only_run:
+                    continue
+                queue_run = os.path.join(queue, run_id)
+                if not os.path.exists(os.path.join(queue_run, "run.json")):
+                    continue
+                requeue_stale(queue_run)
+                claimed = claim(queue_run, me) or claim_straggler(queue_run, me)
+                if claimed:
+                    break
+            if claimed is None:
+                # close the wrfouts of runs that have been cleaned up
+                for run_id in [run_id for run_id in open_runs if not os.path.isdir(os.path.join(queue, run_id))]:
+                    open_runs.pop(run_id)["wrf_file"].close()
+                ugawrf.finish_tasks()
+                if exit_when_idle and not any_claimed(queue, only_run):
+                    break
+                time.sleep(POLL)
+                continue
+            queue_run, task, claim_path = claimed
+            run_id = os.path.basename(queue_run)
+            if run_id not in open_runs:
+                with open(os.path.join(queue_run, "run.json")) as f:
+                    spec = json.load(f)
+                open_runs[run_id] = ugawrf.open_run(spec["wrf_file"], spec["output_folder"], spec["options"])
+                open_runs[run_id]["metadata"] = spec["metadata"]
+                # a task waiting for memory (--memory-budget) only waits while another worker here could free some up
+                open_runs[run_id]["others_running"] = lambda: others_running_here(queue, me)
+            print(f"{me}: {task['id']} ({run_id})")
+            with Heartbeat(claim_path):
+                result = ugawrf.run_task(open_runs[run_id], task)
+            result["host"] = me
+            complete(queue_run, task_name(task), result, claim_path)
+    finally:
+        for run in open_runs.values():
+            run["wrf_file"].close()
+        ugawrf.finish_tasks()
+        if only_run is None:
+            framewriter.stop()
+
+def report_progress(queue_run):
+    # tells the run metrics (runmetrics.py) which tasks other workers have taken and finished. they're only started
+    # in the process that submitted the run, everywhere else this does nothing
+    import runmetrics
+    for name in queue_files(os.path.join(queue_run, "claimed")):
+        task_id, owner, started = name[:-len(".json")].split("@")
+        runmetrics.task_started(task_id.split(".", 1)[1], worker=owner)
+    for folder in ["done", "failed"]:
+        for name in queue_files(os.path.join(queue_run, folder)):
+            task_id = name[:-len(".json")].split(".", 1)[1]
+            if runmetrics.is_finished(task_id):
+                continue
+            try:
+                with open(os.path.join(queue_run, folder, name)) as f:
+                    runmetrics.task_finished(task_id, json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+    runmetrics.refresh()
+
+def claim(queue_run, me):
+    # (queue_run, task, claim path) for the first pending task we manage to rename into claimed/, or None
+    pending = os.path.join(queue_run, "pending")
+    for name in sorted(queue_files(pending)):
+        task_id = name[:-len(".json")]
+        claim_path = os.path.join(queue_run, "claimed", f"{task_id}@{me}@{int(time.time())}.json")
+        try:
+            os.rename(os.path.join(pending, name), claim_path)
+        except FileNotFoundError:
+            # somebody else got it first
+            continue
+        if os.path.exists(os.path.join(queue_run, "done", name)) or os.path.exists(os.path.join(queue_run, "failed", name)):
+            # requeued after its worker went quiet, but that worker finished it after all
+            os.remove(claim_path)
+            continue
+        with open(claim_path) as f:
+            return queue_run, json.load(f), claim_path
+    return None
+
+def claim_straggler(queue_run, me):
+    # a second copy of a task that's been running well past its expected time (see straggler_after). only one per task
+    now = time.monotonic()
+    for name in sorted(queue_files(os.path.join(queue_run, "claimed"))):
+        task_id, owner, started = name[:-len(".json")].split("@")
+        claim_path = os.path.join(queue_run, "claimed", name)
+        try:
+            # how long we've seen it running, by our own clock
+            started = watch_claim(claim_path, now)["first_seen"]
+        except FileNotFoundError:
+            continue
+        try:
+            with open(claim_path) as f:
+                task = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        if owner == me or now - started < straggler_after(task) or os.path.exists(os.path.join(queue_run, "done", f"{task_id}.json")):
+            continue
+        try:
+            os.close(os.open(os.path.join(queue_run, "backup", task_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+        print(f"{me}: {task_id} has been running on {owner} for {now - started:.0f}s, starting a backup copy")
+        backup_path = os.path.join(queue_run, "claimed", f"{task_id}@{me}@{int(time.time())}.json")
+        write_json(backup_path, task)
+        return queue_run, task, backup_path
+    return None
+
+def straggler_after(task):
+    # seconds a task runs before it gets a backup copy. whole-product tasks can take a lot longer than STRAGGLER_AFTER
+    # when they're healthy, so the task history's estimate is used when there is one
+    if task.get("estimated_seconds"):
+        return max(STRAGGLER_MIN, STRAGGLER_FACTOR * task["estimated_seconds"])
+    return STRAGGLER_AFTER
+
+def complete(queue_run, task_id, result, claim_path):
+    # records the result unless another copy of the task got there first. returns whether ours counted
+    try:
+        fd = os.open(os.path.join(queue_run, "done", f"{task_id}.json"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        print(f"{task_id} was already completed by another worker, dropping this result")
+        counted = False
+    else:
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f)
+            f.flush()
+            os.fsync(f.fileno())
+        counted = True
+    try:
+        os.remove(claim_path)
+    except FileNotFoundError:
+        pass
+    return counted
+
+# {claim path: {"mtime", "changed" (when we saw mtime change), "first_seen"}}, times from time.monotonic()
+_claims_seen = {}
+
+def watch_claim(claim_path, now):
+    # what this host has seen of a claim file. the mtime is only compared with itself, never with our clock
+    mtime = os.path.getmtime(claim_path)
+    seen = _claims_seen.get(claim_path)
+    if seen is None:
+        seen = _claims_seen[claim_path] = {"mtime": mtime, "changed": now, "first_seen": now}
+    elif seen["mtime"] != mtime:
+        seen.update({"mtime": mtime, "changed": now})
+    return seen
+
+def requeue_stale(queue_run):
+    # claims nobody has seen touched for STALE_AFTER seconds go back to pending, or to failed after MAX_ATTEMPTS
+    now = time.monotonic()
+    claimed = os.path.join(queue_run, "claimed")
+    names = queue_files(claimed)
+    for claim_path in [path for path in _claims_seen if os.path.dirname(path) == claimed and os.path.basename(path) not in names]:
+        del _claims_seen[claim_path]
+    for name in names:
+        claim_path = os.path.join(claimed, name)
+        task_id, owner, started = name[:-len(".json")].split("@")
+        try:
+            if now - watch_claim(claim_path, now)["changed"] < STALE_AFTER:
+                continue
+            if os.path.exists(os.path.join(queue_run, "done", f"{task_id}.json")):
+                os.remove(claim_path)
+                continue
+            # taking the claim out of claimed/ is one rename, so only one host requeues it
+            requeue_path = os.path.join(queue_run, "pending", f".{task_id}.{worker_id()}.requeue")
+            os.rename(claim_path, requeue_path)
+        except FileNotFoundError:
+            continue
+        _claims_seen.pop(claim_path, None)
+        with open(requeue_path) as f:
+            task = json.load(f)
+        task["attempts"] = task.get("attempts", 0) + 1
+        if task["attempts"] >= MAX_ATTEMPTS:
+            error = f"its worker went quiet {task['attempts']} times ({owner} last)"
+            write_json(os.path.join(queue_run, "failed", f"{task_id}.json"), {"seconds": 0, "status": "error", "failed_frames": 0, "host": owner,
+                       "failures": [{"task": task["id"], "frame": None, "attempts": task["attempts"], "error": error}]})
+            print(f"{owner} went quiet, {task_id} failed: {error}")
+        else:
+            write_json(os.path.join(queue_run, "pending", f"{task_id}.json"), task)
+            print(f"{owner} went quiet, requeued {task_id} (attempt {task['attempts'] + 1} of {MAX_ATTEMPTS})")
+        os.remove(requeue_path)
+        # the task gets a fresh start, so it may have a backup copy again later
+        if os.path.exists(os.path.join(queue_run, "backup", task_id)):
+            os.remove(os.path.join(queue_run, "backup", task_id))
+
+def any_claimed(queue, only_run=None):
+    # whether any run (or just only_run) still has tasks being worked on - a worker with nothing to take stays around
+    # for those in case they need requeuing or a backup copy
+    for run_id in os.listdir(queue) if os.path.isdir(queue) else []:
+        if only_run and run_id != only_run:
+            continue
+        claimed = os.path.join(queue, run_id, "claimed")
+        if os.path.isdir(claimed) and os.listdir(claimed):
+            return True
+    return False
+
+def others_running_here(queue, me):
+    # whether another worker on this machine has a task claimed, in any run of the queue
+    host = socket.gethostname()
+    for run_id in os.listdir(queue) if os.path.isdir(queue) else []:
+        claimed = os.path.join(queue, run_id, "claimed")
+        for name in queue_files(claimed) if os.path.isdir(claimed) else []:
+            owner = name.split("@")[1]
+            if owner != me and owner.rsplit("-", 1)[0] == host:
+                return True
+    return False
+
+def queue_files(folder):
+    # the .json files of a queue folder, without the half-written .tmp ones
+    return [name for name in os.listdir(folder) if name.endswith(".json")]
+
+def write_json(path, data):
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+
+class Heartbeat:
+    # touches the claim file in the background while the task runs, so nobody thinks we died
+    def __init__(self, path):
+        self.path = path
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def beat(self):
+        while not self.stopped.wait(HEARTBEAT):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                # requeued from under us. finishing is still fine, complete() sorts out who counts
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+def status(queue):
+    for run_id in sorted(os.listdir(queue)):
+        counts = {folder: len(os.listdir(os.path.join(queue, run_id, folder))) for folder in ["pending", "claimed", "done", "failed"] if os.path.isdir(os.path.join(queue, run_id, folder))}
+        workers = sorted(set(name.split("@")[1] for name in queue_files(os.path.join(queue, run_id, "claimed")))) if os.path.isdir(os.path.join(queue, run_id, "claimed")) else []
+        print(f"{run_id}: {counts} {workers}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Work on (or check) the ugawrf tasks in a shared queue folder.')
+    parser.add_argument('action', choices=['work', 'status'], help='work: take tasks until stopped. status: count the tasks of every run in the queue.')
+    parser.add_argument('queue', type=str, help='Queue folder shared by every host.')
+    parser.add_argument('--writers', type=int, default=2, help="Background image writer threads, like ugawrf.py's --writers.")
+    parser.add_argument('--exit-when-idle', help='Stop once the queue is empty instead of waiting for the next run.', action='store_true')
+    args = parser.parse_args()
+    if args.action == 'status':
+        status(args.queue)
+    else:
+        work_queue(args.queue, writers=args.writers, exit_when_idle=args.exit_when_idle)
@@ -77,7 +77,23 @@ const loopButton = document.getElementById('loop');
 const skewtImage = document.getElementById('skewtimg');
 const skewtSelector = document.getElementById('skewtSelector');
 
-async function loadDirectories(pageToken = '') {
+// catalog.json (written by ugawrf) lists the newest runs, their domains, products and available hours in one file.
+// the bucket folders are only listed (page by page) when there's no catalog, when it looks stale, or when someone
+// picks "Older runs..." at the bottom of the run list
+let catalog = null;
+const olderRuns = "older";
+// a catalog whose newest run is older than this has probably missed a cycle (a model run every 6 hours)
+const catalogStaleHours = 12;
+async function loadCatalog() {
+    try {
+        const response = await fetch(`${outputs}catalog.json`, {cache: 'no-store'});
+        if (response.ok) return await response.json();
+    } catch (error) {
+        console.log("no catalog found, listing runs instead");
+    }
+    return null;
+}
+async function listRunFolders(pageToken = '') {
     const baseUrl = 'https://storage.googleapis.com/storage/v1/b/uga-wrf-website/o?delimiter=/&prefix=outputs/202';
     let directories = [];
     while (true) {
@@ -89,15 +105,56 @@ async function loadDirectories(pageToken = '') {
         if (!data.nextPageToken) break;
         pageToken = data.nextPageToken;
     }
-    directories.reverse().forEach(dir => {
-        const folderName = dir.replace('outputs/', '').replace(/\/$/, '');
-        if (folderName) {
-            let option = document.createElement('option');
-            option.value = folderName;
-            option.textContent = folderName.replaceAll("-", '/').replace("_", " ").replaceAll("_", ":");
-            runSelector.appendChild(option);
-        }
+    return directories.reverse().map(dir => dir.replace('outputs/', '').replace(/\/$/, ''));
+}
+function catalogStale() {
+    // run folders are named after their init time in UTC, e.g. 2025-03-13_21_00_00
+    const newest = Object.keys(catalog.runs).sort().pop();
+    if (!newest) return true;
+    const [date, hour] = newest.split("_");
+    const initTime = Date.parse(`${date}T${hour}:00:00Z`);
+    return isNaN(initTime) || Date.now() - initTime > catalogStaleHours * 3600 * 1000;
+}
+function catalogEntry(run, domain) {
+    if (!catalog || !catalog.runs[run]) return null;
+    return catalog.runs[run][domain] || null;
+}
+function frameAvailable(run, domain, product, hour) {
+    // only says no when the catalog knows the product and that hour isn't in it
+    const entry = catalogEntry(run, domain);
+    if (!entry || !entry.products[product] || entry.in_progress) return true;
+    return (entry.products[product].hours || []).includes(hour);
+}
+// sizes/naming of the current run's webp previews (from metadata.json or the catalog), null if it has none
+let runPreviews = null;
+let fullFrameTimer;
+function previewUrl(run, domain, product, hour) {
+    // only frames listed as having a preview get one, everything else loads the full frame straight away
+    if (!runPreviews || !runPreviews.products || !(runPreviews.products[product] || []).includes(hour)) return null;
+    return `${outputs}${run}/${domain}/${product}/hour_${hour}.preview.webp`;
+}
+function addRunOptions(folders) {
+    // adds the runs that aren't listed yet, keeping the list newest first
+    const listed = new Set(Array.from(runSelector.options, option => option.value));
+    folders.filter(folderName => folderName && !listed.has(folderName)).forEach(folderName => {
+        let option = document.createElement('option');
+        option.value = folderName;
+        option.textContent = folderName.replaceAll("-", '/').replace("_", " ").replaceAll("_", ":");
+        const before = Array.from(runSelector.options).find(existing => existing.value < folderName || existing.value === olderRuns);
+        runSelector.insertBefore(option, before || null);
     });
+}
+async function loadDirectories() {
+    catalog = await loadCatalog();
+    if (catalog && !catalogStale()) {
+        addRunOptions(Object.keys(catalog.runs));
+        // the catalog only has the newest runs, the rest are listed if someone asks for them
+        let option = document.createElement('option');
+        option.value = olderRuns;
+        option.textContent = "Older runs...";
+        runSelector.appendChild(option);
+    }
+    else addRunOptions(await listRunFolders());
     updateImage("temperature");
     updateTextForecast();
     checkRunStatus();
@@ -126,9 +183,19 @@ function updateImage(selectedProduct = product) {
     const domain = domainSelector.value;
     timestep = Number(slider.value);
     timeLabel.textContent = `Hour ${timestep}/${hours}`;
-    weatherImage.src = `${outputs}${run}/${domain}/${product}/hour_${timestep}.png`;
+    const available = frameAvailable(run, domain, product, timestep);
+    const fullFrame = available ? `${outputs}${run}/${domain}/${product}/hour_${timestep}.png` : "/Frame_Unavailable.png";
+    const preview = available ? previewUrl(run, domain, product, timestep) : null;
+    // while scrubbing or looping show the small preview, and only fetch the full frame once the slider rests on an hour
+    clearTimeout(fullFrameTimer);
+    if (preview) {
+        weatherImage.src = preview;
+        if (!playButton.disabled) fullFrameTimer = setTimeout(() => { weatherImage.src = fullFrame; }, 400);
+    }
+    else weatherImage.src = fullFrame;
     weatherImage.onerror = () => {
-        weatherImage.src = "/Frame_Unavailable.png";
+        // a missing preview falls back to the full frame before giving up
+        weatherImage.src = (preview && weatherImage.src.endsWith(".preview.webp")) ? fullFrame : "/Frame_Unavailable.png";
     }
     skewtImage.src = `${outputs}${run}/${domain}/skewt/${skewtSelector.value}/hour_${timestep}.png`;
     updateSecondaryDisplay()
@@ -213,7 +280,24 @@ document.querySelectorAll('.dropdown-content a').forEach(item => {
     });
 });
 slider.addEventListener('input', () => updateImage());
-runSelector.addEventListener('change', () => {
+async function loadOlderRuns() {
+    // lists every run folder in place of the "Older runs..." entry and picks the newest run the catalog didn't have
+    const option = runSelector.querySelector(`option[value="${olderRuns}"]`);
+    option.textContent = "Loading older runs...";
+    try {
+        const folders = await listRunFolders();
+        option.remove();
+        addRunOptions(folders);
+        const older = folders.find(folderName => !catalog.runs[folderName] && folderName < Object.keys(catalog.runs).sort()[0]);
+        runSelector.value = older || runSelector.options[0].value;
+    } catch (error) {
+        console.log("couldn't list the run folders", error);
+        option.textContent = "Older runs...";
+        runSelector.value = runSelector.options[0].value;
+    }
+}
+runSelector.addEventListener('change', async () => {
+    if (runSelector.value === olderRuns) await loadOlderRuns();
     const run = runSelector.value;
     const domain = domainSelector.value;
     document.getElementById("metadata").href = `${outputs}${run}/${domain}/metadata.json`
@@ -252,6 +336,7 @@ function endLoop() {
     playButton.disabled = false;
     pauseButton.disabled = true;
     speedSelector.disabled = false;
+    updateImage();
 }
 function advanceLoop() {
     timestep = (timestep + 1) % hours;
@@ -279,10 +364,15 @@ async function checkRunStatus() {
     const statusElement = document.getElementById('runStatus');
     statusElement.textContent = "";
     try {
-        const response = await fetch(`${outputs}${run}/${domain}/metadata.json`, {cache: 'no-store'});
-        if (response.ok) {
-            const data = await response.json();
+        // finished runs don't change, so the catalog is enough. in-progress ones get their latest metadata.json
+        let data = catalogEntry(run, domain);
+        if (!data || data.in_progress !== false) {
+            const response = await fetch(`${outputs}${run}/${domain}/metadata.json`, {cache: 'no-store'});
+            data = response.ok ? await response.json() : null;
+        }
+        if (data) {
             console.log(data)
+            runPreviews = data.previews || null
             if (data.in_progress === true) {
                 statusElement.textContent = "Model run in-progress/unfinished - not all frames or products will be available. Point data, 1-hour change (i.e. 1-hr precip), and some other products may not be available until after the run finishes.";
                 loopButton.disabled = true